@@ -1,14 +1,55 @@
-from asyncio import Lock
+import asyncio
+import hashlib
+from asyncio import Lock, create_task
+from functools import partial
+from typing import Awaitable, Callable
 
 from aiohttp import WSMsgType, web
 from aiohttp.web import Request, Response, WebSocketResponse
 
-from utils.analyzer import analyze_transactions
+from utils.analyzer import (
+    analysis_key,
+    analyze_ingested,
+    analyze_stored,
+    analyze_transactions,
+)
+from utils.anomalies import anomaly_models
+from utils.batch import analyze_users, analyze_users_ingested, batch_key
+from utils.cache import classification_cache
+from utils.classifier import classifier_registry
+from utils.executor import stage_executor
 from utils.extract_text import extract_text_from_pdf
+from utils.formats import (
+    FORMAT_NAMES,
+    JSON,
+    NDJSON,
+    UnsupportedMediaType,
+    available,
+    canonical,
+    encode,
+    is_table,
+    negotiate,
+    sniff_table,
+)
+from utils.ingest import PayloadTooLarge, ingest_ndjson, ingest_table
+from utils.live import LiveAnalytics
+from utils.results import result_cache
 from utils.resume_parser import extract_text_with_pymupdf, parse_resume_text
+from utils.runtime import padding_stats
+from utils.scheduler import inference_scheduler
 from utils.settings import base_settings
-from utils.summarize import summarize_transactions
+from utils.store import store_request, transaction_store
+from utils.summarize import (
+    summarize_ingested,
+    summarize_stored,
+    summarize_transactions,
+    summary_key,
+)
 from utils.websocket import WebSocketManager
+from utils.windows import DateWindow, date_window
+
+# Bytes read from the socket per step while streaming an NDJSON upload
+STREAM_CHUNK_SIZE = 1 << 16
 
 # Replace global ws_connections with typed version
 ws_connections: set[WebSocketResponse] = set()
@@ -21,9 +62,27 @@ async def start_background_tasks(app):
     app['ws_lock'] = ws_lock
 
 
+async def start_stage_executor(app):
+    """Start the worker pool that runs CPU-bound analysis stages."""
+    await stage_executor.start()
+
+
+async def start_classifier(app):
+    """Start the inference scheduler and warm the shared classifier."""
+    await inference_scheduler.start()
+    if base_settings.classifier_preload:
+        app['classifier_warmup'] = create_task(classifier_registry.start())
+
+
 async def cleanup_background_tasks(app):
     """Cleanup application resources."""
     await cleanup_ws(app)
+    warmup = app.get('classifier_warmup')
+    if warmup and not warmup.done():
+        warmup.cancel()
+    await inference_scheduler.stop()
+    await stage_executor.stop()
+    transaction_store.close()
 
 
 async def cleanup_ws(app):
@@ -35,6 +94,74 @@ async def cleanup_ws(app):
         ws_connections.clear()
 
 
+async def ready(request: Request) -> Response:
+    """Report ready only once the classifier has completed warmup inference."""
+    if classifier_registry.ready:
+        return web.json_response(
+            {'status': 'ready', 'model': classifier_registry.model_id}
+        )
+    if classifier_registry.error:
+        return web.json_response(
+            {'status': 'error', 'error': classifier_registry.error}, status=503
+        )
+    return web.json_response({'status': 'loading'}, status=503)
+
+
+async def metrics(request: Request) -> Response:
+    """Expose internal counters for monitoring."""
+    return web.json_response(
+        {
+            'classification_cache': classification_cache.stats(),
+            'inference_scheduler': inference_scheduler.stats(),
+            'analysis_stages': stage_executor.stats(),
+            'result_cache': result_cache.stats(),
+            'anomaly_models': anomaly_models.stats(),
+            'batching': padding_stats.stats(),
+        }
+    )
+
+
+def result_etag(key: str, media_type: str = JSON) -> str:
+    """Entity tag of the ``media_type`` encoding of the result for ``key``."""
+    if media_type == JSON:
+        return key
+    return f"{key}-{media_type.rsplit('/', 1)[-1].rsplit('.', 1)[-1]}"
+
+
+def not_modified(request: Request, key: str, media_type: str = JSON) -> bool:
+    """True if the client already holds the cached result for ``key``."""
+    etags = request.if_none_match or ()
+    etag = result_etag(key, media_type)
+    return any(tag.value in (etag, '*') for tag in etags) and (
+        result_cache.get(key) is not None
+    )
+
+
+async def result_response(
+    result: dict, key: str | None = None, media_type: str = JSON
+) -> Response:
+    """Encode ``result`` as ``media_type``, compressed if the client accepts it.
+
+    The response is tagged with the payload hash when the result is cacheable.
+    """
+    body = await asyncio.to_thread(encode, result, media_type)
+    response = web.Response(body=body, content_type=media_type)
+    response.headers['Vary'] = 'Accept, Accept-Encoding'
+    if key is not None and 'error' not in result:
+        response.etag = result_etag(key, media_type)
+    response.enable_compression()
+    return response
+
+
+def windowed(payload, window: DateWindow | None):
+    """Cache-key payload for ``payload`` analyzed over ``window``."""
+    return payload if window is None else {'payload': payload, 'window': window.key()}
+
+
+def table_digest(body: bytes) -> str:
+    return hashlib.sha256(body).hexdigest()
+
+
 async def parse_resume(request: Request) -> Response:
     try:
         base_settings.logger.info('Received resume parsing request')
@@ -88,60 +215,297 @@ async def extract_text(request: Request) -> Response:
         return web.json_response({'error': str(e)}, status=500)
 
 
-async def analyze(request: web.Request) -> web.Response:
-    try:
+async def cached_analysis(
+    request: web.Request,
+    make_key: Callable[[object], Awaitable[str]],
+    from_list: Callable[[list], Awaitable[dict]],
+    from_ingested: Callable[[object, list], Awaitable[dict]],
+    from_store: Callable[[str, DateWindow], Awaitable[dict]] | None = None,
+) -> web.Response:
+    """Serve an analysis endpoint through the result cache.
+
+    Accepts a JSON array of transactions, ``application/x-ndjson`` (one
+    transaction per line), which is ingested incrementally as it arrives so
+    the full body and its list of dicts are never held at once, or an Arrow
+    IPC / Parquet table. With ``from_store``, a JSON object with a ``userId``
+    analyzes that user's stored transactions instead, and the ``start``,
+    ``end`` (inclusive days) and rolling ``window`` query parameters (or
+    body fields, for stored transactions) limit the analysis to a date
+    range. The result is encoded as negotiated from ``Accept``.
+    """
+    content_type = canonical(request.content_type)
+    media_type = negotiate(request.headers.get('Accept'))
+    window = None
+    if from_store:
+        try:
+            window = date_window(request.query)
+        except ValueError as e:
+            return web.json_response({'error': str(e)}, status=400)
+    if content_type == NDJSON:
+        # Streaming bypasses client_max_size, so the limit is enforced here
+        try:
+            batch, rejected, digest = await ingest_ndjson(
+                request.content.iter_chunked(STREAM_CHUNK_SIZE),
+                max_bytes=base_settings.max_request_mb * 1024**2,
+            )
+        except PayloadTooLarge as e:
+            return web.json_response({'error': str(e)}, status=413)
+        key = await make_key(windowed(digest, window))
+        compute = partial(from_ingested, batch, rejected)
+    elif is_table(content_type):
+        body = await request.read()
+        try:
+            batch, rejected, _ = await asyncio.to_thread(
+                ingest_table, body, content_type
+            )
+        except UnsupportedMediaType as e:
+            return web.json_response({'error': str(e)}, status=415)
+        digest = await asyncio.to_thread(table_digest, body)
+        key = await make_key(windowed(digest, window))
+        compute = partial(from_ingested, batch, rejected)
+    else:
         data = await request.json()
-        base_settings.logger.info('Received analysis request')
-        if not isinstance(data, list):
+        if from_store and isinstance(data, dict) and 'userId' in data:
+            if not transaction_store.enabled:
+                return web.json_response(
+                    {'error': 'Transaction store is disabled'}, status=503
+                )
+            try:
+                payload, query = await asyncio.to_thread(
+                    store_request, {**request.query, **data}, transaction_store
+                )
+            except ValueError as e:
+                return web.json_response({'error': str(e)}, status=400)
+            key = await make_key(payload)
+            compute = partial(from_store, *query)
+            window = None
+        elif isinstance(data, list):
+            key = await make_key(windowed(data, window))
+            compute = partial(from_list, data)
+        else:
             base_settings.logger.warning(
                 'Invalid input - expected list of transactions'
             )
             return web.json_response(
                 {'error': 'Invalid input - expected list of transactions'}, status=400
             )
+    if window is not None:
+        compute = partial(compute, window=window)
+
+    if not_modified(request, key, media_type):
+        etag = result_etag(key, media_type)
+        return web.Response(status=304, headers={'ETag': f'"{etag}"'})
+    result = await result_cache.get_or_compute(key, compute)
 
-        result = await analyze_transactions(data)
+    return await result_response(result, key, media_type)
 
-        return web.json_response(result)
+
+async def analyze(request: web.Request) -> web.Response:
+    try:
+        base_settings.logger.info('Received analysis request')
+        return await cached_analysis(
+            request,
+            analysis_key,
+            analyze_transactions,
+            analyze_ingested,
+            analyze_stored,
+        )
     except Exception as e:
         base_settings.logger.error(f'Analysis error: {str(e)}', exc_info=True)
         return web.json_response({'error': 'Analysis failed: ' + str(e)}, status=500)
 
 
+async def analyze_batch(request: web.Request) -> web.Response:
+    """Analyze and summarize transactions for many users, keyed by userId."""
+    try:
+        base_settings.logger.info('Received batch analysis request')
+        return await cached_analysis(
+            request, batch_key, analyze_users, analyze_users_ingested
+        )
+    except Exception as e:
+        base_settings.logger.error(f'Batch analysis error: {str(e)}', exc_info=True)
+        return web.json_response(
+            {'error': 'Batch analysis failed: ' + str(e)}, status=500
+        )
+
+
 async def summarize(request: web.Request) -> web.Response:
     try:
-        data = await request.json()
         base_settings.logger.info('Received summarization request')
-        if not isinstance(data, list):
-            base_settings.logger.warning(
-                'Invalid input - expected list of transactions'
+        return await cached_analysis(
+            request,
+            summary_key,
+            summarize_transactions,
+            summarize_ingested,
+            summarize_stored,
+        )
+    except Exception as e:
+        base_settings.logger.error(f'Summarization error: {str(e)}', exc_info=True)
+        return web.json_response(
+            {'error': 'Summarization failed: ' + str(e)}, status=500
+        )
+
+
+async def store_transactions(request: web.Request) -> web.Response:
+    """Insert or update transactions by ``_id`` in the transaction store."""
+    try:
+        if not transaction_store.enabled:
+            return web.json_response(
+                {'error': 'Transaction store is disabled'}, status=503
             )
+        data = await request.json()
+        if not isinstance(data, list):
             return web.json_response(
                 {'error': 'Invalid input - expected list of transactions'}, status=400
             )
+        upserted, rejected = await asyncio.to_thread(transaction_store.upsert, data)
+        return web.json_response({'upserted': upserted, 'rejected': rejected})
+    except Exception as e:
+        base_settings.logger.error(f'Store error: {str(e)}', exc_info=True)
+        return web.json_response({'error': 'Store failed: ' + str(e)}, status=500)
+
+
+async def run_ws_action(
+    ws_manager: WebSocketManager,
+    action: str | None,
+    payload,
+    ingested=None,
+    stored=None,
+    window: DateWindow | None = None,
+) -> None:
+    """Run an ``analyze`` or ``summary`` action through the result cache.
+
+    ``payload`` is the transaction list, or the digest of a binary table
+    whose ``(batch, rejected)`` ingestion is passed as ``ingested``, or a
+    ``store_request`` payload whose ``(userId, window)`` is ``stored``.
+    ``window`` limits a transaction list or table to a date range.
+    """
+    if action == 'analyze':
+        make_key, from_list, from_ingested, from_store = (
+            analysis_key,
+            analyze_transactions,
+            analyze_ingested,
+            analyze_stored,
+        )
+        task_type, message, done = 'Analysis', 'Analysis complete', 'analysis_complete'
+    elif action == 'summary':
+        make_key, from_list, from_ingested, from_store = (
+            summary_key,
+            summarize_transactions,
+            summarize_ingested,
+            summarize_stored,
+        )
+        task_type, message, done = 'Summarize', 'Summary complete', 'summary_complete'
+    else:
+        await ws_manager.send_result({'message': 'Unknown action'}, 'Error', 'error')
+        return
+
+    if stored is not None:
+        compute = partial(from_store, *stored, ws_manager)
+    elif ingested is None:
+        compute = partial(from_list, payload, ws_manager)
+    else:
+        compute = partial(from_ingested, *ingested, ws_manager)
+    if window is not None and stored is None:
+        compute = partial(compute, window=window)
+        payload = windowed(payload, window)
+    result = await result_cache.get_or_compute(await make_key(payload), compute)
+    await ws_manager.send_progress(message, 1.0, task_type)
+    await ws_manager.send_result(result, task_type, done)
+
+
+async def run_ws_table(ws_manager: WebSocketManager, body: bytes) -> None:
+    """Run the action named in a binary table's schema metadata (default analyze).
+
+    ``start``, ``end`` and ``window`` metadata limit it to a date range.
+    """
+    batch, rejected, metadata = await asyncio.to_thread(
+        ingest_table, body, sniff_table(body)
+    )
+    digest = await asyncio.to_thread(table_digest, body)
+    await run_ws_action(
+        ws_manager,
+        metadata.get('action', 'analyze'),
+        digest,
+        (batch, rejected),
+        window=date_window(metadata),
+    )
 
-        result = await summarize_transactions(data)
 
-        return web.json_response(result)
-    except Exception as e:
-        base_settings.logger.error(f'Summarization error: {str(e)}', exc_info=True)
-        return web.json_response(
-            {'error': 'Summarization failed: ' + str(e)}, status=500
+async def run_live_action(
+    ws_manager: WebSocketManager, sessions: dict[str, LiveAnalytics], data: dict
+) -> None:
+    """Open, update or close a live analytics session.
+
+    ``live_open`` sends the full result for ``transactions``; each
+    ``live_delta`` (``append``, ``edit`` and ``delete`` lists) sends only
+    the parts that changed, with removed days and months set to null.
+    ``session`` names the state (default ``'default'``), e.g. one per user.
+    """
+    action = data.get('action')
+    name = str(data.get('session', 'default'))
+    if action == 'live_open':
+        live = sessions[name] = LiveAnalytics()
+        _, rejected = await live.apply(append=data.get('transactions') or [])
+        await ws_manager.send_result(
+            {'session': name, 'snapshot': live.snapshot(), 'rejected': rejected},
+            'Live',
+            'live_snapshot',
+        )
+    elif action == 'live_delta':
+        live = sessions.get(name)
+        if live is None:
+            await ws_manager.send_result(
+                {'error': f'No live session {name!r}; send live_open first'},
+                'Error',
+                'error',
+            )
+            return
+        changes, rejected = await live.apply(
+            append=data.get('append'), edit=data.get('edit'), delete=data.get('delete')
+        )
+        await ws_manager.send_result(
+            {'session': name, 'changes': changes, 'rejected': rejected},
+            'Live',
+            'live_update',
         )
+    elif action == 'live_close':
+        sessions.pop(name, None)
+        await ws_manager.send_result({'session': name}, 'Live', 'live_closed')
+    else:
+        await ws_manager.send_result({'message': 'Unknown action'}, 'Error', 'error')
 
 
 async def websocket_handler(request: Request) -> WebSocketResponse:
-    """WebSocket handler for real-time communication."""
+    """WebSocket handler for real-time communication.
+
+    Besides JSON text messages, accepts Arrow IPC or Parquet tables as binary
+    messages. ``live_*`` actions keep incremental analytics per connection.
+    ``analyze``/``summary`` with a ``userId`` instead of ``transactions``
+    read the transaction store; ``start``, ``end`` and ``window`` fields
+    limit either to a date range. ``?format=msgpack`` or ``?format=arrow``
+    sends results as binary frames in that encoding.
+    """
+    result_format = FORMAT_NAMES.get(request.query.get('format', 'json'), JSON)
+    if not available(result_format):
+        base_settings.logger.warning(
+            f'{result_format} results unavailable, falling back to JSON'
+        )
+        result_format = JSON
+
     ws = web.WebSocketResponse(
         # heartbeat=30,  # Send heartbeat every 30 seconds
         # autoping=True,  # Automatically respond to pings
+        max_msg_size=base_settings.max_request_mb
+        * 1024**2,
     )
     await ws.prepare(request)
 
     async with ws_lock:
         ws_connections.add(ws)
-    ws_manager = WebSocketManager(ws)
+    ws_manager = WebSocketManager(ws, result_format)
     await ws_manager.prepare()
+    live_sessions: dict[str, LiveAnalytics] = {}
 
     base_settings.logger.info('WebSocket connection established')
 
@@ -150,33 +514,31 @@ async def websocket_handler(request: Request) -> WebSocketResponse:
             if msg.type == WSMsgType.TEXT:
                 try:
                     data = msg.json()
-                    if data.get('action') == 'analyze':
-                        result = await analyze_transactions(
-                            data.get('transactions'), ws_manager
-                        )
-                        await ws_manager.send_progress(
-                            'Analysis complete', 1.0, 'Analysis'
-                        )
-                        await ws_manager.send_result(
-                            result, 'Analysis', 'analysis_complete'
-                        )
-                    elif data.get('action') == 'summary':
-                        result = await summarize_transactions(
-                            data.get('transactions'), ws_manager
+                    if str(data.get('action')).startswith('live_'):
+                        await run_live_action(ws_manager, live_sessions, data)
+                    elif 'transactions' not in data and 'userId' in data:
+                        payload, query = await asyncio.to_thread(
+                            store_request, data, transaction_store
                         )
-                        await ws_manager.send_progress(
-                            'Summary complete', 1.0, 'Summarize'
-                        )
-                        await ws_manager.send_result(
-                            result, 'Summarize', 'summary_complete'
+                        await run_ws_action(
+                            ws_manager, data.get('action'), payload, stored=query
                         )
                     else:
-                        await ws_manager.send_result(
-                            {'message': 'Unknown action'}, 'Error', 'error'
+                        await run_ws_action(
+                            ws_manager,
+                            data.get('action'),
+                            data.get('transactions'),
+                            window=date_window(data),
                         )
                 except Exception as e:
                     base_settings.logger.error(f'Message processing error: {str(e)}')
                     await ws_manager.send_result({'error': str(e)}, 'Error', 'error')
+            elif msg.type == WSMsgType.BINARY:
+                try:
+                    await run_ws_table(ws_manager, msg.data)
+                except Exception as e:
+                    base_settings.logger.error(f'Message processing error: {str(e)}')
+                    await ws_manager.send_result({'error': str(e)}, 'Error', 'error')
             elif msg.type == WSMsgType.ERROR:
                 base_settings.logger.error(f'WebSocket error: {ws.exception()}')
     finally:
@@ -188,15 +550,21 @@ async def websocket_handler(request: Request) -> WebSocketResponse:
 
 
 def init_app() -> web.Application:
-    app = web.Application()
+    app = web.Application(client_max_size=base_settings.max_request_mb * 1024**2)
     app.router.add_post('/parse-resume', parse_resume)
     app.router.add_post('/extract-text', extract_text)
     app.router.add_post('/analyze', analyze)
+    app.router.add_post('/analyze/batch', analyze_batch)
     app.router.add_post('/summarize', summarize)
+    app.router.add_post('/transactions', store_transactions)
     app.router.add_get('/ws', websocket_handler)
+    app.router.add_get('/ready', ready)
+    app.router.add_get('/metrics', metrics)
 
     # Add startup/cleanup handlers
     app.on_startup.append(start_background_tasks)
+    app.on_startup.append(start_stage_executor)
+    app.on_startup.append(start_classifier)
     app.on_cleanup.append(cleanup_background_tasks)
 
     return app
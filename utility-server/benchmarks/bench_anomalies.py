@@ -0,0 +1,72 @@
+"""Measure how the multi-feature anomaly detector scales with row count.
+
+Usage (from utility-server/):
+    python -m benchmarks.bench_anomalies [--sizes 10000,100000,1000000]
+
+Builds synthetic columnar batches spread over a few hundred merchants and
+times ``detect_anomalies`` with ``ANOMALY_DETECTOR=features``: feature
+matrix, scoring and reasons. Throughput should stay roughly flat as rows
+grow; the last column is throughput relative to the smallest size.
+"""
+
+import argparse
+import string
+import time
+
+import numpy as np
+
+from benchmarks.bench_summarize import synthetic_batch
+from models.base import TransactionBatch
+from utils.context import AnalysisContext
+from utils.settings import base_settings
+from utils.stages import detect_anomalies
+
+MERCHANTS = 400
+
+
+def merchant_batch(rows: int, seed: int = 42) -> TransactionBatch:
+    batch = synthetic_batch(rows, seed)
+    # Letters only: digits are stripped when descriptions become merchant keys
+    names = [
+        ''.join(string.ascii_uppercase[int(digit)] for digit in str(merchant))
+        for merchant in range(MERCHANTS)
+    ]
+    descriptions = np.array(
+        [f'POS {store} {names[store % MERCHANTS]} 05/11' for store in range(2000)],
+        dtype=object,
+    )
+    rng = np.random.default_rng(seed)
+    batch.description[:] = descriptions[rng.integers(0, len(descriptions), rows)]
+    return batch
+
+
+def time_detector(batch: TransactionBatch, repeats: int) -> float:
+    best = float('inf')
+    for _ in range(repeats):
+        started = time.perf_counter()
+        detect_anomalies(AnalysisContext(batch))
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='10000,100000,1000000')
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+    base_settings.anomaly_detector = 'features'
+
+    baseline = None
+    print(f'{"rows":>10}  {"seconds":>9}  {"rows/s":>12}  {"relative":>8}')
+    for rows in map(int, args.sizes.split(',')):
+        elapsed = time_detector(merchant_batch(rows), args.repeats)
+        throughput = rows / elapsed
+        baseline = baseline or throughput
+        print(
+            f'{rows:>10}  {elapsed:>9.4f}  {throughput:>12,.0f}  '
+            f'{throughput / baseline:>8.2f}'
+        )
+
+
+if __name__ == '__main__':
+    main()
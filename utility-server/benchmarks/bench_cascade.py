@@ -0,0 +1,101 @@
+"""Measure how much work the rule tier takes off the model.
+
+Usage (from utility-server/):
+    python -m benchmarks.bench_cascade [transactions.json] [--rows N]
+
+Without a file, a synthetic statement is generated from common bank
+descriptions. Reports the fraction of merchants and transactions that the
+rule tier decides, i.e. items the model no longer sees.
+"""
+
+import argparse
+import json
+import random
+import time
+
+from utils.classifier import get_labels
+from utils.merchants import group_by_merchant
+from utils.rules import get_matcher
+from utils.settings import base_settings as settings
+
+SAMPLE_DESCRIPTIONS = [
+    'POS {n} TESCO STORES {d}',
+    'UBER *TRIP {n}',
+    'UBER EATS {n}',
+    'NETFLIX.COM',
+    'SPOTIFY P{n}',
+    'Rent payment {d}',
+    'DIRECT DEBIT BRITISH GAS',
+    'Electric bill {d}',
+    'STARBUCKS #{n}',
+    'AMAZON MKTPLACE REF {n}',
+    'Salary ACME LTD',
+    'TRANSFER TO J SMITH {n}',
+    'Shell petrol {n}',
+    'PureGym membership',
+    'Boots pharmacy {n}',
+    'Local corner shop {n}',
+    'Etsy order {n}',
+    'ACME Widgets {n}',
+]
+
+
+def synthetic_descriptions(rows: int, seed: int = 42) -> list[str]:
+    rng = random.Random(seed)
+    return [
+        rng.choice(SAMPLE_DESCRIPTIONS).format(
+            n=rng.randint(1000, 9999),
+            d=f'{rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}',
+        )
+        for _ in range(rows)
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('path', nargs='?', help='JSON list of transactions')
+    parser.add_argument('--rows', type=int, default=100_000)
+    args = parser.parse_args()
+
+    if args.path:
+        with open(args.path) as f:
+            descriptions = [t['description'] for t in json.load(f)]
+    else:
+        descriptions = synthetic_descriptions(args.rows)
+
+    labels = get_labels()
+    matcher = get_matcher(tuple(labels))
+
+    started = time.perf_counter()
+    merchants, codes = group_by_merchant(descriptions)
+    grouped = time.perf_counter()
+    decided = {
+        merchant
+        for merchant in merchants
+        if (match := matcher.match(merchant)) is not None
+        and match[1] >= settings.rule_confidence_threshold
+    }
+    matched = time.perf_counter()
+
+    decided_rows = sum(1 for code in codes if merchants[code] in decided)
+    model_items = len(merchants) - len(decided)
+    print(f'transactions:              {len(descriptions)}')
+    print(f'unique merchants:          {len(merchants)}')
+    print(
+        f'rule-decided merchants:    {len(decided)} '
+        f'({len(decided) / max(len(merchants), 1):.1%})'
+    )
+    print(
+        f'rule-decided transactions: {decided_rows} '
+        f'({decided_rows / max(len(descriptions), 1):.1%})'
+    )
+    print(
+        f'model items:               {model_items} '
+        f'(was {len(merchants)} merchants, {len(descriptions)} transactions)'
+    )
+    print(f'normalize + group:         {(grouped - started) * 1000:.1f} ms')
+    print(f'rule tier:                 {(matched - grouped) * 1000:.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
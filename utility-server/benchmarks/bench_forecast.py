@@ -0,0 +1,71 @@
+"""Measure how batched category forecasting scales with the number of users.
+
+Usage (from utility-server/):
+    python -m benchmarks.bench_forecast [--users 100,1000,10000] [--months 36]
+
+Builds per-(user, category) monthly expense series with a trend, yearly
+seasonality and noise, and times one ``forecast_series`` call over all of
+them: every candidate model fitted, selected and projected 1/3/6 months
+ahead. Throughput should stay roughly flat as series grow; the last
+column is throughput relative to the smallest size.
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from utils.forecast import forecast_series
+
+CATEGORIES = 12
+
+
+def synthetic_series(
+    users: int, months: int, seed: int = 42
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    rows = users * CATEGORIES
+    grid = np.arange(months)
+    level = rng.gamma(2, 100, (rows, 1))
+    trend = rng.normal(0, 2, (rows, 1))
+    season = rng.uniform(0, 0.3, (rows, 1)) * np.cos(2 * np.pi * grid / 12)
+    series = np.maximum(
+        level * (1 + season) + trend * grid + rng.normal(0, 20, (rows, months)), 0
+    )
+    # Series start at different months, as users and categories do
+    first = rng.integers(0, months - 1, rows)
+    return series, first, np.full(rows, months - 1)
+
+
+def time_forecast(users: int, months: int, repeats: int) -> float:
+    series, first, last = synthetic_series(users, months)
+    start = np.datetime64('2021-01', 'M')
+    best = float('inf')
+    for _ in range(repeats):
+        started = time.perf_counter()
+        forecast_series(series, first, last, start)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', default='100,1000,10000')
+    parser.add_argument('--months', type=int, default=36)
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    baseline = None
+    print(f'{"series":>10}  {"seconds":>9}  {"series/s":>12}  {"relative":>8}')
+    for users in map(int, args.users.split(',')):
+        elapsed = time_forecast(users, args.months, args.repeats)
+        throughput = users * CATEGORIES / elapsed
+        baseline = baseline or throughput
+        print(
+            f'{users * CATEGORIES:>10}  {elapsed:>9.4f}  {throughput:>12,.0f}  '
+            f'{throughput / baseline:>8.2f}'
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""Measure how sharded partial aggregation scales with worker count.
+
+Usage (from utility-server/):
+    python -m benchmarks.bench_partials [--rows 5000000] [--workers 1,2,4,8]
+
+Builds a synthetic columnar batch and times ``aggregate_batch`` (spending,
+trend and summary state) plus a per-category ``distribute`` on a process
+pool with one shard per worker. Throughput should grow with workers up to
+the core count; the last column is speed-up over one worker.
+"""
+
+import argparse
+import asyncio
+import time
+
+import numpy as np
+
+from benchmarks.bench_summarize import synthetic_batch
+from models.base import TransactionBatch
+from utils.executor import stage_executor
+from utils.partials import aggregate_batch, distribute
+from utils.settings import base_settings
+
+CATEGORIES = 12
+
+
+async def time_workers(batch: TransactionBatch, workers: int, repeats: int) -> float:
+    stage_executor.kind, stage_executor.max_workers = 'process', workers
+    await stage_executor.start()
+    keys = np.random.default_rng(0).integers(0, CATEGORIES, len(batch))
+    expenses = batch.amount < 0
+    best = float('inf')
+    try:
+        # Warm the pool so worker start-up is not timed
+        await aggregate_batch(batch)
+        for _ in range(repeats):
+            started = time.perf_counter()
+            await asyncio.gather(
+                aggregate_batch(batch),
+                distribute(-batch.amount[expenses], keys[expenses], CATEGORIES),
+            )
+            best = min(best, time.perf_counter() - started)
+    finally:
+        await stage_executor.stop()
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=5_000_000)
+    parser.add_argument('--workers', default='1,2,4,8')
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+    base_settings.partial_aggregate_rows = 1
+    base_settings.partial_aggregate_shards = 0
+
+    batch = synthetic_batch(args.rows)
+    baseline = None
+    print(f'{"workers":>8}  {"seconds":>9}  {"rows/s":>12}  {"speed-up":>8}')
+    for workers in map(int, args.workers.split(',')):
+        elapsed = asyncio.run(time_workers(batch, workers, args.repeats))
+        baseline = baseline or elapsed
+        print(
+            f'{workers:>8}  {elapsed:>9.4f}  {args.rows / elapsed:>12,.0f}  '
+            f'{baseline / elapsed:>8.2f}'
+        )
+
+
+if __name__ == '__main__':
+    main()
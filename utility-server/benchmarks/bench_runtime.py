@@ -0,0 +1,84 @@
+"""Compare classifier latency, memory and agreement across CPU runtimes.
+
+Usage (from utility-server/):
+    python -m benchmarks.bench_runtime [--rows 1000] [--runtimes torch,int8,onnx]
+
+Each runtime runs in a fresh process so peak RSS is measured in isolation.
+Results are compared against the first runtime (normally eager ``torch``).
+The model and backend come from the usual CLASSIFIER_* settings.
+"""
+
+import argparse
+import multiprocessing
+import os
+import resource
+import time
+
+
+def run_runtime(runtime: str, descriptions: list[str], queue) -> None:
+    # Settings are read at import time, so select the runtime first
+    os.environ['CLASSIFIER_RUNTIME'] = runtime
+    from utils.classifier import ClassifierRegistry, get_labels
+
+    registry = ClassifierRegistry()
+    labels = get_labels()
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    registry.warmup()
+
+    started = time.perf_counter()
+    results = registry.predict(descriptions, labels)
+    elapsed = time.perf_counter() - started
+
+    queue.put(
+        {
+            'runtime': runtime,
+            'seconds_per_1k': elapsed / len(descriptions) * 1000,
+            'model_rss_mb': (
+                resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before
+            )
+            / 1024,
+            'results': results,
+        }
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000)
+    parser.add_argument('--runtimes', default='torch,int8,onnx')
+    parser.add_argument('--tolerance', type=float, default=0.05)
+    args = parser.parse_args()
+
+    from benchmarks.bench_cascade import synthetic_descriptions
+    from utils.merchants import normalize_merchant
+
+    descriptions = [normalize_merchant(d) for d in synthetic_descriptions(args.rows)]
+    context = multiprocessing.get_context('spawn')
+    reports = []
+    for runtime in args.runtimes.split(','):
+        queue = context.Queue()
+        process = context.Process(
+            target=run_runtime, args=(runtime, descriptions, queue)
+        )
+        process.start()
+        reports.append(queue.get())
+        process.join()
+
+    reference = reports[0]['results']
+    print(
+        f'{"runtime":<8} {"s/1k":>8} {"RSS MB":>8} {"agree":>7} '
+        f'{"max |dscore|":>13} {"within tol":>10}'
+    )
+    for report in reports:
+        results = report['results']
+        agree = sum(a[0] == b[0] for a, b in zip(results, reference)) / len(results)
+        diff = max(abs(a[1] - b[1]) for a, b in zip(results, reference))
+        print(
+            f'{report["runtime"]:<8} {report["seconds_per_1k"]:>8.3f} '
+            f'{report["model_rss_mb"]:>8.1f} {agree:>7.1%} {diff:>13.4f} '
+            f'{str(diff <= args.tolerance):>10}'
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""Measure how the summary aggregation kernel scales with row count.
+
+Usage (from utility-server/):
+    python -m benchmarks.bench_summarize [--sizes 10000,100000,1000000,5000000]
+
+Builds synthetic columnar batches (no JSON ingestion) and times the
+date sort plus ``summary_aggregates`` for each size. Throughput should stay
+roughly flat as rows grow; the last column is throughput relative to the
+smallest size.
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from models.base import TransactionBatch
+from utils.context import AnalysisContext
+from utils.summarize import summary_aggregates
+
+
+def synthetic_batch(rows: int, seed: int = 42) -> TransactionBatch:
+    rng = np.random.default_rng(seed)
+    start = np.datetime64('2022-01-01', 'ns')
+    seconds = rng.integers(0, 3 * 365 * 86400, rows) * np.timedelta64(1, 's')
+    amount = np.round(rng.normal(-40, 120, rows), 2)
+    return TransactionBatch(
+        _id=np.arange(rows).astype(str).astype(object),
+        amount=amount,
+        balance=np.cumsum(amount),
+        createdAt=np.full(rows, np.datetime64('NaT', 'ns')),
+        date=start + seconds,
+        description=np.full(rows, 'synthetic', dtype=object),
+        type=pd.Categorical(np.where(amount < 0, 'debit', 'credit')),
+        updatedAt=np.full(rows, np.datetime64('NaT', 'ns')),
+        userId=pd.Categorical(np.full(rows, 'u1')),
+    )
+
+
+def time_kernel(batch: TransactionBatch, repeats: int) -> float:
+    best = float('inf')
+    for _ in range(repeats):
+        started = time.perf_counter()
+        summary_aggregates(AnalysisContext(batch))
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='10000,100000,1000000,5000000')
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    baseline = None
+    print(f'{"rows":>10}  {"seconds":>9}  {"rows/s":>12}  {"relative":>8}')
+    for rows in map(int, args.sizes.split(',')):
+        elapsed = time_kernel(synthetic_batch(rows), args.repeats)
+        throughput = rows / elapsed
+        baseline = baseline or throughput
+        print(
+            f'{rows:>10}  {elapsed:>9.4f}  {throughput:>12,.0f}  '
+            f'{throughput / baseline:>8.2f}'
+        )
+
+
+if __name__ == '__main__':
+    main()
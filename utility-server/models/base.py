@@ -1,6 +1,10 @@
 from dataclasses import dataclass
 from datetime import datetime
 
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
 
 @dataclass
 class Transaction:
@@ -13,3 +17,102 @@ class Transaction:
     type: str
     updatedAt: datetime
     userId: str
+
+
+@dataclass
+class TransactionBatch:
+    """Columnar transactions: one NumPy array (or categorical) per field.
+
+    Dates are ``datetime64[ns]`` without a timezone: the source's local
+    wall-clock time, or UTC with ``DATE_BUCKETS=utc``. ``tz_aware`` records
+    whether they are UTC instants, so they can be rendered back with
+    ``+00:00``.
+    """
+
+    _id: np.ndarray
+    amount: np.ndarray
+    balance: np.ndarray
+    createdAt: np.ndarray
+    date: np.ndarray
+    description: np.ndarray
+    type: pd.Categorical
+    updatedAt: np.ndarray
+    userId: pd.Categorical
+    tz_aware: bool = False
+
+    def __len__(self) -> int:
+        return len(self.amount)
+
+    def take(self, indices: np.ndarray) -> 'TransactionBatch':
+        """Return the rows at ``indices`` (integer positions or a boolean mask)."""
+        return TransactionBatch(
+            _id=self._id[indices],
+            amount=self.amount[indices],
+            balance=self.balance[indices],
+            createdAt=self.createdAt[indices],
+            date=self.date[indices],
+            description=self.description[indices],
+            type=self.type[indices],
+            updatedAt=self.updatedAt[indices],
+            userId=self.userId[indices],
+            tz_aware=self.tz_aware,
+        )
+
+    @classmethod
+    def empty(cls, tz_aware: bool = False) -> 'TransactionBatch':
+        """A batch without rows, e.g. to render dates of precomputed aggregates."""
+        timestamps = np.array([], dtype='datetime64[ns]')
+        return cls(
+            _id=np.array([], dtype=object),
+            amount=np.array([], dtype=np.float64),
+            balance=np.array([], dtype=np.float64),
+            createdAt=timestamps,
+            date=timestamps,
+            description=np.array([], dtype=object),
+            type=pd.Categorical([]),
+            updatedAt=timestamps,
+            userId=pd.Categorical([]),
+            tz_aware=tz_aware,
+        )
+
+    @classmethod
+    def concat(cls, batches: list['TransactionBatch']) -> 'TransactionBatch':
+        """Join batches end to end (e.g. chunks of one streamed upload)."""
+        if len(batches) == 1:
+            return batches[0]
+        return cls(
+            _id=np.concatenate([b._id for b in batches]),
+            amount=np.concatenate([b.amount for b in batches]),
+            balance=np.concatenate([b.balance for b in batches]),
+            createdAt=np.concatenate([b.createdAt for b in batches]),
+            date=np.concatenate([b.date for b in batches]),
+            description=np.concatenate([b.description for b in batches]),
+            type=union_categoricals([b.type for b in batches], sort_categories=True),
+            updatedAt=np.concatenate([b.updatedAt for b in batches]),
+            userId=union_categoricals(
+                [b.userId for b in batches], sort_categories=True
+            ),
+            tz_aware=any(b.tz_aware for b in batches),
+        )
+
+    def to_frame(self) -> pd.DataFrame:
+        """Return the batch as a DataFrame without copying the numeric columns."""
+        return pd.DataFrame(
+            {
+                '_id': self._id,
+                'amount': self.amount,
+                'balance': self.balance,
+                'createdAt': self.createdAt,
+                'date': self.date,
+                'description': self.description,
+                'type': self.type,
+                'updatedAt': self.updatedAt,
+                'userId': self.userId,
+            },
+            copy=False,
+        )
+
+    def isoformat(self, values: np.ndarray) -> list[str]:
+        """Render ``datetime64`` values as ISO-8601 strings like the source data."""
+        suffix = '+00:00' if self.tz_aware else ''
+        return [pd.Timestamp(value).isoformat() + suffix for value in values]
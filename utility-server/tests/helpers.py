@@ -0,0 +1,12 @@
+def transaction(day='2024-01-05', description='Rent', amount=-12.5, **fields):
+    """A raw transaction dated 09:00 UTC on ``day``; ``fields`` add or override keys."""
+    numeric = isinstance(amount, (int, float))
+    return {
+        'amount': amount,
+        'balance': 100,
+        'date': f'{day}T09:00:00Z',
+        'description': description,
+        'type': 'credit' if numeric and amount > 0 else 'debit',
+        'userId': 'u1',
+        **fields,
+    }
@@ -0,0 +1,177 @@
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from utils.anomalies import (
+    FEATURES,
+    AnomalyModelCache,
+    MadDetector,
+    anomaly_features,
+    anomaly_models,
+    feature_anomalies,
+)
+from utils.context import AnalysisContext
+from utils.ingest import ingest_transactions
+from utils.stages import detect_anomalies
+
+
+def history(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return np.round(-rng.gamma(2.0, 20.0, n), 2)
+
+
+class TestMadDetector(unittest.TestCase):
+    def test_flags_far_amounts(self):
+        amounts = np.array([-10, -11, -9, -10, -12, -10, -500, 300], dtype=float)
+        flags = MadDetector(threshold=3.5).fit(amounts).predict(amounts)
+        self.assertEqual(np.flatnonzero(flags).tolist(), [6, 7])
+
+    def test_constant_history_has_no_outliers(self):
+        amounts = np.full(10, -5.0)
+        self.assertFalse(MadDetector().fit(amounts).predict(amounts).any())
+
+
+class TestAnomalyModelCache(unittest.TestCase):
+    def test_refits_only_after_enough_new_rows(self):
+        cache = AnomalyModelCache(refit_fraction=0.1)
+        amounts = history(1000)
+        flags = cache.flags('u1', amounts)
+        self.assertIs(cache.flags('u1', amounts.copy()), flags)
+        # 5% more rows: scored with the cached model
+        cache.flags('u1', np.concatenate([amounts, history(50, seed=1)]))
+        self.assertEqual(cache.stats()['fits'], 1)
+        # 20% more rows: refit
+        cache.flags('u1', np.concatenate([amounts, history(200, seed=1)]))
+        cache.flags('u2', amounts)
+        self.assertEqual(
+            cache.stats(), {'hits': 1, 'reused': 1, 'fits': 3, 'entries': 2}
+        )
+
+    def test_refits_when_the_fitted_rows_change(self):
+        cache = AnomalyModelCache(refit_fraction=0.1)
+        rng = np.random.default_rng(0)
+        cache.flags('u', rng.normal(-50, 10, 1000))
+        # Same user and size, different data: the old model would flag it all
+        amounts = rng.normal(-5000, 1000, 1000)
+        flags = cache.flags('u', amounts)
+        self.assertEqual(cache.stats()['fits'], 2)
+        self.assertEqual(flags.sum(), AnomalyModelCache().flags('u', amounts).sum())
+        # Edited earlier rows are refit too, even within ``refit_fraction``
+        edited = np.concatenate([amounts, rng.normal(-5000, 1000, 10)])
+        edited[0] = -1
+        cache.flags('u', edited)
+        self.assertEqual(cache.stats(), {**cache.stats(), 'reused': 0, 'fits': 3})
+
+    def test_lru_eviction(self):
+        cache = AnomalyModelCache(max_entries=1)
+        cache.flags('u1', history(100))
+        cache.flags('u2', history(100))
+        self.assertEqual(cache.stats()['entries'], 1)
+
+    def test_large_histories_switch_to_mad(self):
+        cache = AnomalyModelCache()
+        with mock.patch('utils.anomalies.settings.anomaly_mad_rows', 100):
+            cache.flags('u1', history(100))
+        (key,) = cache._models
+        self.assertEqual(key, 'mad:u1')
+
+
+def merchant_history():
+    rows = [
+        (f'2024-{month:02d}-05T09:00:00Z', -15.99, 'NETFLIX.COM')
+        for month in range(1, 13)
+    ]
+    rows += [
+        (str(np.datetime64('2024-01-06') + np.timedelta64(7 * week, 'D')), amount, desc)
+        for week, amount, desc in zip(
+            range(52),
+            np.round(-50 - 10 * np.sin(np.arange(52)), 2),
+            [f'POS {week} TESCO STORES' for week in range(52)],
+        )
+    ]
+    # A double subscription charge and a very large grocery bill
+    rows.append(('2024-03-06T09:00:00Z', -15.99, 'NETFLIX.COM'))
+    rows.append(('2024-06-20T12:00:00Z', -900.0, 'POS 77 TESCO STORES'))
+    batch, _ = ingest_transactions(
+        [
+            {
+                'amount': amount,
+                'balance': 0,
+                'date': date,
+                'description': description,
+                'type': 'debit',
+                'userId': 'u1',
+            }
+            for date, amount, description in rows
+        ]
+    )
+    return batch
+
+
+class TestFeatureAnomalies(unittest.TestCase):
+    def test_feature_matrix(self):
+        batch = merchant_history()
+        features, details = anomaly_features(batch)
+        self.assertEqual(features.shape, (len(batch), len(FEATURES)))
+        self.assertEqual(sorted(details['merchants']), ['netflix com', 'tesco stores'])
+        # Gaps are per merchant, in days; the first charge has none
+        self.assertTrue(np.isnan(details['gaps'][0]))
+        self.assertAlmostEqual(details['gaps'][-2], 1.0)
+
+    def test_reasons_come_from_the_dominant_feature(self):
+        batch = merchant_history()
+        flagged, reasons = feature_anomalies(batch)
+        by_row = dict(zip(flagged.tolist(), reasons))
+        self.assertEqual(
+            by_row[len(batch) - 2],
+            'Repeat charge from netflix com only 1.0 days after the previous one.',
+        )
+        self.assertTrue(
+            by_row[len(batch) - 1].startswith('Unusually large expense of -900.0')
+        )
+
+    def test_same_response_shape(self):
+        anomaly_models.clear()
+        with mock.patch('utils.anomalies.settings.anomaly_detector', 'features'):
+            anomalies = detect_anomalies(AnalysisContext(merchant_history()))
+        self.assertEqual(set(anomalies[0]), {'date', 'description', 'amount', 'reason'})
+
+
+class TestDetectAnomalies(unittest.TestCase):
+    def setUp(self):
+        anomaly_models.clear()
+
+    def test_reasons(self):
+        amounts = [-20.0] * 30 + [5000.0, -4000.0]
+        descriptions = ['Groceries'] * 30 + ['Bonus', 'Luxury watch']
+        batch, _ = ingest_transactions(
+            [
+                {
+                    'amount': amount,
+                    'balance': 0,
+                    'date': f'2024-01-{day % 28 + 1:02d}T00:00:00Z',
+                    'description': description,
+                    'type': 'debit',
+                    'userId': 'u1',
+                }
+                for day, (amount, description) in enumerate(zip(amounts, descriptions))
+            ]
+        )
+        anomalies = detect_anomalies(AnalysisContext(batch))
+        by_description = {a['description']: a for a in anomalies}
+        self.assertTrue(
+            by_description['Bonus']['reason'].startswith(
+                'Unusually high income of 5000.0 detected (Z-score: '
+            )
+        )
+        self.assertTrue(
+            by_description['Luxury watch']['reason'].startswith(
+                'Unusually large expense of -4000.0'
+            )
+        )
+        self.assertEqual(by_description['Bonus']['date'], '2024-01-03T00:00:00+00:00')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+import unittest
+
+from tests.helpers import transaction
+from utils.analyzer import analyze_transactions
+from utils.batch import analyze_users
+from utils.summarize import summarize_transactions
+
+# Every description is decided by the rule tier, so no model is needed
+TRANSACTIONS = [
+    transaction('2024-01-01', 'NETFLIX.COM', -15, userId='u2'),
+    transaction('2024-01-02', 'Rent payment', -900, userId='u1'),
+    transaction('2024-01-03', 'TESCO STORES 1234', -40, userId='u1'),
+    transaction('2024-01-04', 'Shell petrol', -60, userId='u2'),
+    transaction('2024-01-05', 'Uber refund', 25, userId='u1'),
+    transaction('2024-01-06', 'Rent payment', -700, userId='u2'),
+    {'amount': 'oops', 'userId': 'u1'},
+]
+
+
+class TestAnalyzeUsers(unittest.IsolatedAsyncioTestCase):
+    async def test_results_match_per_user_endpoints(self):
+        result = await analyze_users(TRANSACTIONS)
+        self.assertEqual(sorted(result['users']), ['u1', 'u2'])
+        self.assertEqual([r['index'] for r in result['rejected']], [6])
+
+        for user, user_result in result['users'].items():
+            rows = [t for t in TRANSACTIONS[:-1] if t['userId'] == user]
+            analysis = await analyze_transactions(rows)
+            analysis.pop('rejected')
+            self.assertEqual(user_result['analysis'], analysis)
+            summary = await summarize_transactions(rows)
+            summary.pop('rejected', None)
+            self.assertEqual(user_result['summary'], summary)
+
+    async def test_user_without_income_gets_summary_error(self):
+        result = await analyze_users(TRANSACTIONS)
+        self.assertIn('error', result['users']['u2']['summary'])
+        self.assertIn('income', result['users']['u1']['summary'])
+
+    async def test_empty_payload(self):
+        self.assertEqual(await analyze_users([]), {'error': 'No transactions provided'})
+
+
+if __name__ == '__main__':
+    unittest.main()
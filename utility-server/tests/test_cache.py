@@ -0,0 +1,62 @@
+import os
+import tempfile
+import unittest
+
+from utils.cache import ClassificationCache, normalize_description
+
+LABELS = ['groceries', 'housing']
+
+
+class TestClassificationCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'cache.sqlite3')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_normalize_description(self):
+        self.assertEqual(normalize_description('  Rent   PAYMENT '), 'rent payment')
+
+    def test_hits_and_misses(self):
+        cache = ClassificationCache(path=self.path)
+        self.assertEqual(cache.get_many(['rent'], LABELS, 'model'), {})
+        cache.put_many({'rent': ('housing', 0.8)}, LABELS, 'model')
+        self.assertEqual(
+            cache.get_many(['rent', 'uber'], LABELS, 'model'),
+            {'rent': ('housing', 0.8)},
+        )
+        stats = cache.stats()
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 2)
+
+    def test_survives_restart(self):
+        ClassificationCache(path=self.path).put_many(
+            {'rent': ('housing', 0.8)}, LABELS, 'model'
+        )
+        cache = ClassificationCache(path=self.path)
+        self.assertEqual(
+            cache.get_many(['rent'], LABELS, 'model'), {'rent': ('housing', 0.8)}
+        )
+        self.assertEqual(cache.stats()['disk_hits'], 1)
+
+    def test_label_or_model_change_invalidates(self):
+        cache = ClassificationCache(path=self.path)
+        cache.put_many({'rent': ('housing', 0.8)}, LABELS, 'model')
+        self.assertEqual(cache.get_many(['rent'], LABELS + ['other'], 'model'), {})
+        self.assertEqual(cache.get_many(['rent'], LABELS, 'other-model'), {})
+        # Label order does not matter
+        self.assertIn('rent', cache.get_many(['rent'], LABELS[::-1], 'model'))
+
+    def test_lru_eviction(self):
+        cache = ClassificationCache(max_entries=2)
+        cache.put_many({'a': ('housing', 1.0), 'b': ('housing', 1.0)}, LABELS, 'model')
+        cache.get_many(['a'], LABELS, 'model')
+        cache.put_many({'c': ('housing', 1.0)}, LABELS, 'model')
+        self.assertEqual(
+            set(cache.get_many(['a', 'b', 'c'], LABELS, 'model')), {'a', 'c'}
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
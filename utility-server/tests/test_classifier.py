@@ -0,0 +1,83 @@
+import json
+import tempfile
+import unittest
+from unittest import mock
+
+from utils.classifier import ClassifierRegistry
+
+
+class FakeBackend:
+    def predict(self, descriptions, labels):
+        return [(labels[0], 0.9) for _ in descriptions]
+
+
+class TestClassifierRegistry(unittest.TestCase):
+    def test_model_loaded_once(self):
+        registry = ClassifierRegistry()
+        with mock.patch.object(registry, '_load', return_value=FakeBackend()) as load:
+            registry.predict(['rent'], ['housing'])
+            registry.predict(['uber'], ['transportation'])
+        load.assert_called_once()
+
+    def test_ready_after_warmup(self):
+        registry = ClassifierRegistry()
+        self.assertFalse(registry.ready)
+        with mock.patch.object(registry, '_load', return_value=FakeBackend()):
+            registry.warmup()
+        self.assertTrue(registry.ready)
+
+    def test_predict_returns_top_label(self):
+        registry = ClassifierRegistry()
+        with mock.patch.object(registry, '_load', return_value=FakeBackend()):
+            results = registry.predict(['rent', 'uber'], ['housing', 'other'])
+        self.assertEqual(results, [('housing', 0.9), ('housing', 0.9)])
+
+
+class TestModelId(unittest.TestCase):
+    def test_embedding_id_follows_the_exemplars(self):
+        registry = ClassifierRegistry()
+        ids = set()
+        for exemplars in ({'housing': ['rent']}, {'housing': ['mortgage']}):
+            with tempfile.NamedTemporaryFile('w', suffix='.json') as f:
+                json.dump(exemplars, f)
+                f.flush()
+                with mock.patch.multiple(
+                    'utils.classifier.settings',
+                    classifier_backend='embedding',
+                    classifier_exemplars_path=f.name,
+                ):
+                    ids.add(registry.model_id)
+        self.assertEqual(len(ids), 2)
+
+    def test_loader_gets_the_plain_model_name(self):
+        registry = ClassifierRegistry()
+        with mock.patch.multiple(
+            'utils.classifier.settings',
+            classifier_backend='zero-shot',
+            classifier_model='org/finance-nli',
+            classifier_model_path=None,
+            classifier_runtime='torch',
+        ), mock.patch(
+            'utils.runtime.AutoModelForSequenceClassification.from_pretrained'
+        ) as load_model, mock.patch(
+            'utils.classifier.AutoTokenizer.from_pretrained'
+        ) as load_tokenizer, mock.patch(
+            'utils.classifier.pipeline'
+        ):
+            registry.get()
+            self.assertEqual(registry.model_id, 'org/finance-nli@torch')
+        # The runtime suffix is only for cache keys
+        load_model.assert_called_once_with('org/finance-nli')
+        load_tokenizer.assert_called_once_with('org/finance-nli')
+
+    def test_id_includes_the_runtime(self):
+        registry = ClassifierRegistry()
+        ids = set()
+        for runtime in ('torch', 'int8', 'onnx'):
+            with mock.patch('utils.classifier.settings.classifier_runtime', runtime):
+                ids.add(registry.model_id)
+        self.assertEqual(len(ids), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import unittest
+
+import numpy as np
+
+from utils.context import AnalysisContext, group_starts
+from utils.ingest import ingest_transactions
+from utils.windows import DateWindow
+
+
+def make_context():
+    rows = [
+        ('2024-01-02T18:00:00Z', -5, 95),
+        ('2024-01-01T09:00:00Z', 100, 100),
+        ('2024-01-02T08:00:00Z', -20, 80),
+        ('2024-01-02T18:00:00Z', -1, 94),
+        ('2024-02-10T12:00:00Z', -30, 64),
+    ]
+    batch, _ = ingest_transactions(
+        [
+            {
+                'amount': amount,
+                'balance': balance,
+                'date': date,
+                'description': 'shop',
+                'type': 'debit',
+                'userId': 'u1',
+            }
+            for date, amount, balance in rows
+        ]
+    )
+    return AnalysisContext(batch)
+
+
+class TestAnalysisContext(unittest.TestCase):
+    def test_group_starts(self):
+        self.assertEqual(group_starts(np.array([1, 1, 2, 3, 3])).tolist(), [0, 2, 3])
+        self.assertEqual(group_starts(np.array([])).tolist(), [])
+
+    def test_sort_is_stable(self):
+        context = make_context()
+        self.assertEqual(context.order.tolist(), [1, 2, 0, 3, 4])
+        self.assertEqual(context.balances.tolist(), [100, 80, 95, 94, 64])
+
+    def test_daily_aggregates(self):
+        context = make_context()
+        self.assertEqual(
+            np.datetime_as_string(context.days).tolist(),
+            ['2024-01-01', '2024-01-02', '2024-02-10'],
+        )
+        self.assertEqual(context.daily_totals.tolist(), [100, -26, -30])
+        # Ties on the same timestamp keep payload order, so the later row wins
+        self.assertEqual(context.daily_closing_balance.tolist(), [100, 94, 64])
+
+    def test_monthly_aggregates(self):
+        context = make_context()
+        self.assertEqual(len(context.months), 2)
+        self.assertEqual(context.month_codes.tolist(), [0, 0, 0, 0, 1])
+        # Payload order, no sort needed
+        self.assertEqual(context.month_offsets.tolist(), [0, 0, 0, 0, 1])
+        self.assertEqual(context.monthly_income.tolist(), [100, 0])
+        self.assertEqual(context.monthly_expense.tolist(), [26, 30])
+        self.assertEqual(context.total_income, 100)
+        self.assertEqual(context.total_spent, -56)
+
+    def test_window_keeps_payload_order(self):
+        context = make_context()
+        window = context.window(DateWindow('2024-01-02', '2024-01-31'))
+        self.assertEqual(window.batch.amount.tolist(), [-5, -20, -1])
+        # The reused date order matches sorting the selected rows again
+        self.assertEqual(window.order.tolist(), [1, 0, 2])
+        self.assertEqual(window.daily_closing_balance.tolist(), [94])
+        self.assertIs(context.window(DateWindow()), context)
+
+
+if __name__ == '__main__':
+    unittest.main()
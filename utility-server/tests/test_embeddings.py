@@ -0,0 +1,56 @@
+import unittest
+from collections import OrderedDict
+from threading import Lock
+from unittest import mock
+
+import numpy as np
+
+from utils.embeddings import EmbeddingClassifier
+
+VOCABULARY = ['rent', 'housing', 'uber', 'taxi', 'transportation']
+
+
+def bag_of_words(texts):
+    vectors = np.array(
+        [[float(word in text.split()) for word in VOCABULARY] for text in texts]
+    )
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+
+class TestEmbeddingClassifier(unittest.TestCase):
+    def setUp(self):
+        # Skip model loading; encode with a bag-of-words stand-in
+        self.classifier = EmbeddingClassifier.__new__(EmbeddingClassifier)
+        self.classifier._embeddings = OrderedDict()
+        self.classifier._centroids = {}
+        self.classifier._lock = Lock()
+        self.classifier._encode = mock.Mock(side_effect=bag_of_words)
+        exemplars = {'housing': ['rent'], 'transportation': ['uber', 'taxi']}
+        patcher = mock.patch('utils.embeddings.load_exemplars', return_value=exemplars)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_nearest_centroid(self):
+        results = self.classifier.predict(
+            ['rent due', 'uber ride'], ['housing', 'transportation']
+        )
+        self.assertEqual([label for label, _ in results], ['housing', 'transportation'])
+
+    def test_descriptions_are_encoded_once(self):
+        labels = ['housing', 'transportation']
+        self.classifier.predict(['rent due', 'rent due'], labels)
+        self.classifier.predict(['rent due', 'uber ride'], labels)
+        encoded = [call.args[0] for call in self.classifier._encode.call_args_list]
+        # Each unique description once, plus a single centroid build
+        self.assertEqual(
+            encoded,
+            [
+                ['rent due'],
+                ['housing', 'rent', 'transportation', 'uber', 'taxi'],
+                ['uber ride'],
+            ],
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
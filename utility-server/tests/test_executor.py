@@ -0,0 +1,90 @@
+import asyncio
+import threading
+import unittest
+
+from utils.analyzer import run_stages
+from utils.executor import StageExecutor
+
+
+def current_thread_name():
+    return threading.current_thread().name
+
+
+def fail():
+    raise ValueError('boom')
+
+
+class FakeManager:
+    def __init__(self):
+        self.messages = []
+
+    async def send_progress(self, message, progress, tag=None):
+        self.messages.append((message, round(progress, 3)))
+
+
+class TestStageExecutor(unittest.IsolatedAsyncioTestCase):
+    async def test_runs_on_pool_threads(self):
+        executor = StageExecutor('thread', max_workers=2)
+        await executor.start()
+        try:
+            name = await executor.run(current_thread_name)
+        finally:
+            await executor.stop()
+        self.assertTrue(name.startswith('analysis'))
+        self.assertEqual(executor.stats()['completed'], 1)
+
+    async def test_falls_back_to_thread_when_stopped(self):
+        executor = StageExecutor()
+        name = await executor.run(current_thread_name)
+        self.assertNotEqual(name, threading.current_thread().name)
+
+    async def test_counts_failures(self):
+        executor = StageExecutor('thread')
+        await executor.start()
+        try:
+            with self.assertRaises(ValueError):
+                await executor.run(fail)
+        finally:
+            await executor.stop()
+        self.assertEqual(executor.stats()['failed'], 1)
+
+    def test_rejects_unknown_kind(self):
+        with self.assertRaises(ValueError):
+            StageExecutor('fibre')
+
+
+class TestRunStages(unittest.IsolatedAsyncioTestCase):
+    async def test_progress_follows_completion_order(self):
+        async def stage(value, delay):
+            await asyncio.sleep(delay)
+            return value
+
+        manager = FakeManager()
+        results = await run_stages(
+            {'anomalies': stage(1, 0.05), 'spending_trends': stage(2, 0)},
+            manager,
+        )
+        self.assertEqual(
+            list(results.items()), [('anomalies', 1), ('spending_trends', 2)]
+        )
+        self.assertEqual(
+            manager.messages,
+            [('Spending trends predicted', 0.55), ('Anomalies detected', 0.9)],
+        )
+
+    async def test_failure_cancels_other_stages(self):
+        async def slow():
+            await asyncio.sleep(10)
+
+        async def broken():
+            raise ValueError('boom')
+
+        slow_stage = asyncio.ensure_future(slow())
+        with self.assertRaises(ValueError):
+            await run_stages({'anomalies': slow_stage, 'spending_trends': broken()})
+        await asyncio.sleep(0)
+        self.assertTrue(slow_stage.cancelled())
+
+
+if __name__ == '__main__':
+    unittest.main()
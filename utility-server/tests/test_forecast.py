@@ -0,0 +1,109 @@
+import unittest
+
+import numpy as np
+
+from utils.context import AnalysisContext
+from utils.forecast import category_forecasts, forecast_series, monthly_forecast
+from utils.ingest import ingest_transactions
+from utils.stages import predict_trends
+
+START = np.datetime64('2022-01', 'M')
+
+
+class TestForecastSeries(unittest.TestCase):
+    def test_linear_history_projects_the_line(self):
+        forecast = monthly_forecast(START + np.arange(24), 100 + 5 * np.arange(24.0))
+        self.assertEqual(forecast['model'], 'linear')
+        self.assertEqual(forecast['last_month'], '2023-12')
+        projections = forecast['projections']
+        self.assertEqual(projections['6_months']['through'], '2024-06')
+        # Months 24..29 of 100 + 5t
+        self.assertAlmostEqual(projections['1_month']['expected'], 220, places=4)
+        self.assertAlmostEqual(projections['6_months']['expected'], 1395, places=4)
+
+    def test_seasonal_history_projects_the_season(self):
+        months = np.arange(36)
+        noise = np.random.default_rng(0).normal(0, 2, len(months))
+        expense = 200 + 50 * np.cos(2 * np.pi * months / 12) + noise
+        forecast = monthly_forecast(START + months, expense)
+        self.assertEqual(forecast['model'], 'seasonal')
+        january = forecast['projections']['1_month']
+        self.assertAlmostEqual(january['expected'], 250, delta=3)
+        self.assertLess(january['lower'], january['expected'])
+        self.assertGreater(january['upper'], january['expected'])
+
+    def test_short_and_missing_history(self):
+        # Sparse months count the gap as a month without spending
+        forecast = monthly_forecast(
+            np.array(['2024-01', '2024-03'], dtype='datetime64[M]'),
+            np.array([30.0, 60.0]),
+        )
+        self.assertEqual(forecast['model'], 'mean')
+        self.assertEqual(forecast['months_observed'], 3)
+        self.assertAlmostEqual(forecast['projections']['3_months']['expected'], 90)
+        self.assertGreaterEqual(forecast['projections']['1_month']['lower'], 0)
+        self.assertIsNone(monthly_forecast(np.array([], 'datetime64[M]'), []))
+
+    def test_batched_rows_match_single_series(self):
+        rng = np.random.default_rng(1)
+        series = rng.gamma(2, 50, (5, 30))
+        first = np.array([0, 3, 10, 25, 30])
+        last = np.array([29, 29, 27, 29, 29])
+        batched = forecast_series(series, first, last, START)
+        for row in range(4):
+            history = slice(first[row], last[row] + 1)
+            single = monthly_forecast(
+                START + np.arange(30)[history], series[row, history]
+            )
+            self.assertEqual(batched.describe(row)['model'], single['model'])
+            np.testing.assert_allclose(
+                batched.expected[row],
+                [p['expected'] for p in single['projections'].values()],
+            )
+        # A row whose history starts after it ends has nothing to forecast
+        self.assertIsNone(batched.describe(4))
+
+
+class TestCategoryForecasts(unittest.TestCase):
+    def test_series_per_group_and_category(self):
+        dates = np.array(
+            ['2024-01-05', '2024-02-05', '2024-03-05', '2024-01-09', '2024-04-09'],
+            dtype='datetime64[ns]',
+        )
+        amounts = np.array([-10.0, -20.0, -30.0, -5.0, 500.0])
+        # Two labels; rows 0-2 are group 0 label 1, rows 3-4 are group 1 label 0
+        codes = np.array([1, 1, 1, 2, 2])
+        forecasts = category_forecasts(dates, amounts, codes, 2, 2)
+        self.assertIsNone(forecasts.describe(0))
+        self.assertIsNone(forecasts.describe(3))
+        first = forecasts.describe(1)
+        self.assertEqual(
+            (first['months_observed'], first['last_month']), (3, '2024-03')
+        )
+        # Group 1 kept transacting after its only expense
+        second = forecasts.describe(2)
+        self.assertEqual(
+            (second['months_observed'], second['last_month']), (4, '2024-04')
+        )
+
+    def test_predict_trends_forecasts_monthly_spend(self):
+        batch, _ = ingest_transactions(
+            [
+                {
+                    'amount': amount,
+                    'balance': 0,
+                    'date': f'2024-{month:02d}-10T09:00:00Z',
+                    'description': 'Rent payment',
+                    'type': 'debit',
+                    'userId': 'u1',
+                }
+                for month, amount in ((1, -100), (2, -120), (2, 900), (3, -140))
+            ]
+        )
+        forecast = predict_trends(AnalysisContext(batch))['forecast']
+        self.assertEqual(forecast['last_month'], '2024-03')
+        self.assertAlmostEqual(forecast['projections']['1_month']['expected'], 120)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,172 @@
+import json
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from utils.formats import (
+    ARROW_FILE,
+    ARROW_STREAM,
+    JSON,
+    MSGPACK,
+    PARQUET,
+    UnsupportedMediaType,
+    available,
+    encode,
+    negotiate,
+    sniff_table,
+)
+from utils.ingest import ingest_table
+
+HAS_ARROW = available(ARROW_STREAM)
+HAS_MSGPACK = available(MSGPACK)
+
+
+def transactions_table(**metadata):
+    import pyarrow as pa
+
+    table = pa.table(
+        {
+            '_id': ['1', '2', '3'],
+            'amount': [-12.5, 100.0, -3.0],
+            'balance': [87.5, 187.5, 184.5],
+            'createdAt': ['2024-01-01T00:00:00.000Z'] * 3,
+            'date': pa.array(
+                pd.to_datetime(
+                    [
+                        '2024-01-05T10:00:00Z',
+                        '2024-01-06T00:00:00Z',
+                        '2024-02-01T00:00:00Z',
+                    ],
+                    utc=True,
+                )
+            ),
+            'description': ['Rent', 'Salary', 'Coffee'],
+            'type': ['debit', 'credit', 'debit'],
+            'updatedAt': ['2024-01-01T00:00:00.000Z'] * 3,
+            'userId': ['u1'] * 3,
+        }
+    )
+    return table.replace_schema_metadata(metadata)
+
+
+def serialize(table, media_type):
+    import pyarrow as pa
+
+    sink = pa.BufferOutputStream()
+    if media_type == PARQUET:
+        import pyarrow.parquet as pq
+
+        pq.write_table(table, sink)
+    else:
+        new = pa.ipc.new_file if media_type == ARROW_FILE else pa.ipc.new_stream
+        with new(sink, table.schema) as writer:
+            writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+class TestNegotiate(unittest.TestCase):
+    def test_defaults_to_json(self):
+        self.assertEqual(negotiate(None), JSON)
+        self.assertEqual(negotiate('*/*'), JSON)
+        self.assertEqual(negotiate('text/html'), JSON)
+
+    @unittest.skipUnless(HAS_MSGPACK, 'msgpack not installed')
+    def test_quality_values(self):
+        self.assertEqual(negotiate('application/x-msgpack'), MSGPACK)
+        self.assertEqual(
+            negotiate('application/json;q=0.5, application/msgpack;q=0.9'), MSGPACK
+        )
+        self.assertEqual(negotiate('application/msgpack;q=0, */*'), JSON)
+
+
+class TestEncode(unittest.TestCase):
+    result = {'summary': {'total': 1.5, 'months': ['2024-01']}, 'rejected': []}
+
+    def test_json(self):
+        self.assertEqual(json.loads(encode(self.result, JSON)), self.result)
+
+    @unittest.skipUnless(HAS_MSGPACK, 'msgpack not installed')
+    def test_msgpack_round_trip(self):
+        import msgpack
+
+        self.assertEqual(msgpack.unpackb(encode(self.result, MSGPACK)), self.result)
+
+    @unittest.skipUnless(HAS_ARROW, 'pyarrow not installed')
+    def test_arrow_is_a_one_row_table(self):
+        import pyarrow as pa
+
+        table = pa.ipc.open_stream(encode(self.result, ARROW_STREAM)).read_all()
+        self.assertEqual(table.num_rows, 1)
+        self.assertEqual(table.column('summary')[0]['total'].as_py(), 1.5)
+
+    @unittest.skipUnless(HAS_ARROW, 'pyarrow not installed')
+    def test_arrow_keys_dates_and_categories_as_maps(self):
+        import pyarrow as pa
+
+        def result(days):
+            return {
+                'daily_summary': {f'2024-01-{day:02d}': -1.5 * day for day in days},
+                'merchants': {'tesco': {'category': 'groceries', 'count': 2}},
+                'summary': {'total': 1.5, 'trend': 'flat'},
+            }
+
+        table = pa.ipc.open_stream(encode(result([1, 2]), ARROW_STREAM)).read_all()
+        self.assertTrue(pa.types.is_map(table.schema.field('daily_summary').type))
+        self.assertTrue(pa.types.is_struct(table.schema.field('summary').type))
+        self.assertEqual(
+            table.column('daily_summary')[0].as_py(),
+            [('2024-01-01', -1.5), ('2024-01-02', -3.0)],
+        )
+        self.assertEqual(
+            table.column('merchants')[0].as_py(),
+            [('tesco', {'category': 'groceries', 'count': 2})],
+        )
+        # Other dates and categories keep the same schema
+        other = pa.ipc.open_stream(encode(result([5, 6, 7]), ARROW_STREAM))
+        self.assertEqual(other.schema, table.schema)
+
+    @unittest.skipUnless(HAS_ARROW, 'pyarrow not installed')
+    def test_arrow_mixed_list_items_are_json(self):
+        import pyarrow as pa
+
+        result = {'rejected': [{'index': 0}, 'bad row', 3]}
+        table = pa.ipc.open_stream(encode(result, ARROW_STREAM)).read_all()
+        self.assertEqual(
+            table.column('rejected')[0].as_py(), ['{"index": 0}', 'bad row', '3']
+        )
+
+
+@unittest.skipUnless(HAS_ARROW, 'pyarrow not installed')
+class TestIngestTable(unittest.TestCase):
+    def test_formats_are_sniffed(self):
+        table = transactions_table()
+        for media_type in (ARROW_STREAM, ARROW_FILE, PARQUET):
+            self.assertEqual(sniff_table(serialize(table, media_type)), media_type)
+        with self.assertRaises(UnsupportedMediaType):
+            sniff_table(b'[{"amount": 1}]')
+
+    def test_tables_match_json_ingest(self):
+        for media_type in (ARROW_STREAM, ARROW_FILE, PARQUET):
+            body = serialize(transactions_table(action='summary'), media_type)
+            batch, rejected, metadata = ingest_table(body, media_type)
+            self.assertEqual(rejected, [])
+            self.assertEqual(metadata, {'action': 'summary'})
+            self.assertEqual(batch.amount.tolist(), [-12.5, 100.0, -3.0])
+            self.assertEqual(
+                batch.date.tolist()[0], np.datetime64('2024-01-05T10:00', 'ns').item()
+            )
+            self.assertTrue(batch.tz_aware)
+
+    def test_amounts_are_views_of_the_body(self):
+        body = serialize(transactions_table(), ARROW_STREAM)
+        batch, _, _ = ingest_table(body, ARROW_STREAM)
+        self.assertTrue(np.shares_memory(batch.amount, np.frombuffer(body, np.uint8)))
+
+    def test_unreadable_body(self):
+        with self.assertRaises(UnsupportedMediaType):
+            ingest_table(b'\xff\xff\xff\xffnot arrow', ARROW_STREAM)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,146 @@
+import hashlib
+import json
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from tests.helpers import transaction
+from utils.ingest import PayloadTooLarge, ingest_ndjson, ingest_transactions
+
+
+class TestIngestTransactions(unittest.TestCase):
+    def test_valid_rows_are_converted(self):
+        batch, rejected = ingest_transactions(
+            [
+                transaction(createdAt='2024-01-01T00:00:00.000Z'),
+                transaction(amount='3.5', date='2024-01-06T00:00:00+01:00'),
+            ]
+        )
+        self.assertEqual(rejected, [])
+        self.assertEqual(batch.amount.tolist(), [-12.5, 3.5])
+        self.assertEqual(
+            np.datetime_as_string(batch.createdAt, unit='D').tolist(),
+            ['2024-01-01', 'NaT'],
+        )
+        # The local wall-clock time is kept; a +01:00 offset is not UTC
+        self.assertEqual(
+            batch.date.tolist()[1], np.datetime64('2024-01-06T00:00:00', 'ns').item()
+        )
+        self.assertFalse(batch.tz_aware)
+
+    def test_offsets_keep_local_days(self):
+        rows = [
+            transaction(date='2024-01-31T12:00:00Z'),
+            transaction(date='2024-01-31T23:30:00-05:00'),
+        ]
+        batch, _ = ingest_transactions(rows)
+        # Half past eleven at -05:00 stays on January 31st
+        self.assertEqual(
+            np.datetime_as_string(batch.date, unit='m').tolist(),
+            ['2024-01-31T12:00', '2024-01-31T23:30'],
+        )
+        # Only UTC instants are rendered with +00:00
+        self.assertFalse(batch.tz_aware)
+        batch, _ = ingest_transactions(rows[:1] + [transaction(date='2024-02-01')])
+        self.assertTrue(batch.tz_aware)
+        batch, _ = ingest_transactions([transaction(date='2024-01-02T12:00:00')])
+        self.assertFalse(batch.tz_aware)
+
+        with mock.patch('utils.ingest.settings.date_buckets', 'utc'):
+            batch, _ = ingest_transactions(rows)
+        self.assertEqual(
+            np.datetime_as_string(batch.date, unit='m').tolist(),
+            ['2024-01-31T12:00', '2024-02-01T04:30'],
+        )
+        self.assertTrue(batch.tz_aware)
+
+    def test_rejections_report_index_and_reason(self):
+        missing = transaction()
+        del missing['userId']
+        del missing['date']
+        batch, rejected = ingest_transactions(
+            [
+                transaction(),
+                missing,
+                transaction(amount='abc'),
+                transaction(balance=None),
+                transaction(date='not a date'),
+                transaction(date=20240105),
+                'not a transaction',
+            ]
+        )
+        self.assertEqual(len(batch), 1)
+        self.assertEqual(
+            rejected,
+            [
+                {'index': 1, 'reason': 'Missing required fields: date, userId'},
+                {'index': 2, 'reason': 'Invalid amount'},
+                {'index': 3, 'reason': 'Missing required fields: balance'},
+                {'index': 4, 'reason': 'Invalid date'},
+                {'index': 5, 'reason': 'Invalid date'},
+                {'index': 6, 'reason': 'Transaction is not an object'},
+            ],
+        )
+
+    def test_no_valid_rows(self):
+        batch, rejected = ingest_transactions([transaction(amount=None)])
+        self.assertIsNone(batch)
+        self.assertEqual(len(rejected), 1)
+
+
+async def stream(data: bytes, size: int):
+    for start in range(0, len(data), size):
+        yield data[start : start + size]
+
+
+class TestIngestNdjson(unittest.IsolatedAsyncioTestCase):
+    async def test_chunks_match_a_single_ingest(self):
+        records = [transaction(amount=-i, userId=f'u{i % 3}') for i in range(1, 8)]
+        records[4] = transaction(amount='abc')
+        body = b'\n'.join(json.dumps(r).encode() for r in records) + b'\n'
+
+        # Split the bytes mid-line and ingest three rows at a time
+        batch, rejected, digest = await ingest_ndjson(stream(body, 37), 3)
+        expected, expected_rejected = ingest_transactions(records)
+
+        self.assertEqual(rejected, expected_rejected)
+        self.assertEqual(batch.amount.tolist(), expected.amount.tolist())
+        self.assertEqual(list(batch.userId), list(expected.userId))
+        self.assertEqual(list(batch.userId.categories), ['u0', 'u1', 'u2'])
+        self.assertEqual(digest, hashlib.sha256(body).hexdigest())
+
+    async def test_invalid_lines_and_blank_lines(self):
+        body = (
+            json.dumps(transaction()).encode()
+            + b'\n\n{not json\n[1, 2]\n'
+            + json.dumps(transaction(amount=-3)).encode()
+        )
+        batch, rejected, _ = await ingest_ndjson(stream(body, 8))
+        self.assertEqual(batch.amount.tolist(), [-12.5, -3.0])
+        self.assertEqual(
+            rejected,
+            [
+                {'index': 1, 'reason': 'Invalid JSON'},
+                {'index': 2, 'reason': 'Transaction is not an object'},
+            ],
+        )
+
+    async def test_size_limits(self):
+        body = b'\n'.join(json.dumps(transaction()).encode() for _ in range(10))
+        with self.assertRaises(PayloadTooLarge):
+            await ingest_ndjson(stream(body, 64), max_bytes=len(body) - 1)
+        batch, _, _ = await ingest_ndjson(stream(body, 64), max_bytes=len(body))
+        self.assertEqual(len(batch), 10)
+        # A line that never ends is cut off before it is fully buffered
+        with self.assertRaises(PayloadTooLarge):
+            await ingest_ndjson(stream(b'x' * 1000, 64), max_line_bytes=256)
+
+    async def test_empty_stream(self):
+        batch, rejected, _ = await ingest_ndjson(stream(b'', 8))
+        self.assertIsNone(batch)
+        self.assertEqual(rejected, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
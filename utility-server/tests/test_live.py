@@ -0,0 +1,162 @@
+import unittest
+from unittest import mock
+
+from tests.helpers import transaction
+from utils.analyzer import classify_transactions
+from utils.context import AnalysisContext
+from utils.ingest import ingest_transactions
+from utils import live as live_module
+from utils.live import LiveAnalytics, changed
+from utils.stages import analyze_spending, predict_trends
+from utils.summarize import summarize_transactions
+
+# Every description is decided by the rule tier, so no model is needed
+TRANSACTIONS = [
+    transaction('2024-01-02', 'Rent payment', -900, _id='a', balance=1000),
+    transaction('2024-01-02', 'TESCO STORES 1234', -40, _id='b', balance=960),
+    transaction('2024-01-05', 'Uber refund', 2500, _id='c', balance=3460),
+    transaction('2024-02-01', 'NETFLIX.COM', -15, _id='d', balance=3445),
+    transaction('2024-02-09', 'Shell petrol', -60, _id='e', balance=3385),
+]
+
+
+class TestLiveAnalytics(unittest.IsolatedAsyncioTestCase):
+    async def assertMatchesFullRecompute(self, live, transactions):
+        batch, _ = ingest_transactions(transactions)
+        context = AnalysisContext(batch)
+        snapshot = live.snapshot()
+        self.assertEqual(snapshot['spending_analysis'], analyze_spending(context))
+        trends, expected = snapshot['spending_trends'], predict_trends(context)
+        self.assertAlmostEqual(trends.pop('trend_slope'), expected.pop('trend_slope'))
+        self.assertEqual(trends, expected)
+        summary = await summarize_transactions(transactions)
+        self.assertEqual(snapshot['monthly_summary'], summary['monthly_summary'])
+        categories = await classify_transactions(context)
+        self.assertEqual(snapshot['categories']['categories'], categories['categories'])
+
+    async def test_open_matches_full_analysis(self):
+        live = LiveAnalytics()
+        _, rejected = await live.apply(append=TRANSACTIONS)
+        self.assertEqual(rejected, [])
+        await self.assertMatchesFullRecompute(live, TRANSACTIONS)
+
+    async def test_deltas_match_full_analysis(self):
+        live = LiveAnalytics()
+        await live.apply(append=TRANSACTIONS)
+        edited = transaction(
+            '2024-01-02', 'TESCO STORES 1234', -55, _id='b', balance=945
+        )
+        appended = transaction(
+            '2024-02-20', 'Rent payment', -900, _id='f', balance=2485
+        )
+        changes, rejected = await live.apply(
+            append=[appended], edit=[edited], delete=['d']
+        )
+        self.assertEqual(rejected, [])
+        expected = [TRANSACTIONS[0], edited, TRANSACTIONS[2], TRANSACTIONS[4]]
+        await self.assertMatchesFullRecompute(live, expected + [appended])
+
+        # Only touched days are pushed; emptied days are null
+        self.assertEqual(
+            changes['spending_analysis']['daily_summary'],
+            {'2024-01-02': -955.0, '2024-02-01': None, '2024-02-20': -900.0},
+        )
+        self.assertEqual(
+            changes['spending_analysis']['cumulative_balance']['2024-01-02'], 945
+        )
+        self.assertNotIn('2024-01-05', changes['spending_analysis']['daily_summary'])
+        # One delete and one append leave the count unchanged
+        self.assertNotIn('total_transactions', changes)
+
+    async def test_forecast_refits_only_when_monthly_expenses_change(self):
+        live = LiveAnalytics()
+        await live.apply(append=TRANSACTIONS)
+        with mock.patch.object(
+            live_module, 'monthly_forecast', wraps=live_module.monthly_forecast
+        ) as forecast:
+            # Income and a same-amount edit leave every month's expenses as they were
+            await live.apply(
+                append=[
+                    transaction('2024-02-25', 'Uber refund', 30, _id='f', balance=3415)
+                ],
+                edit=[
+                    transaction(
+                        '2024-02-10', 'Shell petrol', -60, _id='e', balance=3385
+                    )
+                ],
+            )
+            self.assertEqual(forecast.call_count, 0)
+            changes, _ = await live.apply(
+                append=[transaction('2024-03-01', 'TESCO STORES 1234', -20, _id='g')]
+            )
+            self.assertEqual(forecast.call_count, 1)
+        self.assertEqual(
+            changes['spending_trends']['forecast']['last_month'], '2024-03'
+        )
+        transactions = TRANSACTIONS[:4] + [
+            transaction('2024-02-10', 'Shell petrol', -60, _id='e', balance=3385),
+            transaction('2024-02-25', 'Uber refund', 30, _id='f', balance=3415),
+            transaction('2024-03-01', 'TESCO STORES 1234', -20, _id='g'),
+        ]
+        await self.assertMatchesFullRecompute(live, transactions)
+
+    async def test_rejections(self):
+        live = LiveAnalytics()
+        await live.apply(append=TRANSACTIONS)
+        changes, rejected = await live.apply(
+            append=[TRANSACTIONS[0], {'amount': 'oops'}],
+            edit=[transaction('2024-01-02', 'Rent payment', -1, _id='zz')],
+            delete=['missing'],
+        )
+        self.assertEqual(changes, {})
+        self.assertEqual(
+            [(r['delta'], r['index'], r['reason']) for r in rejected],
+            [
+                ('delete', 0, 'Unknown _id'),
+                ('edit', 0, 'Unknown _id'),
+                (
+                    'append',
+                    1,
+                    'Missing required fields: date, description, balance, '
+                    'type, userId',
+                ),
+                ('append', 0, 'Duplicate _id'),
+            ],
+        )
+
+    async def test_repeated_ids_in_one_delta(self):
+        live = LiveAnalytics()
+        await live.apply(append=TRANSACTIONS)
+        changes, rejected = await live.apply(delete=['e', 'e'])
+        self.assertEqual(
+            rejected, [{'delta': 'delete', 'index': 1, 'reason': 'Duplicate _id'}]
+        )
+        self.assertEqual(
+            changes['spending_analysis']['daily_summary'], {'2024-02-09': None}
+        )
+        remaining = [t for t in TRANSACTIONS if t['_id'] != 'e']
+        await self.assertMatchesFullRecompute(live, remaining)
+
+        # An edit of a deleted id would silently undo the delete
+        changes, rejected = await live.apply(
+            edit=[transaction('2024-02-01', 'NETFLIX.COM', -20, _id='d')],
+            delete=['d'],
+        )
+        self.assertEqual(
+            rejected, [{'delta': 'edit', 'index': 0, 'reason': 'Duplicate _id'}]
+        )
+        self.assertNotIn('d', live.rows)
+        await self.assertMatchesFullRecompute(
+            live, [t for t in remaining if t['_id'] != 'd']
+        )
+
+
+class TestChanged(unittest.TestCase):
+    def test_nested_differences_only(self):
+        before = {'a': 1, 'b': {'x': 1, 'y': 2}, 'c': 3}
+        after = {'a': 1, 'b': {'x': 1, 'y': 5}, 'd': 4}
+        self.assertEqual(changed(before, after), {'b': {'y': 5}, 'c': None, 'd': 4})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,37 @@
+import unittest
+
+from utils.merchants import group_by_merchant, normalize_merchant
+
+
+class TestMerchantNormalization(unittest.TestCase):
+    def test_strips_pos_prefix_card_and_date(self):
+        self.assertEqual(
+            normalize_merchant('POS 1234 TESCO STORES 05/11'), 'tesco stores'
+        )
+        self.assertEqual(
+            normalize_merchant('VISA XXXX1234 STARBUCKS #123 2024-01-02'), 'starbucks'
+        )
+
+    def test_strips_reference_ids(self):
+        self.assertEqual(
+            normalize_merchant('Card Purchase 12/03 AMAZON MKTPLACE REF 88ABX'),
+            'amazon mktplace',
+        )
+
+    def test_falls_back_to_description(self):
+        self.assertEqual(normalize_merchant('12345'), '12345')
+
+    def test_group_by_merchant(self):
+        merchants, codes = group_by_merchant(
+            [
+                'POS 1234 TESCO STORES 05/11',
+                'UBER *TRIP 8833',
+                'POS 9981 TESCO STORES 06/11',
+            ]
+        )
+        self.assertEqual(merchants, ['tesco stores', 'uber trip'])
+        self.assertEqual(codes.tolist(), [0, 1, 0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+
+import numpy as np
+
+from utils.ingest import ingest_transactions
+
+
+def make_batch():
+    batch, _ = ingest_transactions(
+        [
+            {
+                '_id': 'a',
+                'amount': -10,
+                'balance': 90,
+                'date': '2024-01-01T08:00:00.000Z',
+                'description': 'rent',
+                'type': 'debit',
+                'userId': 'u1',
+            },
+            {
+                '_id': 'b',
+                'amount': '25.5',
+                'balance': 115.5,
+                'createdAt': '2024-01-02T00:00:00.000Z',
+                'date': '2024-01-02T09:30:00.000Z',
+                'description': 'salary',
+                'type': 'credit',
+                'userId': 'u1',
+            },
+            {
+                '_id': 'c',
+                'amount': -4.5,
+                'balance': 111,
+                'date': '2024-02-03T00:00:00.000Z',
+                'description': 'coffee',
+                'type': 'debit',
+                'userId': 'u2',
+            },
+        ]
+    )
+    return batch
+
+
+class TestTransactionBatch(unittest.TestCase):
+    def test_columns_are_typed(self):
+        batch = make_batch()
+        self.assertEqual(len(batch), 3)
+        self.assertEqual(batch.amount.dtype, np.float64)
+        self.assertEqual(batch.amount.tolist(), [-10.0, 25.5, -4.5])
+        self.assertEqual(batch.date.dtype, np.dtype('datetime64[ns]'))
+        self.assertTrue(np.isnat(batch.createdAt[0]))
+        self.assertEqual(list(batch.userId.categories), ['u1', 'u2'])
+
+    def test_isoformat_keeps_timezone(self):
+        batch = make_batch()
+        self.assertEqual(batch.isoformat(batch.date[:1]), ['2024-01-01T08:00:00+00:00'])
+
+    def test_take_and_frame(self):
+        subset = make_batch().take(np.array([True, False, True]))
+        self.assertEqual(subset._id.tolist(), ['a', 'c'])
+        frame = subset.to_frame()
+        self.assertEqual(frame['amount'].tolist(), [-10.0, -4.5])
+        self.assertEqual(frame['userId'].tolist(), ['u1', 'u2'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,192 @@
+import unittest
+from functools import reduce
+from itertools import pairwise
+from unittest import mock
+
+import numpy as np
+
+from utils.analyzer import analyze_transactions
+from utils.context import AnalysisContext
+from utils.ingest import ingest_transactions
+from utils.partials import (
+    Distribution,
+    Moments,
+    PartialAggregate,
+    aggregate_batch,
+    partial_aggregate,
+)
+from utils.stages import analyze_spending, predict_trends
+from utils.summarize import summary_aggregates
+
+
+def shards(rows, count):
+    return list(pairwise(np.linspace(0, rows, count + 1).astype(int).tolist()))
+
+
+def random_batch(rows=2000, seed=0):
+    rng = np.random.default_rng(seed)
+    # Whole hours over four months, so many transactions share a timestamp
+    hours = rng.integers(0, 24 * 120, rows)
+    dates = np.datetime64('2024-01-01T00:00:00') + hours.astype('timedelta64[h]')
+    amounts = np.round(
+        np.where(
+            rng.random(rows) < 0.2,
+            rng.uniform(100, 3000, rows),
+            -rng.gamma(2, 30, rows),
+        ),
+        2,
+    )
+    batch, _ = ingest_transactions(
+        [
+            {
+                'amount': amount,
+                'balance': balance,
+                'date': f'{date}Z',
+                'description': 'Rent payment',
+                'type': 'debit',
+                'userId': 'u1',
+            }
+            for date, amount, balance in zip(
+                np.datetime_as_string(dates).tolist(),
+                amounts.tolist(),
+                rng.uniform(0, 5000, rows).round(2).tolist(),
+            )
+        ]
+    )
+    return batch
+
+
+def merged(batch, count):
+    anchor = int(batch.date[0].view(np.int64))
+    parts = [
+        partial_aggregate(
+            batch.amount[start:end],
+            batch.balance[start:end],
+            batch.date[start:end],
+            start,
+            anchor,
+        )
+        for start, end in shards(len(batch), count)
+    ]
+    # Merge order must not matter
+    return reduce(PartialAggregate.merge, parts[::-1])
+
+
+class TestMoments(unittest.TestCase):
+    def test_merge_matches_one_pass(self):
+        rng = np.random.default_rng(1)
+        values = rng.normal(50, 20, 10_000)
+        keys = rng.integers(0, 3, len(values))
+        parts = [
+            Moments.of(values[a:b], keys[a:b], 3) for a, b in shards(len(values), 7)
+        ]
+        moments = reduce(Moments.merge, parts)
+        for key in range(3):
+            selected = values[keys == key]
+            self.assertEqual(moments.count[key], len(selected))
+            self.assertAlmostEqual(moments.mean[key], selected.mean())
+            self.assertAlmostEqual(moments.std[key], selected.std(ddof=1))
+            self.assertEqual(moments.maximum[key], selected.max())
+
+
+class TestDistribution(unittest.TestCase):
+    def test_small_inputs_are_exact(self):
+        values = np.array([5.0, 1.0, 3.0, 2.0, 4.0, 10.0])
+        keys = np.array([0, 0, 0, 0, 0, 2])
+        described = Distribution.of(values, keys, 3)
+        self.assertIsNone(described.describe(1))
+        stats = described.describe(0)
+        self.assertEqual(stats['count'], 5)
+        for name, q in (('p50', 0.5), ('p90', 0.9), ('p99', 0.99)):
+            self.assertAlmostEqual(stats[name], np.quantile(values[:5], q))
+
+    def test_merged_sketches_stay_accurate(self):
+        values = np.random.default_rng(2).lognormal(3, 1, 200_000)
+        keys = np.zeros(len(values), dtype=np.intp)
+        parts = [
+            Distribution.of(values[a:b], keys[a:b], 1)
+            for a, b in shards(len(values), 8)
+        ]
+        distribution = reduce(Distribution.merge, parts)
+        self.assertLessEqual(len(distribution.sketches[0].means), 151)
+        stats = distribution.describe(0)
+        for name, q in (('p50', 0.5), ('p90', 0.9), ('p99', 0.99)):
+            self.assertAlmostEqual(stats[name] / np.quantile(values, q), 1, delta=0.01)
+
+
+class TestPartialAggregate(unittest.TestCase):
+    def test_sharded_stages_match_whole_batch(self):
+        batch = random_batch()
+        context = AnalysisContext(batch)
+        partials = merged(batch, 5)
+
+        spending = partials.spending_analysis()
+        expected = analyze_spending(context)
+        self.assertEqual(
+            spending['daily_summary'].keys(), expected['daily_summary'].keys()
+        )
+        for day, total in expected['daily_summary'].items():
+            self.assertAlmostEqual(spending['daily_summary'][day], total)
+        # Same-time ties across shards resolve to the later payload row
+        self.assertEqual(spending['cumulative_balance'], expected['cumulative_balance'])
+        self.assertAlmostEqual(spending['total_spent'], expected['total_spent'])
+
+        trends, expected = partials.spending_trends(), predict_trends(context)
+        self.assertAlmostEqual(trends.pop('trend_slope'), expected.pop('trend_slope'))
+        self.assertEqual(trends.keys(), expected.keys())
+
+        aggregates, expected = partials.summary_aggregates(), summary_aggregates(
+            context
+        )
+        self.assertEqual(aggregates['months'], expected['months'])
+        np.testing.assert_allclose(
+            aggregates['monthly_expense'], expected['monthly_expense']
+        )
+        for key in ('total_transactions', 'largest_expense', 'first_date', 'last_date'):
+            self.assertEqual(aggregates[key], expected[key])
+
+
+class TestShardedAnalysis(unittest.IsolatedAsyncioTestCase):
+    async def test_aggregate_batch_shards_large_batches(self):
+        batch = random_batch(rows=500)
+        with mock.patch.multiple(
+            'utils.partials.settings',
+            partial_aggregate_rows=100,
+            partial_aggregate_shards=4,
+        ), mock.patch(
+            'utils.partials.partial_aggregate', wraps=partial_aggregate
+        ) as spy:
+            partials = await aggregate_batch(batch)
+        self.assertEqual(spy.call_count, 4)
+        self.assertEqual(partials.amounts.count[0], 500)
+
+    async def test_expense_distribution_per_category(self):
+        transactions = [
+            {
+                'amount': -amount,
+                'balance': 0,
+                'date': '2024-01-02T09:00:00Z',
+                'description': 'Rent payment',
+                'type': 'debit',
+                'userId': 'u1',
+            }
+            for amount in range(1, 101)
+        ]
+        with mock.patch.multiple(
+            'utils.partials.settings',
+            partial_aggregate_rows=10,
+            partial_aggregate_shards=3,
+        ):
+            analysis = await analyze_transactions(transactions)
+        (label,) = analysis['categories']['expense_distribution']
+        stats = analysis['categories']['expense_distribution'][label]
+        self.assertEqual(stats['count'], 100)
+        self.assertAlmostEqual(stats['p50'], 50.5)
+        self.assertAlmostEqual(stats['p99'], 99.01)
+        self.assertEqual(
+            analysis['spending_analysis']['daily_summary'], {'2024-01-02': -5050.0}
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
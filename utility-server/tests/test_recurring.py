@@ -0,0 +1,108 @@
+import unittest
+
+import numpy as np
+
+from tests.helpers import transaction
+from utils.analyzer import analyze_transactions
+from utils.ingest import ingest_transactions
+from utils.recurring import recurring_payments, sort_pairs
+
+
+def history():
+    rows = [
+        transaction(f'2024-{month:02d}-31', 'NETFLIX.COM 1234', -15.99)
+        for month in (1, 3, 5)
+    ]
+    rows += [
+        transaction(f'2024-{month:02d}-30', 'NETFLIX.COM 1234', -15.99)
+        for month in (4, 6)
+    ]
+    rows.append(transaction('2024-02-29', 'NETFLIX.COM 1234', -15.99))
+    # Same merchant, a different amount band: a second subscription
+    rows += [
+        transaction(f'2024-{month:02d}-03', 'POS 778 NETFLIX.COM', -6.99)
+        for month in range(1, 7)
+    ]
+    rows += [
+        transaction(str(np.datetime64('2024-01-01') + 7 * week), 'GYM CLUB', -10)
+        for week in range(6)
+    ]
+    rows += [
+        transaction(f'{year}-03-15', 'Amazon Prime annual', -95)
+        for year in (2022, 2023, 2024)
+    ]
+    # Irregular gaps and amounts: groceries are not a subscription
+    rng = np.random.default_rng(0)
+    rows += [
+        transaction(
+            str(np.datetime64('2024-01-01') + int(day)),
+            'TESCO STORES 0042',
+            -round(float(rng.uniform(5, 80)), 2),
+        )
+        for day in rng.integers(0, 180, 40)
+    ]
+    rows.append(transaction('2024-06-30', 'Uber refund', 30))
+    return rows
+
+
+class TestRecurringPayments(unittest.TestCase):
+    def test_detects_periods_and_next_charges(self):
+        batch, _ = ingest_transactions(history())
+        found = {
+            (
+                payment['merchant'],
+                payment['period'],
+                round(payment['amount'], 2),
+            ): payment
+            for payment in recurring_payments(batch)
+        }
+        self.assertEqual(
+            set(found),
+            {
+                ('netflix com', 'monthly', 15.99),
+                ('netflix com', 'monthly', 6.99),
+                ('gym club', 'weekly', 10.0),
+                ('amazon prime annual', 'annual', 95.0),
+            },
+        )
+        netflix = found['netflix com', 'monthly', 15.99]
+        self.assertEqual(netflix['count'], 6)
+        self.assertEqual(netflix['last_date'], '2024-06-30T09:00:00+00:00')
+        # Charged on the 30th/31st; July has 31 days
+        self.assertEqual(netflix['next_date'], '2024-07-30')
+        self.assertTrue(netflix['active'])
+
+        gym = found['gym club', 'weekly', 10.0]
+        self.assertEqual((gym['interval_days'], gym['next_date']), (7.0, '2024-02-12'))
+        self.assertAlmostEqual(gym['monthly_cost'], 10 * 30.44 / 7)
+        # Charges stopped months before the end of the history
+        self.assertFalse(gym['active'])
+
+        prime = found['amazon prime annual', 'annual', 95.0]
+        self.assertEqual(prime['next_date'], '2025-03-15')
+        self.assertAlmostEqual(prime['monthly_cost'], 95 * 30.44 / 365.25)
+
+    def test_results_are_ordered_by_next_charge(self):
+        batch, _ = ingest_transactions(history())
+        dates = [payment['next_date'] for payment in recurring_payments(batch)]
+        self.assertEqual(dates, sorted(dates))
+
+    def test_sort_pairs_matches_lexsort(self):
+        rng = np.random.default_rng(1)
+        major = rng.integers(0, 50, 1000)
+        # Small ranges are packed into one key; huge ones fall back to lexsort
+        for high in (1000, 2**60):
+            minor = rng.integers(0, high, 1000, dtype=np.int64)
+            order, expected = sort_pairs(major, minor), np.lexsort((minor, major))
+            np.testing.assert_array_equal(major[order], major[expected])
+            np.testing.assert_array_equal(minor[order], minor[expected])
+
+
+class TestRecurringStage(unittest.IsolatedAsyncioTestCase):
+    async def test_analysis_reports_recurring_payments(self):
+        analysis = await analyze_transactions(history())
+        self.assertEqual(len(analysis['recurring']), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import asyncio
+import unittest
+
+from utils.results import ResultCache, payload_key
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestPayloadKey(unittest.TestCase):
+    def test_key_order_and_whitespace_do_not_matter(self):
+        self.assertEqual(
+            payload_key('analyze', [{'amount': 1, 'date': 'x'}]),
+            payload_key('analyze', [{'date': 'x', 'amount': 1}]),
+        )
+
+    def test_kind_and_context_are_part_of_the_key(self):
+        payload = [{'amount': 1}]
+        self.assertNotEqual(
+            payload_key('analyze', payload), payload_key('summarize', payload)
+        )
+        self.assertNotEqual(
+            payload_key('analyze', payload, ['a']),
+            payload_key('analyze', payload, ['b']),
+        )
+
+
+class TestResultCache(unittest.IsolatedAsyncioTestCase):
+    async def test_concurrent_requests_compute_once(self):
+        cache = ResultCache()
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return {'value': 1}
+
+        results = await asyncio.gather(
+            *(cache.get_or_compute('k', compute) for _ in range(3))
+        )
+        self.assertEqual(results, [{'value': 1}] * 3)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(await cache.get_or_compute('k', compute), {'value': 1})
+        stats = cache.stats()
+        self.assertEqual(
+            (stats['misses'], stats['coalesced'], stats['hits']), (1, 2, 1)
+        )
+
+    async def test_entries_expire(self):
+        clock = FakeClock()
+        cache = ResultCache(ttl=10, clock=clock)
+        cache.put('k', {'value': 1})
+        clock.now = 9
+        self.assertEqual(cache.get('k'), {'value': 1})
+        clock.now = 10
+        self.assertIsNone(cache.get('k'))
+
+    async def test_size_is_bounded_lru(self):
+        cache = ResultCache(max_entries=2)
+        cache.put('a', {})
+        cache.put('b', {})
+        cache.get('a')
+        cache.put('c', {})
+        self.assertIsNone(cache.get('b'))
+        self.assertIsNotNone(cache.get('a'))
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    async def test_errors_are_not_cached(self):
+        cache = ResultCache()
+
+        async def compute():
+            return {'error': 'No transactions provided'}
+
+        await cache.get_or_compute('k', compute)
+        self.assertIsNone(cache.get('k'))
+
+    async def test_exceptions_reach_every_waiter(self):
+        cache = ResultCache()
+
+        async def compute():
+            await asyncio.sleep(0.01)
+            raise ValueError('boom')
+
+        results = await asyncio.gather(
+            cache.get_or_compute('k', compute),
+            cache.get_or_compute('k', compute),
+            return_exceptions=True,
+        )
+        self.assertTrue(all(isinstance(r, ValueError) for r in results))
+        self.assertEqual(cache.stats()['inflight'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,39 @@
+import unittest
+
+from utils.rules import AMBIGUOUS_CONFIDENCE, DEFAULT_RULES, RuleMatcher
+
+LABELS = ['groceries', 'transportation', 'dining out', 'fitness', 'other']
+
+
+class TestRuleMatcher(unittest.TestCase):
+    def setUp(self):
+        self.matcher = RuleMatcher(DEFAULT_RULES, LABELS)
+
+    def test_keyword_match(self):
+        self.assertEqual(self.matcher.match('tesco stores'), ('groceries', 0.9))
+
+    def test_longest_keyword_wins(self):
+        self.assertEqual(self.matcher.match('uber eats')[0], 'dining out')
+        self.assertEqual(self.matcher.match('uber trip')[0], 'transportation')
+
+    def test_ambiguous_match_has_low_confidence(self):
+        self.assertEqual(self.matcher.match('gym shell')[1], AMBIGUOUS_CONFIDENCE)
+
+    def test_unconfigured_labels_are_ignored(self):
+        self.assertIsNone(self.matcher.match('netflix'))
+
+    def test_patterns_and_merchants(self):
+        matcher = RuleMatcher(
+            {
+                'patterns': {'transportation': [r'tfl\s+travel']},
+                'merchants': {'acme widgets': 'other', 'x': 'unknown'},
+            },
+            LABELS,
+        )
+        self.assertEqual(matcher.match('tfl  travel'), ('transportation', 0.85))
+        self.assertEqual(matcher.match('acme widgets'), ('other', 0.99))
+        self.assertIsNone(matcher.match('x'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import importlib.util
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from utils.classifier import ZeroShotClassifier, get_device, get_labels
+from utils.runtime import PaddingStats, length_order, restore_order
+from utils.settings import base_settings as settings
+
+# Largest accepted score difference from eager torch, as in bench_runtime
+TOLERANCE = 0.05
+DESCRIPTIONS = [
+    'tesco stores',
+    'monthly rent payment',
+    'uber trip',
+    'netflix subscription',
+    'electricity bill',
+    'cinema tickets',
+    'shell petrol station',
+    'coffee shop',
+]
+
+
+class TestLengthBucketing(unittest.TestCase):
+    def test_order_round_trip(self):
+        lengths = np.array([5, 2, 9, 2, 4])
+        order = length_order(lengths)
+        self.assertEqual(lengths[order].tolist(), [2, 2, 4, 5, 9])
+        processed = [f'item{i}' for i in order]
+        self.assertEqual(
+            restore_order(processed, order), [f'item{i}' for i in range(5)]
+        )
+
+    def test_sorting_reduces_padding_waste(self):
+        lengths = np.array([2, 30, 3, 28, 2, 31])
+        unsorted, sorted_ = PaddingStats(), PaddingStats()
+        unsorted.record(lengths, 2)
+        sorted_.record(lengths[length_order(lengths)], 2)
+        self.assertEqual(unsorted.padded_tokens, 30 * 2 + 28 * 2 + 31 * 2)
+        self.assertEqual(sorted_.padded_tokens, 2 * 2 + 28 * 2 + 31 * 2)
+        self.assertLess(
+            sorted_.stats()['padding_waste'], unsorted.stats()['padding_waste']
+        )
+        self.assertEqual(sorted_.batches, 3)
+
+
+def label_scores(runtime: str) -> list[dict[str, float]]:
+    """Every label's score per description from the zero-shot pipeline."""
+    model_id = settings.classifier_model_path or settings.classifier_model
+    with mock.patch('utils.runtime.settings.classifier_runtime', runtime):
+        classifier = ZeroShotClassifier(model_id, get_device()[0])
+    results = classifier.pipeline(DESCRIPTIONS, get_labels())
+    return [dict(zip(result['labels'], result['scores'])) for result in results]
+
+
+@unittest.skipUnless(
+    importlib.util.find_spec('optimum') and importlib.util.find_spec('onnxruntime'),
+    'optimum[onnxruntime] is not installed',
+)
+class TestRuntimeEquivalence(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        try:
+            cls.reference = label_scores('torch')
+        except OSError as e:
+            raise unittest.SkipTest(f'Classifier model unavailable: {e}')
+
+    def assertEquivalent(self, runtime):
+        labels = get_labels()
+        for scores, expected in zip(label_scores(runtime), self.reference):
+            np.testing.assert_allclose(
+                [scores[label] for label in labels],
+                [expected[label] for label in labels],
+                atol=TOLERANCE,
+            )
+            # Top labels agree unless torch's top two are within the tolerance
+            top, runner_up = sorted(expected.values(), reverse=True)[:2]
+            if top - runner_up > 2 * TOLERANCE:
+                self.assertEqual(
+                    max(scores, key=scores.get), max(expected, key=expected.get)
+                )
+
+    def test_int8_matches_torch(self):
+        self.assertEquivalent('int8')
+
+    def test_onnx_matches_torch(self):
+        self.assertEquivalent('onnx')
+
+
+if __name__ == '__main__':
+    unittest.main()
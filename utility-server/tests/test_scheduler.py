@@ -0,0 +1,84 @@
+import asyncio
+import threading
+import unittest
+
+from utils.scheduler import InferenceScheduler
+
+
+class TestInferenceScheduler(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.calls = []
+
+        def predict(descriptions, labels):
+            self.calls.append(list(descriptions))
+            return [(labels[0], float(len(d))) for d in descriptions]
+
+        self.scheduler = InferenceScheduler(predict, max_batch_size=8, max_wait=0.05)
+        await self.scheduler.start()
+
+    async def asyncTearDown(self):
+        await self.scheduler.stop()
+
+    async def test_concurrent_requests_share_one_batch(self):
+        results = await asyncio.gather(
+            self.scheduler.classify(['rent', 'uber'], ['housing']),
+            self.scheduler.classify(['netflix'], ['housing']),
+            self.scheduler.classify(['rent'], ['housing']),
+        )
+        self.assertEqual(
+            results,
+            [
+                [('housing', 4.0), ('housing', 4.0)],
+                [('housing', 7.0)],
+                [('housing', 4.0)],
+            ],
+        )
+        self.assertEqual(self.calls, [['rent', 'uber', 'netflix']])
+        stats = self.scheduler.stats()
+        self.assertEqual(stats['batches'], 1)
+        self.assertEqual(stats['batch_size_histogram'], {'<=4': 1})
+
+    async def test_batches_are_capped(self):
+        await self.scheduler.classify([str(i) for i in range(20)], ['housing'])
+        self.assertEqual([len(call) for call in self.calls], [8, 8, 4])
+
+    async def test_errors_propagate_to_callers(self):
+        def fail(descriptions, labels):
+            raise ValueError('boom')
+
+        self.scheduler._predict = fail
+        with self.assertRaises(ValueError):
+            await self.scheduler.classify(['rent'], ['housing'])
+
+    async def test_stop_fails_collected_work(self):
+        self.scheduler.max_wait = 10
+        collected = asyncio.ensure_future(
+            self.scheduler.classify(['uber'], ['housing'])
+        )
+        # The worker holds the item while it waits for the batch to fill
+        await asyncio.sleep(0.01)
+        await self.scheduler.stop()
+        with self.assertRaisesRegex(RuntimeError, 'stopped'):
+            await collected
+
+    async def test_stop_fails_in_flight_work(self):
+        started, release = threading.Event(), threading.Event()
+
+        def block(descriptions, labels):
+            started.set()
+            release.wait()
+            return [(labels[0], 0.0)] * len(descriptions)
+
+        self.scheduler._predict = block
+        in_flight = asyncio.ensure_future(
+            self.scheduler.classify(['netflix'], ['housing'])
+        )
+        await asyncio.to_thread(started.wait)
+        await self.scheduler.stop()
+        release.set()
+        with self.assertRaisesRegex(RuntimeError, 'stopped'):
+            await in_flight
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from tests.helpers import transaction
+from utils.store import TransactionStore
+from utils.summarize import summarize_stored, summarize_transactions
+from utils.windows import date_window
+
+TRANSACTIONS = [
+    transaction('2024-01-02', 'Groceries', -900, _id='a'),
+    transaction('2024-01-15', 'Groceries', 2500, _id='b'),
+    transaction('2024-02-01', 'Groceries', -15, _id='c'),
+    transaction('2024-02-09', 'Groceries', 0, _id='d'),
+    transaction('2024-03-20', 'Groceries', -60, _id='e'),
+    transaction('2024-03-31', 'Groceries', 1200, _id='f'),
+    transaction('2024-04-02', 'Groceries', -35, _id='g'),
+]
+
+
+class TestTransactionStore(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.store = TransactionStore(os.path.join(directory.name, 'store.sqlite3'))
+        self.addCleanup(self.store.close)
+        patcher = mock.patch('utils.summarize.transaction_store', self.store)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def assertSummaryMatches(self, transactions, window=None):
+        stored = await summarize_stored('u1', window)
+        expected = await summarize_transactions(transactions)
+        self.assertEqual(stored.keys(), expected.keys())
+        for key in ('income', 'expenses', 'savings'):
+            self.assertEqual(stored[key]['trend'], expected[key]['trend'])
+            self.assertAlmostEqual(stored[key]['total'], expected[key]['total'])
+            self.assertAlmostEqual(stored[key]['change'], expected[key]['change'])
+        for key in ('total_transactions', 'start_date', 'end_date', 'monthly_summary'):
+            self.assertEqual(stored[key], expected[key])
+
+    async def test_rollup_summary_matches_full_summary(self):
+        self.assertEqual(self.store.upsert(TRANSACTIONS), (7, []))
+        await self.assertSummaryMatches(TRANSACTIONS)
+
+    async def test_upsert_moves_rollups(self):
+        self.store.upsert(TRANSACTIONS)
+        version = self.store.version('u1')
+        # Move an expense to another month and change its amount
+        moved = transaction('2024-04-10', 'Groceries', -40, _id='c')
+        self.assertEqual(self.store.upsert([moved]), (1, []))
+        self.assertEqual(self.store.version('u1'), version + 1)
+        expected = TRANSACTIONS[:2] + TRANSACTIONS[3:] + [moved]
+        await self.assertSummaryMatches(expected)
+        self.assertEqual(len(self.store.load('u1')), len(TRANSACTIONS))
+
+    def test_reassigned_id_bumps_the_previous_owner(self):
+        self.store.upsert(TRANSACTIONS)
+        version = self.store.version('u1')
+        moved = transaction('2024-02-01', 'Groceries', -15, _id='c', userId='u2')
+        self.store.upsert([moved])
+        # u1 lost a transaction, so its cached results are stale too
+        self.assertEqual(self.store.version('u1'), version + 1)
+        self.assertEqual(self.store.version('u2'), 1)
+        self.assertNotIn('c', self.store.load('u1')._id.tolist())
+
+    async def test_date_range(self):
+        self.store.upsert(TRANSACTIONS)
+        window = date_window({'start': '2024-01-15', 'end': '2024-03-20'})
+        await self.assertSummaryMatches(TRANSACTIONS[1:5], window)
+        batch = self.store.load('u1', '2024-02-01', '2024-02-28')
+        self.assertEqual(batch._id.tolist(), ['c', 'd'])
+        self.assertTrue(batch.tz_aware)
+
+    async def test_rolling_from_daily_rollups(self):
+        self.store.upsert(TRANSACTIONS)
+        window = date_window({'start': '2024-01-10', 'end': '2024-03-31', 'window': 30})
+        stored = await summarize_stored('u1', window)
+        expected = await summarize_transactions(TRANSACTIONS, window=window)
+        self.assertEqual(stored['rolling'], expected['rolling'])
+
+    async def test_unknown_user(self):
+        self.assertIsNone(self.store.load('nobody'))
+        self.assertEqual(
+            await summarize_stored('nobody'), {'error': 'No transactions provided'}
+        )
+
+    def test_rejections(self):
+        missing_id = transaction('2024-01-02', 'Groceries', -5, _id=None)
+        written, rejected = self.store.upsert(
+            [missing_id, {'amount': 'oops'}, TRANSACTIONS[0]]
+        )
+        self.assertEqual(written, 1)
+        self.assertEqual(
+            [(r['index'], r['reason']) for r in rejected],
+            [
+                (0, 'Missing _id'),
+                (
+                    1,
+                    'Missing required fields: date, description, balance, '
+                    'type, userId',
+                ),
+            ],
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import unittest
+
+import numpy as np
+
+from utils.context import AnalysisContext
+from utils.ingest import ingest_transactions
+from utils.summarize import grouped_summary_aggregates, summary_aggregates
+
+
+def make_context(rows):
+    batch, _ = ingest_transactions(
+        [
+            {
+                'amount': amount,
+                'balance': 0,
+                'date': date,
+                'description': 'shop',
+                'type': 'debit',
+                'userId': 'u1',
+            }
+            for date, amount in rows
+        ]
+    )
+    return AnalysisContext(batch)
+
+
+class TestSummaryAggregates(unittest.TestCase):
+    def test_totals_and_months(self):
+        aggregates = summary_aggregates(
+            make_context(
+                [
+                    ('2024-01-05T00:00:00Z', 100),
+                    ('2024-01-07T00:00:00Z', -30),
+                    ('2024-02-01T00:00:00Z', 0),
+                    ('2024-03-02T00:00:00Z', -20),
+                    ('2024-03-09T00:00:00Z', -5),
+                ]
+            )
+        )
+        self.assertEqual(aggregates['total_income'], 100)
+        self.assertEqual(aggregates['total_spent'], -55)
+        self.assertEqual(aggregates['income_count'], 1)
+        self.assertEqual(aggregates['expense_count'], 3)
+        self.assertEqual(aggregates['largest_expense'], -30)
+        self.assertEqual(aggregates['largest_income'], 100)
+        # February only has a zero amount, so it is not reported
+        self.assertEqual(aggregates['months'], ['2024-01', '2024-03'])
+        self.assertEqual(aggregates['monthly_income'].tolist(), [100, 0])
+        self.assertEqual(aggregates['monthly_expense'].tolist(), [30, 25])
+        # Savings are only defined for months with both income and expenses
+        self.assertEqual(aggregates['monthly_savings'].tolist(), [70, 0])
+        self.assertEqual(aggregates['has_income'].tolist(), [True, False])
+
+    def test_requires_income_and_expense(self):
+        with self.assertRaises(ValueError):
+            summary_aggregates(make_context([('2024-01-05T00:00:00Z', 10)]))
+
+
+class TestGroupedSummaryAggregates(unittest.TestCase):
+    def test_groups_match_separate_batches(self):
+        rows = [
+            ('2024-01-05T00:00:00Z', 100, 'a'),
+            ('2024-01-07T00:00:00Z', -30, 'b'),
+            ('2024-03-02T00:00:00Z', -20, 'a'),
+            ('2024-03-09T00:00:00Z', 40, 'b'),
+            ('2024-04-01T00:00:00Z', -5, 'c'),
+        ]
+        context = make_context([(date, amount) for date, amount, _ in rows])
+        codes = np.array([ord(user) - ord('a') for *_, user in rows])
+        grouped = grouped_summary_aggregates(context, codes, 3)
+
+        for group, user in enumerate('ab'):
+            expected = summary_aggregates(
+                make_context([(d, a) for d, a, u in rows if u == user])
+            )
+            self.assertEqual(grouped[group].keys(), expected.keys())
+            for key, value in expected.items():
+                self.assertEqual(
+                    np.asarray(grouped[group][key]).tolist(),
+                    np.asarray(value).tolist(),
+                )
+        # User c has no income, so there is nothing to summarize
+        self.assertIsNone(grouped[2])
+
+
+if __name__ == '__main__':
+    unittest.main()
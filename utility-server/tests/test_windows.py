@@ -0,0 +1,146 @@
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from utils.analyzer import analyze_transactions
+from utils.summarize import summarize_transactions
+from utils.windows import DateWindow, date_window, day_range, rolling_metrics
+
+
+def transaction(date, amount, description='Rent payment'):
+    return {
+        'amount': amount,
+        'balance': 100,
+        'date': f'{date}T09:00:00Z',
+        'description': description,
+        'type': 'debit' if amount < 0 else 'credit',
+        'userId': 'u1',
+    }
+
+
+TRANSACTIONS = [
+    transaction('2024-01-20', 2500, 'Uber refund'),
+    transaction('2024-01-02', -900),
+    transaction('2024-02-01', -15),
+    transaction('2024-02-09', -60),
+    transaction('2024-02-15', 1200, 'Uber refund'),
+    transaction('2024-03-31', -35),
+]
+
+
+class TestDateWindow(unittest.TestCase):
+    def test_parse(self):
+        self.assertIsNone(date_window({}))
+        self.assertEqual(
+            date_window({'start': '2024-01-31T23:30:00-02:00', 'window': '30d'}),
+            DateWindow('2024-01-31', '2261-12-31', 30),
+        )
+        for params in (
+            {'start': 'not a date'},
+            {'start': '2024-02-01', 'end': '2024-01-01'},
+            {'window': 0},
+            {'window': 'week'},
+        ):
+            with self.assertRaises(ValueError):
+                date_window(params)
+
+    def test_day_range_keeps_local_dates(self):
+        self.assertEqual(
+            day_range('2024-01-31T23:30:00-02:00', None), ('2024-01-31', '2261-12-31')
+        )
+        with mock.patch('utils.windows.settings.date_buckets', 'utc'):
+            self.assertEqual(
+                day_range('2024-01-31T23:30:00-02:00', None),
+                ('2024-02-01', '2261-12-31'),
+            )
+
+    def test_history_start_covers_the_first_window(self):
+        self.assertEqual(
+            DateWindow('2024-03-01', rolling=7).history_start, '2024-02-24'
+        )
+        self.assertEqual(DateWindow('2024-03-01').history_start, '2024-03-01')
+
+
+class TestRollingMetrics(unittest.TestCase):
+    def test_matches_naive_windows(self):
+        rng = np.random.default_rng(0)
+        days = np.sort(
+            rng.choice(np.arange(120), 60, replace=False) + np.datetime64('2024-01-01')
+        )
+        expense = rng.uniform(0, 100, len(days))
+        income = rng.uniform(0, 50, len(days))
+        window = DateWindow('2024-02-01', '2024-03-31', 30)
+        metrics = rolling_metrics(days, income, expense, window)
+
+        self.assertEqual(len(metrics['spend']), 60)
+        for label, spend in metrics['spend'].items():
+            day = np.datetime64(label)
+            inside = (days > day - 30) & (days <= day)
+            self.assertAlmostEqual(spend, expense[inside].sum())
+            self.assertAlmostEqual(metrics['income'][label], income[inside].sum())
+            covered = min(30, (day - days[0]).astype(int) + 1)
+            self.assertAlmostEqual(
+                metrics['average_daily_spend'][label], spend / covered
+            )
+
+    def test_quiet_days_and_short_history(self):
+        days = np.array(['2024-01-01', '2024-01-03'], dtype='datetime64[D]')
+        expense, income = np.array([10.0, 20.0]), np.zeros(2)
+        window = DateWindow('2024-01-01', '2024-01-06', 3)
+        metrics = rolling_metrics(days, income, expense, window)
+        # Days after the last transaction run through the end of the range
+        self.assertEqual(
+            metrics['spend'],
+            {
+                '2024-01-01': 10.0,
+                '2024-01-02': 10.0,
+                '2024-01-03': 30.0,
+                '2024-01-04': 20.0,
+                '2024-01-05': 20.0,
+                '2024-01-06': 0.0,
+            },
+        )
+        # The first windows cover only the days since the history starts
+        self.assertEqual(metrics['average_daily_spend']['2024-01-01'], 10.0)
+        self.assertEqual(metrics['average_daily_spend']['2024-01-02'], 5.0)
+        self.assertEqual(metrics['average_daily_spend']['2024-01-03'], 10.0)
+        # An open range ends with the data
+        open_range = rolling_metrics(days, income, expense, DateWindow(rolling=3))
+        self.assertEqual(list(open_range['spend'])[-1], '2024-01-03')
+
+
+class TestWindowedAnalysis(unittest.IsolatedAsyncioTestCase):
+    async def test_window_matches_filtered_payload(self):
+        window = date_window({'start': '2024-01-15', 'end': '2024-02-29'})
+        selected = [t for t in TRANSACTIONS if '2024-01-15' <= t['date'] < '2024-03']
+        windowed = await analyze_transactions(TRANSACTIONS, window=window)
+        expected = await analyze_transactions(selected)
+        self.assertEqual(windowed, expected)
+
+        summary = await summarize_transactions(TRANSACTIONS, window=window)
+        self.assertEqual(summary, await summarize_transactions(selected))
+
+    async def test_rolling_uses_earlier_history(self):
+        window = date_window({'start': '2024-02-01', 'end': '2024-02-02', 'window': 7})
+        analysis = await analyze_transactions(TRANSACTIONS, window=window)
+        rolling = analysis['spending_analysis']['rolling']
+        # The 2024-01-02 rent is outside every 7-day window in range
+        self.assertEqual(rolling['spend'], {'2024-02-01': 15.0, '2024-02-02': 15.0})
+
+        window = date_window({'start': '2024-01-20', 'end': '2024-01-20', 'window': 30})
+        analysis = await analyze_transactions(TRANSACTIONS, window=window)
+        rolling = analysis['spending_analysis']['rolling']
+        self.assertEqual(rolling['spend'], {'2024-01-20': 900.0})
+        self.assertEqual(rolling['income'], {'2024-01-20': 2500.0})
+
+    async def test_empty_range(self):
+        window = date_window({'start': '2024-01-03', 'end': '2024-01-03'})
+        self.assertEqual(
+            await analyze_transactions(TRANSACTIONS, window=window),
+            {'error': 'No transactions in the requested date range', 'rejected': []},
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
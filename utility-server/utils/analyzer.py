@@ -1,35 +1,44 @@
 import asyncio
-import os
-from datetime import datetime
+from typing import Awaitable, Callable
 
 import numpy as np
-import pandas as pd
-import torch
-from sklearn.ensemble import IsolationForest
-from transformers import pipeline
 
-from models.base import Transaction
+from models.base import TransactionBatch
+from utils.cache import classification_cache
+from utils.classifier import classifier_registry, get_labels
+from utils.context import AnalysisContext
+from utils.executor import stage_executor
+from utils.forecast import category_forecasts
+from utils.ingest import ingest_transactions
+from utils.merchants import group_by_merchant
+from utils.partials import PartialAggregate, aggregate_batch, distribute, shard_bounds
+from utils.results import payload_key
+from utils.rules import get_matcher
+from utils.scheduler import inference_scheduler
 from utils.settings import base_settings as settings
+from utils.stages import (
+    analyze_spending,
+    detect_anomalies,
+    detect_recurring,
+    predict_trends,
+)
+from utils.store import transaction_store
 from utils.websocket import WebSocketManager
+from utils.windows import NO_TRANSACTIONS_IN_RANGE, DateWindow
 
-
-def get_device() -> tuple[torch.device, str]:
-    """
-    Detect the best available device (GPU, MPS, or CPU) for PyTorch computations.
-    """
-    if torch.cuda.is_available():
-        # Check if CUDA (NVIDIA GPU) is available
-        return torch.device('cuda'), 'CUDA (NVIDIA GPU)'
-    elif torch.backends.mps.is_available():
-        # Check if MPS (Metal Performance Shaders on Apple Silicon) is available
-        return torch.device('mps'), 'MPS (Apple Metal)'
-    else:
-        # Default to CPU
-        return torch.device('cpu'), 'CPU'
+STAGE_MESSAGES = {
+    'categories': 'Transactions classified',
+    'anomalies': 'Anomalies detected',
+    'spending_analysis': 'Spending analyzed',
+    'spending_trends': 'Spending trends predicted',
+    'recurring': 'Recurring payments detected',
+}
 
 
 async def analyze_transactions(
-    transactions: list[dict], ws_manager: WebSocketManager = None
+    transactions: list[dict],
+    ws_manager: WebSocketManager = None,
+    window: DateWindow | None = None,
 ) -> dict:
     """Analyze transactions and return insights with progress updates."""
     try:
@@ -46,254 +55,308 @@ async def analyze_transactions(
                 )
             return {'error': 'No transactions provided'}
 
-        tx_objects = [
-            Transaction(
-                _id=t['_id'],
-                balance=float(t['balance']),
-                type=t['type'],
-                date=datetime.fromisoformat(t['date']),
-                description=t['description'],
-                amount=float(t['amount']),
-                userId=t['userId'],
-                createdAt=datetime.fromisoformat(t['createdAt']),
-                updatedAt=datetime.fromisoformat(t['updatedAt']),
-            )
-            for t in transactions
-            if validate_transaction(t)
-        ]
+        batch, rejected = await asyncio.to_thread(ingest_transactions, transactions)
+    except Exception as e:
+        return await analysis_failed(e, ws_manager)
+
+    return await analyze_ingested(batch, rejected, ws_manager, window)
+
+
+async def analyze_ingested(
+    batch: TransactionBatch | None,
+    rejected: list[dict],
+    ws_manager: WebSocketManager = None,
+    window: DateWindow | None = None,
+) -> dict:
+    """Analyze an already ingested batch, e.g. one built from an NDJSON stream.
 
-        if not tx_objects:
+    With a ``window``, the stages only see its days, and a rolling window
+    adds ``rolling`` metrics to the spending analysis.
+    """
+    try:
+        if batch is None and not rejected:
             if ws_manager:
                 await ws_manager.send_progress(
-                    'No valid transactions provided', 1.0, 'Analysis'
+                    'No transactions provided', 1.0, 'Analysis'
                 )
-            return {'error': 'No valid transactions provided'}
-
-        # Step 2: Classification
-        if ws_manager:
-            await ws_manager.send_progress(
-                'Classifying transactions...', 0.2, 'Analysis'
-            )
-        categories = await classify_transactions(tx_objects)
+            return {'error': 'No transactions provided'}
 
-        # Step 3: Anomaly Detection
-        if ws_manager:
-            await ws_manager.send_progress('Detecting anomalies...', 0.4, 'Analysis')
-        anomalies = await detect_anomalies(tx_objects)
+        if batch is None:
+            if ws_manager:
+                await ws_manager.send_progress(
+                    'No valid transactions provided', 1.0, 'Analysis'
+                )
+            return {'error': 'No valid transactions provided', 'rejected': rejected}
 
-        # Step 4: Spending Analysis
-        if ws_manager:
-            await ws_manager.send_progress('Analyzing spending...', 0.6, 'Analysis')
-        spending_analysis = await analyze_spending(tx_objects)
+        # Sort and aggregate once; every stage reads from the shared context
+        full = AnalysisContext(batch)
+        context = full.window(window) if window else full
+        if not len(context.batch):
+            return {'error': NO_TRANSACTIONS_IN_RANGE, 'rejected': rejected}
 
-        # Step 5: Trend Prediction
+        # Step 2: Run the independent stages concurrently; report each as it lands
         if ws_manager:
             await ws_manager.send_progress(
-                'Predicting spending trends...', 0.8, 'Analysis'
+                'Running analysis stages...', 0.2, 'Analysis'
+            )
+        stages = {
+            'categories': classify_transactions(context),
+            'anomalies': stage_executor.run(detect_anomalies, context),
+        }
+        if len(shard_bounds(len(context.batch))) > 1:
+            # One sharded map-reduce pass feeds both aggregate stages
+            partials = asyncio.ensure_future(aggregate_batch(context.batch))
+            stages['spending_analysis'] = finish(
+                partials, PartialAggregate.spending_analysis
+            )
+            stages['spending_trends'] = finish(
+                partials, PartialAggregate.spending_trends
             )
-        spending_trends = await predict_trends(tx_objects)
+        else:
+            stages['spending_analysis'] = stage_executor.run(analyze_spending, context)
+            stages['spending_trends'] = stage_executor.run(predict_trends, context)
+        stages['recurring'] = stage_executor.run(detect_recurring, context)
+        results = await run_stages(stages, ws_manager)
+        if window and window.rolling:
+            results['spending_analysis']['rolling'] = full.rolling(window)
 
         # Compile the results
-        result = {
-            'categories': categories,
-            'anomalies': anomalies,
-            'spending_analysis': spending_analysis,
-            'spending_trends': spending_trends,
-        }
+        result = {**results, 'rejected': rejected}
 
         settings.logger.info('Transaction analysis completed successfully')
         return result
 
     except Exception as e:
-        settings.logger.error(f'Error analyzing transactions: {str(e)}', exc_info=True)
-        if ws_manager:
-            await ws_manager.send_progress('Analysis failed', 1.0)
-        return {'error': f'Analysis failed: {str(e)}'}
+        return await analysis_failed(e, ws_manager)
 
 
-def validate_transaction(t: dict) -> bool:
-    """Validate transaction fields."""
+async def analyze_stored(
+    user: str,
+    window: DateWindow | None = None,
+    ws_manager: WebSocketManager = None,
+) -> dict:
+    """Analyze a user's stored transactions in the window's days."""
+    window = window or DateWindow()
     try:
-        required_fields = {'date', 'description', 'amount', 'balance', 'type', 'userId'}
-        if not all(field in t for field in required_fields):
-            return False
-
-        # Validate amount and balance are numeric
-        float(t['amount'])
-        float(t['balance'])
-
-        # Validate date formats
-        datetime.fromisoformat(t['date'])
-
-        return True
-    except (ValueError, TypeError):
-        return False
-
-
-async def classify_transactions(transactions: list[Transaction]) -> dict:
-    """
-    Classify transactions using FinBERT.
-    """
-    # Get device (GPU if available, otherwise CPU)
-    device, device_name = get_device()
-    settings.logger.info(f'Using device for classification: {device_name}')
-    # Load FinBERT classification pipeline
-    classifier = pipeline(
-        'zero-shot-classification',
-        model='yiyanghkust/finbert-tone',
-        device=0 if device.type in ['cuda', 'mps'] else -1,  # Use GPU if available
-    )
+        if ws_manager:
+            await ws_manager.send_progress('Loading transactions...', 0.1, 'Analysis')
+        batch = await asyncio.to_thread(
+            transaction_store.load, user, window.history_start, window.last_day
+        )
+    except Exception as e:
+        return await analysis_failed(e, ws_manager)
 
-    # Define financial categories
-    labels = os.getenv(
-        'LABELS', 'groceries,housing,transportation,entertainment,utilities,other'
-    ).split(',')
+    return await analyze_ingested(batch, [], ws_manager, window)
 
-    # Prepare transaction descriptions for classification
-    descriptions = [tx.description.lower() for tx in transactions]
 
-    # Batch classify descriptions (Improves performance)
-    results = await asyncio.to_thread(
-        classifier, descriptions, labels, truncation=True, max_length=128
+async def analysis_failed(
+    error: Exception, ws_manager: WebSocketManager = None
+) -> dict:
+    settings.logger.error(f'Error analyzing transactions: {str(error)}', exc_info=True)
+    if ws_manager:
+        await ws_manager.send_progress('Analysis failed', 1.0)
+    return {'error': f'Analysis failed: {str(error)}'}
+
+
+async def analysis_key(transactions) -> str:
+    """Result-cache key: the payload plus the labels and model that classify it."""
+    return await asyncio.to_thread(
+        payload_key,
+        'analyze',
+        transactions,
+        get_labels(),
+        classifier_registry.model_id,
     )
 
-    # Initialize categories and percentages
-    categories = {label: 0 for label in labels}
-
-    # Aggregate classification results
-    for tx, result in zip(transactions, results):
-        category = result['labels'][0]
-        categories[category] += abs(tx.amount)
 
-    total_spent = sum(categories.values())
-
-    # Calculate percentages
-    percentages = {
-        category: (amount / total_spent) * 100 if total_spent > 0 else 0
-        for category, amount in categories.items()
-    }
-
-    return {'categories': categories, 'percentages': percentages}
+async def finish(
+    partials: Awaitable[PartialAggregate], stage: Callable[[PartialAggregate], dict]
+) -> dict:
+    """Render a stage's output from merged partial aggregates."""
+    return stage(await partials)
 
 
-async def detect_anomalies(transactions: list[Transaction]) -> list[dict]:
-    """Detect anomalies in transactions and provide specific reasons."""
-    # Extract transaction amounts and reshape for Isolation Forest
-    amounts = np.array([tx.amount for tx in transactions]).reshape(-1, 1)
-    model = IsolationForest(contamination=0.05, random_state=42)
-    anomalies = model.fit_predict(amounts)
+async def run_stages(
+    stages: dict[str, Awaitable], ws_manager: WebSocketManager = None
+) -> dict:
+    """Await named stages concurrently, sending progress in completion order.
 
-    # Calculate mean and standard deviation for dynamic reason generation
-    mean = np.mean(amounts)
-    std = np.std(amounts)
+    Results are returned in the order the stages were given. If one stage
+    fails, the others are cancelled and the error propagates.
+    """
 
-    # Detect anomalies and generate specific reasons
-    anomaly_details = []
-    for tx, anomaly in zip(transactions, anomalies):
-        if anomaly == -1:  # Anomaly detected
-            # Calculate the Z-score for the transaction
-            z_score = (tx.amount - mean) / std
+    async def named(name: str, stage: Awaitable) -> tuple[str, object]:
+        return name, await stage
 
-            # Generate a dynamic reason
-            if tx.amount > 0:
-                reason = (
-                    f'Unusually high income of {tx.amount} detected '
-                    f'(Z-score: {z_score:.2f}).'
-                )
-            elif tx.amount < 0 and abs(tx.amount) > abs(mean) + 2 * std:
-                reason = (
-                    f'Unusually large expense of {tx.amount} detected '
-                    f'(Z-score: {z_score:.2f}).'
+    tasks = [
+        asyncio.ensure_future(named(name, stage)) for name, stage in stages.items()
+    ]
+    results = {}
+    try:
+        for done, next_result in enumerate(asyncio.as_completed(tasks), start=1):
+            name, results[name] = await next_result
+            if ws_manager:
+                await ws_manager.send_progress(
+                    STAGE_MESSAGES.get(name, name),
+                    0.2 + 0.7 * done / len(tasks),
+                    'Analysis',
                 )
-            elif tx.amount < 0 and 'luxury' in tx.description.lower():
-                reason = 'Uncommon luxury expense detected.'
-            elif tx.amount < 0 and 'groceries' in tx.description.lower():
-                reason = 'Unusually high grocery expense detected.'
-            else:
-                reason = f'Outlier transaction with amount {tx.amount} (Z-score: {z_score:.2f}).'
-
-            # Append the anomaly details
-            anomaly_details.append(
-                {
-                    'date': tx.date.isoformat(),
-                    'description': tx.description,
-                    'amount': tx.amount,
-                    'reason': reason,
-                }
-            )
+    finally:
+        for task in tasks:
+            task.cancel()
+    return {name: results[name] for name in stages}
 
-    return anomaly_details
 
+async def classify_merchants(
+    merchants: list[str], labels: list[str]
+) -> tuple[dict[str, tuple[str, float]], dict[str, str]]:
+    """
+    Classify merchant keys through the rule -> cache -> model cascade.
 
-async def analyze_spending(transactions: list[Transaction]) -> dict:
-    """Generate spending analysis with cumulative balance"""
-    total_spent = sum(tx.amount for tx in transactions if tx.amount < 0)
-    total_income = sum(tx.amount for tx in transactions if tx.amount > 0)
+    Returns the ``(label, confidence)`` per merchant and the tier that decided it.
+    """
+    predictions: dict[str, tuple[str, float]] = {}
+    tiers: dict[str, str] = {}
+
+    # Tier 1: keyword/regex/merchant rules
+    matcher = get_matcher(tuple(labels))
+    for merchant in merchants:
+        match = matcher.match(merchant)
+        if match is not None and match[1] >= settings.rule_confidence_threshold:
+            predictions[merchant] = match
+            tiers[merchant] = 'rule'
+    remaining = [m for m in merchants if m not in predictions]
+
+    # Tier 2: previously classified merchants
+    model_id = classifier_registry.model_id
+    if remaining:
+        cached = await asyncio.to_thread(
+            classification_cache.get_many, remaining, labels, model_id
+        )
+        predictions.update(cached)
+        tiers.update(dict.fromkeys(cached, 'cache'))
 
-    # Create a DataFrame from transactions
-    df = pd.DataFrame([t.__dict__ for t in transactions])
+    # Tier 3: only what is left reaches the shared, preloaded pipeline
+    misses = [m for m in remaining if m not in predictions]
+    if misses:
+        settings.logger.info(f'Classifying {len(misses)} of {len(merchants)} merchants')
+        results = await inference_scheduler.classify(misses, labels)
+        fresh = dict(zip(misses, results))
+        await asyncio.to_thread(classification_cache.put_many, fresh, labels, model_id)
+        predictions.update(fresh)
+        tiers.update(dict.fromkeys(misses, 'model'))
 
-    # Ensure date parsing is correct
-    df['date'] = pd.to_datetime(df['date'])
-    df['date'] = df['date'].dt.tz_localize(None)
+    return predictions, tiers
 
-    # Group by the date and calculate daily totals
-    daily_summary = df.groupby(df['date'].dt.date)['amount'].sum()
 
-    # Sort by date to ensure cumulative calculations are correct
-    df = df.sort_values(by='date')
+async def classify_transactions(context: AnalysisContext) -> dict:
+    """
+    Classify transactions using keyword rules, falling back to FinBERT.
+    """
+    batch = context.batch
+    groups = np.zeros(len(batch), dtype=np.intp)
+    return (await classify_groups(batch, groups, 1))[0]
 
-    # Calculate the cumulative balance
-    df['cumulative_balance'] = df['balance']
 
-    # Convert daily_summary to JSON-serializable format
-    daily_summary = {str(date): float(amount) for date, amount in daily_summary.items()}
+async def classify_groups(
+    batch: TransactionBatch, group_codes: np.ndarray, n_groups: int
+) -> list[dict]:
+    """Classify a batch once and break the categories down per group.
 
-    # Prepare cumulative balance as JSON-serializable format
-    cumulative_balance = {
-        row['date'].strftime('%Y-%m-%d'): row['cumulative_balance']
-        for _, row in df.iterrows()
-    }
+    Every group's merchants go through a single cascade (and so a single set
+    of model batches); ``group_codes`` assigns each row to a group in
+    ``range(n_groups)``, e.g. a user.
+    """
+    # Define financial categories
+    labels = get_labels()
 
-    return {
-        'total_spent': abs(total_spent),
-        'total_income': total_income,
-        'savings_rate': (
-            ((total_income + total_spent) / total_income) * 100 if total_income else 0
+    # Group transactions by canonical merchant so each merchant is classified once
+    merchants, merchant_codes = await asyncio.to_thread(
+        group_by_merchant, batch.description
+    )
+    predictions, tiers = await classify_merchants(merchants, labels)
+
+    # Fan merchant labels back out to every member transaction
+    label_index = {label: i for i, label in enumerate(labels)}
+    merchant_labels = np.array([label_index[predictions[m][0]] for m in merchants])
+    category_codes = group_codes * len(labels) + merchant_labels[merchant_codes]
+    category_totals = np.bincount(
+        category_codes,
+        weights=np.abs(batch.amount),
+        minlength=n_groups * len(labels),
+    ).reshape(n_groups, len(labels))
+
+    # Expense distribution per (group, category), sharded for large batches,
+    # and spending forecasts for all of them in one batched fit
+    expenses = batch.amount < 0
+    distribution, forecasts = await asyncio.gather(
+        distribute(
+            -batch.amount[expenses], category_codes[expenses], n_groups * len(labels)
+        ),
+        stage_executor.run(
+            category_forecasts,
+            batch.date,
+            batch.amount,
+            category_codes,
+            len(labels),
+            n_groups,
         ),
-        'daily_summary': daily_summary,
-        'cumulative_balance': cumulative_balance,
-    }
-
-
-async def predict_trends(transactions: list[Transaction]) -> dict:
-    """Predict future spending trends with enhanced analysis."""
-    if len(transactions) < 2:
-        return {'trend': 'Not enough data'}
-
-    # Convert dates to numeric for regression
-    dates = [(tx.date - transactions[0].date).days for tx in transactions]
-    amounts = [tx.amount for tx in transactions]
-
-    # Linear regression for trends
-    coeffs = np.polyfit(dates, amounts, 1)
-    trend = 'increasing' if coeffs[0] > 0 else 'decreasing'
-
-    # Include confidence interval (optional)
-    slope, intercept = coeffs
-    trend_line = [slope * x + intercept for x in dates]
-
-    # Estimated monthly spend
-    df = pd.DataFrame([t.__dict__ for t in transactions])
-    df['date'] = pd.to_datetime(df['date'])
-    df['date'] = df['date'].dt.tz_localize(None)
-    months = len(df['date'].dt.to_period('M').unique())
-
-    return {
-        'trend': trend,
-        'trend_slope': slope,
-        'estimated_monthly_spend': abs(
-            sum(tx.amount for tx in transactions if tx.amount < 0)
+    )
+
+    # Transactions per (group, merchant), ordered by group then first appearance
+    pairs, pair_counts = np.unique(
+        group_codes * len(merchants) + merchant_codes, return_counts=True
+    )
+    pair_groups, pair_merchants = np.divmod(pairs, len(merchants))
+    bounds = np.searchsorted(pair_groups, np.arange(n_groups + 1))
+
+    results = []
+    for group in range(n_groups):
+        # Initialize categories and percentages
+        categories = {
+            label: float(total)
+            for label, total in zip(labels, category_totals[group].tolist())
+        }
+        tier_counts = {'rule': 0, 'cache': 0, 'model': 0}
+        merchant_summary = {}
+        start, end = bounds[group], bounds[group + 1]
+        for code, count in zip(
+            pair_merchants[start:end].tolist(), pair_counts[start:end].tolist()
+        ):
+            merchant = merchants[code]
+            tier = tiers[merchant]
+            tier_counts[tier] += count
+            merchant_summary[merchant] = {
+                'category': predictions[merchant][0],
+                'tier': tier,
+                'count': count,
+            }
+
+        total_spent = sum(categories.values())
+
+        # Calculate percentages
+        percentages = {
+            category: (amount / total_spent) * 100 if total_spent > 0 else 0
+            for category, amount in categories.items()
+        }
+
+        expense_distribution, category_forecast = {}, {}
+        for index, label in enumerate(labels):
+            described = distribution.describe(group * len(labels) + index)
+            if described is not None:
+                expense_distribution[label] = described
+            projected = forecasts.describe(group * len(labels) + index)
+            if projected is not None:
+                category_forecast[label] = projected
+
+        results.append(
+            {
+                'categories': categories,
+                'percentages': percentages,
+                'expense_distribution': expense_distribution,
+                'forecasts': category_forecast,
+                'merchants': merchant_summary,
+                'tiers': tier_counts,
+            }
         )
-        / (months or 1),
-    }
+    return results
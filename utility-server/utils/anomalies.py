@@ -0,0 +1,458 @@
+import hashlib
+import os
+from collections import OrderedDict
+from threading import Lock
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import IsolationForest
+
+from models.base import TransactionBatch
+from utils.merchants import group_by_merchant
+from utils.settings import base_settings as settings
+
+DETECTORS = ('isolation-forest', 'mad', 'features')
+
+# Share of transactions flagged by the forest and the feature detector
+CONTAMINATION = 0.05
+# Robust z-scores are scaled so they match standard z-scores for normal data
+MAD_SCALE = 0.6745
+
+# Amount-only reasons, chosen per flagged transaction with ``np.select``
+AMOUNT_REASONS = (
+    'Unusually high income of {amount} detected (Z-score: {z_score:.2f}).',
+    'Unusually large expense of {amount} detected (Z-score: {z_score:.2f}).',
+    'Uncommon luxury expense detected.',
+    'Unusually high grocery expense detected.',
+    'Outlier transaction with amount {amount} (Z-score: {z_score:.2f}).',
+)
+
+# Columns of the ``anomaly_features`` matrix
+FEATURES = (
+    'amount',
+    'merchant_amount',
+    'weekday',
+    'day_of_month',
+    'merchant_gap',
+    'merchant_rarity',
+)
+# Merchants need this many transactions (or gaps) before they define "typical"
+MIN_MERCHANT_ROWS = 3
+WEEKDAYS = (
+    'Monday',
+    'Tuesday',
+    'Wednesday',
+    'Thursday',
+    'Friday',
+    'Saturday',
+    'Sunday',
+)
+
+# Feature reasons, chosen from the feature that contributed most to a score
+FEATURE_REASONS = AMOUNT_REASONS[:2] + (
+    'Amount {amount} is unusual for {merchant} (typically {typical:.2f}).',
+    'Uncommon {weekday} transaction of {amount}.',
+    'Transaction of {amount} on an unusual day of the month ({day}).',
+    'Repeat charge from {merchant} only {gap:.1f} days after the previous one.',
+    'No charge from {merchant} for {gap:.1f} days before this one.',
+    'Rare merchant {merchant} ({count} transactions).',
+)
+
+
+class ForestDetector:
+    """Isolation forest over transaction amounts."""
+
+    kind = 'isolation-forest'
+
+    def __init__(self, max_samples: int = 256, n_jobs: int = 1):
+        self.max_samples = max_samples
+        self.n_jobs = n_jobs
+        self.model: IsolationForest | None = None
+
+    def fit(self, amounts: np.ndarray) -> 'ForestDetector':
+        self.model = IsolationForest(
+            contamination=CONTAMINATION,
+            # Bounded subsample per tree; never more rows than there are
+            max_samples=max(1, min(self.max_samples, len(amounts))),
+            n_jobs=self.n_jobs,
+            random_state=42,
+        )
+        self.model.fit(amounts.reshape(-1, 1))
+        return self
+
+    def predict(self, amounts: np.ndarray) -> np.ndarray:
+        """Boolean mask of the anomalous amounts."""
+        return self.model.predict(amounts.reshape(-1, 1)) == -1
+
+
+class MadDetector:
+    """Robust z-score against the median absolute deviation of amounts.
+
+    One O(n) pass with no model to fit, for histories too large to
+    re-score with a forest on every request.
+    """
+
+    kind = 'mad'
+
+    def __init__(self, threshold: float = 3.5):
+        self.threshold = threshold
+        self.median = 0.0
+        self.scale = 0.0
+
+    def fit(self, amounts: np.ndarray) -> 'MadDetector':
+        self.median = float(np.median(amounts))
+        deviations = np.abs(amounts - self.median)
+        mad = float(np.median(deviations))
+        # More than half the amounts equal: fall back to the mean deviation
+        self.scale = mad / MAD_SCALE if mad else float(deviations.mean()) * 1.2533
+        return self
+
+    def predict(self, amounts: np.ndarray) -> np.ndarray:
+        if not self.scale:
+            return np.zeros(len(amounts), dtype=bool)
+        return np.abs(amounts - self.median) > self.threshold * self.scale
+
+
+def fingerprint(amounts: np.ndarray) -> str:
+    return hashlib.blake2b(
+        np.ascontiguousarray(amounts).data, digest_size=16
+    ).hexdigest()
+
+
+class AnomalyModelCache:
+    """Fitted anomaly detectors per user, refit only when enough data arrives.
+
+    An unchanged history (same amounts fingerprint) reuses its flags
+    outright. A history that extends the rows the model was fit on (same
+    fingerprint over that prefix) is scored with the cached model until it
+    has grown by more than ``refit_fraction`` of those rows; any other
+    change, e.g. edited rows or a different window, is refit.
+    """
+
+    def __init__(self, max_entries: int = 1024, refit_fraction: float = 0.1):
+        self.max_entries = max_entries
+        self.refit_fraction = refit_fraction
+        # key -> (amounts fingerprint, fingerprint and count of the rows fit
+        # on, detector, flags)
+        self._models: OrderedDict[str, tuple[str, str, int, object, np.ndarray]] = (
+            OrderedDict()
+        )
+        self._lock = Lock()
+        self.hits = 0
+        self.reused = 0
+        self.fits = 0
+
+    def flags(self, user: str, amounts: np.ndarray) -> np.ndarray:
+        """Boolean mask of the anomalous ``amounts`` in ``user``'s history."""
+        kind = detector_kind(len(amounts))
+        key = f'{kind}:{user}'
+        digest = fingerprint(amounts)
+        model = None
+        with self._lock:
+            entry = self._models.get(key)
+            if entry is not None:
+                self._models.move_to_end(key)
+                if entry[0] == digest:
+                    self.hits += 1
+                    return entry[4]
+        if entry is not None:
+            _, fitted_digest, fitted_rows, detector, _ = entry
+            grown = len(amounts) - fitted_rows
+            if (
+                0 <= grown <= self.refit_fraction * fitted_rows
+                and fingerprint(amounts[:fitted_rows]) == fitted_digest
+            ):
+                model = detector
+
+        # Fit and score outside the lock so users do not wait on each other
+        refit = model is None
+        if refit:
+            model = make_detector(kind).fit(amounts)
+            fitted_digest, fitted_rows = digest, len(amounts)
+        flags = model.predict(amounts)
+        # Shared by every later request for the same history
+        flags.setflags(write=False)
+        with self._lock:
+            self.fits += refit
+            self.reused += not refit
+            if self.max_entries > 0:
+                self._models[key] = (digest, fitted_digest, fitted_rows, model, flags)
+                self._models.move_to_end(key)
+                while len(self._models) > self.max_entries:
+                    self._models.popitem(last=False)
+        return flags
+
+    def clear(self) -> None:
+        with self._lock:
+            self._models.clear()
+
+    def stats(self) -> dict:
+        return {
+            'hits': self.hits,
+            'reused': self.reused,
+            'fits': self.fits,
+            'entries': len(self._models),
+        }
+
+
+def detector_kind(rows: int) -> str:
+    """Configured detector, switching to MAD for very large histories."""
+    if settings.anomaly_mad_rows and rows >= settings.anomaly_mad_rows:
+        return 'mad'
+    if settings.anomaly_detector not in DETECTORS:
+        raise ValueError(
+            f'Unknown anomaly detector {settings.anomaly_detector!r}; '
+            f'expected one of {DETECTORS}'
+        )
+    return settings.anomaly_detector
+
+
+def make_detector(kind: str):
+    if kind == 'mad':
+        return MadDetector(settings.anomaly_mad_threshold)
+    cpus = os.cpu_count() or 1
+    n_jobs = settings.anomaly_n_jobs
+    return ForestDetector(
+        max_samples=settings.anomaly_max_samples,
+        # 0 or less uses every core; never more jobs than cores
+        n_jobs=min(n_jobs, cpus) if n_jobs > 0 else cpus,
+    )
+
+
+# Per process: with the process executor each worker keeps its own models
+anomaly_models = AnomalyModelCache(
+    max_entries=settings.anomaly_model_cache_size,
+    refit_fraction=settings.anomaly_refit_fraction,
+)
+
+
+def amount_reasons(batch: TransactionBatch, flagged: np.ndarray) -> list[str]:
+    """Explain flagged rows by their amount against the whole history."""
+    mean = np.mean(batch.amount)
+    std = np.std(batch.amount)
+
+    amounts = batch.amount[flagged]
+    descriptions = pd.Series(batch.description[flagged], dtype=object)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z_scores = (amounts - mean) / std
+    expense = amounts < 0
+    reasons = np.select(
+        [
+            amounts > 0,
+            expense & (np.abs(amounts) > abs(mean) + 2 * std),
+            expense & descriptions.str.contains('luxury', case=False, regex=False),
+            expense & descriptions.str.contains('groceries', case=False, regex=False),
+        ],
+        [0, 1, 2, 3],
+        default=4,
+    )
+    return [
+        AMOUNT_REASONS[reason].format(amount=amount, z_score=z_score)
+        for amount, z_score, reason in zip(
+            amounts.tolist(), z_scores.tolist(), reasons.tolist()
+        )
+    ]
+
+
+def group_z_scores(
+    values: np.ndarray, codes: np.ndarray, n_groups: int, valid: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    """Z-score of each value within its group, and each row's group mean.
+
+    Rows that are not ``valid``, or whose group has fewer than
+    ``MIN_MERCHANT_ROWS`` valid values or no spread, score 0.
+    """
+    values = np.where(valid, values, 0.0)
+    counts = np.bincount(codes, weights=valid, minlength=n_groups)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        means = np.bincount(codes, weights=values, minlength=n_groups) / counts
+        squares = np.bincount(codes, weights=values**2, minlength=n_groups) / counts
+        stds = np.sqrt(np.maximum(squares - means**2, 0))
+        row_means, row_stds = means[codes], stds[codes]
+        z_scores = (values - row_means) / row_stds
+    usable = valid & (counts[codes] >= MIN_MERCHANT_ROWS) & (row_stds > 1e-9)
+    return np.where(usable, z_scores, 0.0), row_means
+
+
+def calendar_rarity(values: np.ndarray, calendar: np.ndarray, size: int) -> np.ndarray:
+    """Log of how much less often each value occurs than its calendar share."""
+    observed = np.bincount(values, minlength=size) / len(values)
+    expected = np.bincount(calendar, minlength=size) / len(calendar)
+    return np.log(expected[values] / observed[values])
+
+
+def anomaly_features(batch: TransactionBatch) -> tuple[np.ndarray, dict]:
+    """Build the ``(rows, FEATURES)`` matrix in one vectorized pass.
+
+    Columns are the signed log-amount, the log-amount's z-score within its
+    merchant, how rare the weekday and day of month are (log of calendar
+    share over share of rows), the log gap since the previous transaction
+    at the same merchant as a z-score within that merchant, and how rare
+    the merchant is. Also returns the per-row values the reasons quote.
+    """
+    n = len(batch)
+    amounts = batch.amount
+    magnitude = np.log1p(np.abs(amounts))
+    merchants, codes = group_by_merchant(batch.description)
+    n_merchants = len(merchants)
+    merchant_counts = np.bincount(codes, minlength=n_merchants)
+
+    everywhere = np.ones(n, dtype=bool)
+    merchant_amount, _ = group_z_scores(magnitude, codes, n_merchants, everywhere)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        typical = np.bincount(codes, weights=amounts, minlength=n_merchants)
+        typical = (typical / merchant_counts)[codes]
+
+    days = batch.date.astype('datetime64[D]')
+    # 1970-01-01 was a Thursday; Monday is 0
+    weekday = (days.view(np.int64) + 3) % 7
+    day = (days - days.astype('datetime64[M]')).view(np.int64) + 1
+    # Rarity is relative to the calendar, so the 31st is not rare just
+    # because fewer months have one
+    calendar = np.arange(days.min(), days.max() + np.timedelta64(1, 'D'))
+    calendar_weekday = (calendar.view(np.int64) + 3) % 7
+    calendar_day = (calendar - calendar.astype('datetime64[M]')).view(np.int64) + 1
+    weekday_rarity = calendar_rarity(weekday, calendar_weekday, 7)
+    day_rarity = calendar_rarity(day, calendar_day, 32)
+
+    # Gap to the previous transaction at the same merchant, via one lexsort
+    order = np.lexsort((batch.date, codes))
+    ordered_codes = codes[order]
+    ordered_times = batch.date[order].view(np.int64)
+    same = np.zeros(n, dtype=bool)
+    same[1:] = ordered_codes[1:] == ordered_codes[:-1]
+    gaps = np.empty(n)
+    gaps[order] = np.where(
+        same, np.diff(ordered_times, prepend=ordered_times[:1]) / 86_400e9, np.nan
+    )
+    has_gap = ~np.isnan(gaps)
+    merchant_gap, _ = group_z_scores(
+        np.log1p(np.where(has_gap, gaps, 0.0)), codes, n_merchants, has_gap
+    )
+
+    features = np.column_stack(
+        [
+            np.sign(amounts) * magnitude,
+            merchant_amount,
+            weekday_rarity,
+            day_rarity,
+            merchant_gap,
+            -np.log(merchant_counts[codes] / n),
+        ]
+    )
+    details = {
+        'merchants': np.asarray(merchants, dtype=object),
+        'codes': codes,
+        'merchant_counts': merchant_counts,
+        'typical': typical,
+        'weekday': weekday,
+        'day': day,
+        'gaps': gaps,
+    }
+    return features, details
+
+
+def standardize(values: np.ndarray, robust: bool) -> np.ndarray:
+    """Z-scores of ``values`` by median/MAD (``robust``) or mean/std.
+
+    Values without spread score 0.
+    """
+    if robust:
+        center = np.median(values)
+        scale = np.median(np.abs(values - center)) / MAD_SCALE
+    else:
+        center, scale = values.mean(), values.std()
+    if scale < 1e-9:
+        return np.zeros_like(values)
+    return (values - center) / scale
+
+
+def feature_contributions(features: np.ndarray) -> np.ndarray:
+    """Squared per-feature z-scores; a row's anomaly score is their sum.
+
+    The amount is scored robustly, and separately for income and expenses,
+    so outliers do not hide each other and income is not an outlier merely
+    for being income; rarity features only count when a row is rarer than
+    usual.
+    """
+    amount, merchant_amount, weekday, day, gap, rarity = features.T
+    amount_z = np.zeros(len(amount))
+    for side in (amount < 0, amount > 0):
+        if side.any():
+            # Only unusually large amounts; small ones surface per merchant
+            amount_z[side] = np.maximum(
+                standardize(np.abs(amount[side]), robust=True), 0
+            )
+    z_scores = np.column_stack(
+        [
+            amount_z,
+            merchant_amount,
+            np.maximum(standardize(weekday, robust=False), 0),
+            np.maximum(standardize(day, robust=False), 0),
+            gap,
+            np.maximum(standardize(rarity, robust=False), 0),
+        ]
+    )
+    return z_scores**2
+
+
+def feature_anomalies(batch: TransactionBatch) -> tuple[np.ndarray, list[str]]:
+    """Flag the highest-scoring ``CONTAMINATION`` share of rows on all features.
+
+    Returns the flagged row indices in payload order and a reason per row,
+    taken from the feature that contributed most to its score.
+    """
+    features, details = anomaly_features(batch)
+    contributions = feature_contributions(features)
+    scores = contributions.sum(axis=1)
+    n_flagged = int(np.ceil(CONTAMINATION * len(scores)))
+    flagged = np.argpartition(-scores, n_flagged - 1)[:n_flagged]
+    flagged = np.sort(flagged[scores[flagged] > 0])
+
+    amounts = batch.amount[flagged]
+    dominant = contributions[flagged].argmax(axis=1)
+    gap_z = features[flagged, 4]
+    mean, std = np.mean(batch.amount), np.std(batch.amount)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z_scores = (amounts - mean) / std
+    reasons = np.select(
+        [
+            (dominant == 0) & (amounts > 0),
+            dominant == 0,
+            dominant == 1,
+            dominant == 2,
+            dominant == 3,
+            (dominant == 4) & (gap_z < 0),
+            dominant == 4,
+        ],
+        [0, 1, 2, 3, 4, 5, 6],
+        default=7,
+    )
+
+    codes = details['codes'][flagged]
+    fields = zip(
+        reasons.tolist(),
+        amounts.tolist(),
+        z_scores.tolist(),
+        details['merchants'][codes].tolist(),
+        details['typical'][flagged].tolist(),
+        details['weekday'][flagged].tolist(),
+        details['day'][flagged].tolist(),
+        details['gaps'][flagged].tolist(),
+        details['merchant_counts'][codes].tolist(),
+    )
+    return flagged, [
+        FEATURE_REASONS[reason].format(
+            amount=amount,
+            z_score=z_score,
+            merchant=merchant,
+            typical=typical,
+            weekday=WEEKDAYS[weekday],
+            day=day,
+            gap=gap,
+            count=count,
+        )
+        for reason, amount, z_score, merchant, typical, weekday, day, gap, count in (
+            fields
+        )
+    ]
@@ -0,0 +1,110 @@
+import asyncio
+
+import numpy as np
+
+from models.base import TransactionBatch
+from utils.analyzer import classify_groups
+from utils.classifier import classifier_registry, get_labels
+from utils.context import AnalysisContext, group_starts
+from utils.executor import stage_executor
+from utils.ingest import ingest_transactions
+from utils.results import payload_key
+from utils.settings import base_settings as settings
+from utils.stages import analyze_stages
+from utils.summarize import (
+    NO_INCOME_OR_EXPENSE,
+    compose_summary,
+    grouped_summary_aggregates,
+)
+
+
+async def batch_key(transactions) -> str:
+    """Result-cache key for a multi-user analysis of ``transactions``."""
+    return await asyncio.to_thread(
+        payload_key,
+        'analyze-batch',
+        transactions,
+        get_labels(),
+        classifier_registry.model_id,
+    )
+
+
+async def analyze_users(transactions: list[dict]) -> dict:
+    """Analyze and summarize many users' transactions in one pass.
+
+    Rows are partitioned by ``userId`` once. Every user's descriptions share
+    one classification cascade, summaries are aggregated for all users in one
+    grouped pass, and the per-user anomaly, spending and trend stages run
+    concurrently on the stage executor. Each user's ``analysis`` and
+    ``summary`` match what ``/analyze`` and ``/summarize`` return for that
+    user's transactions alone, minus ``rejected``, which is reported once.
+    """
+    try:
+        if not transactions:
+            return {'error': 'No transactions provided'}
+
+        batch, rejected = await asyncio.to_thread(ingest_transactions, transactions)
+    except Exception as e:
+        return batch_failed(e)
+
+    return await analyze_users_ingested(batch, rejected)
+
+
+async def analyze_users_ingested(
+    batch: TransactionBatch | None, rejected: list[dict]
+) -> dict:
+    """Batch-analyze an already ingested batch, e.g. one built from NDJSON."""
+    try:
+        if batch is None and not rejected:
+            return {'error': 'No transactions provided'}
+        if batch is None:
+            return {'error': 'No valid transactions provided', 'rejected': rejected}
+
+        # Partition by user with one stable sort of the categorical codes
+        users = batch.userId.categories.tolist()
+        user_codes = batch.userId.codes.astype(np.intp)
+        order = np.argsort(user_codes, kind='stable')
+        bounds = np.append(group_starts(user_codes[order]), len(order))
+        contexts = [
+            AnalysisContext(batch.take(order[start:end]))
+            for start, end in zip(bounds[:-1], bounds[1:])
+        ]
+        settings.logger.info(
+            f'Batch analysis of {len(batch)} transactions for {len(users)} users'
+        )
+
+        categories, aggregates, *stages = await asyncio.gather(
+            classify_groups(batch, user_codes, len(users)),
+            stage_executor.run(
+                grouped_summary_aggregates,
+                AnalysisContext(batch),
+                user_codes,
+                len(users),
+            ),
+            *(stage_executor.run(analyze_stages, context) for context in contexts),
+        )
+
+        results = {}
+        for user, context, user_categories, user_aggregates, user_stages in zip(
+            users, contexts, categories, aggregates, stages
+        ):
+            summary = (
+                await compose_summary(user_aggregates, context.batch)
+                if user_aggregates is not None
+                else {'error': f'Summarization failed: {NO_INCOME_OR_EXPENSE}'}
+            )
+            results[user] = {
+                'analysis': {'categories': user_categories, **user_stages},
+                'summary': summary,
+            }
+
+        settings.logger.info('Batch analysis completed successfully')
+        return {'users': results, 'rejected': rejected}
+
+    except Exception as e:
+        return batch_failed(e)
+
+
+def batch_failed(error: Exception) -> dict:
+    settings.logger.error(f'Error in batch analysis: {str(error)}', exc_info=True)
+    return {'error': f'Batch analysis failed: {str(error)}'}
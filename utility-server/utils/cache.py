@@ -0,0 +1,132 @@
+import hashlib
+import json
+import re
+import sqlite3
+from collections import OrderedDict
+from threading import Lock
+
+from utils.settings import base_settings as settings
+
+_WHITESPACE = re.compile(r'\s+')
+
+# SQLite caps the number of bound parameters per statement
+_SQL_CHUNK = 500
+
+
+def normalize_description(description: str) -> str:
+    """Lowercase a description and collapse runs of whitespace."""
+    return _WHITESPACE.sub(' ', description.lower()).strip()
+
+
+def cache_key(description: str, labels: list[str], model_id: str) -> str:
+    """Build a stable key from the description, label set and model id."""
+    payload = json.dumps([description, sorted(labels), model_id])
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ClassificationCache:
+    """Two-tier (in-memory LRU + SQLite) cache of description classifications.
+
+    Entries are keyed by normalized description, label set and model id, so
+    changing ``LABELS`` or the model never serves stale categories.
+    """
+
+    def __init__(self, max_entries: int = 50_000, path: str | None = None):
+        self.max_entries = max_entries
+        self.path = path
+        self._memory: OrderedDict[str, tuple[str, float]] = OrderedDict()
+        self._lock = Lock()
+        self._db: sqlite3.Connection | None = None
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _connection(self) -> sqlite3.Connection | None:
+        if self._db is None and self.path:
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS classifications '
+                '(key TEXT PRIMARY KEY, label TEXT NOT NULL, score REAL NOT NULL)'
+            )
+            self._db.commit()
+        return self._db
+
+    def _remember(self, key: str, value: tuple[str, float]) -> None:
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def get_many(
+        self, descriptions: list[str], labels: list[str], model_id: str
+    ) -> dict[str, tuple[str, float]]:
+        """Return cached ``(label, score)`` pairs for the descriptions found."""
+        keys = {cache_key(d, labels, model_id): d for d in descriptions}
+        found: dict[str, tuple[str, float]] = {}
+        with self._lock:
+            missing = []
+            for key, description in keys.items():
+                value = self._memory.get(key)
+                if value is None:
+                    missing.append(key)
+                    continue
+                self._memory.move_to_end(key)
+                found[description] = value
+            self.memory_hits += len(found)
+
+            db = self._connection()
+            if db is not None and missing:
+                for start in range(0, len(missing), _SQL_CHUNK):
+                    chunk = missing[start : start + _SQL_CHUNK]
+                    rows = db.execute(
+                        'SELECT key, label, score FROM classifications '
+                        f'WHERE key IN ({",".join("?" * len(chunk))})',
+                        chunk,
+                    ).fetchall()
+                    for key, label, score in rows:
+                        self._remember(key, (label, score))
+                        found[keys[key]] = (label, score)
+                    self.disk_hits += len(rows)
+
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(
+        self,
+        results: dict[str, tuple[str, float]],
+        labels: list[str],
+        model_id: str,
+    ) -> None:
+        """Store fresh ``(label, score)`` pairs in both tiers."""
+        rows = [
+            (cache_key(description, labels, model_id), label, float(score))
+            for description, (label, score) in results.items()
+        ]
+        with self._lock:
+            for key, label, score in rows:
+                self._remember(key, (label, score))
+            db = self._connection()
+            if db is not None and rows:
+                db.executemany(
+                    'INSERT OR REPLACE INTO classifications VALUES (?, ?, ?)', rows
+                )
+                db.commit()
+
+    def stats(self) -> dict:
+        """Return hit/miss counters for monitoring."""
+        hits = self.memory_hits + self.disk_hits
+        lookups = hits + self.misses
+        return {
+            'hits': hits,
+            'memory_hits': self.memory_hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'hit_rate': hits / lookups if lookups else 0,
+            'memory_entries': len(self._memory),
+        }
+
+
+classification_cache = ClassificationCache(
+    max_entries=settings.classification_cache_size,
+    path=settings.classification_cache_path,
+)
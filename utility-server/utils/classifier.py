@@ -0,0 +1,179 @@
+import asyncio
+import os
+from threading import Lock
+
+import numpy as np
+import torch
+from transformers import AutoTokenizer, pipeline
+
+from utils.embeddings import EmbeddingClassifier, exemplars_digest
+from utils.runtime import (
+    MAX_LENGTH,
+    inference_device,
+    length_order,
+    load_model,
+    padding_stats,
+    restore_order,
+    token_lengths,
+)
+from utils.settings import base_settings as settings
+
+DEFAULT_LABELS = 'groceries,housing,transportation,entertainment,utilities,other'
+
+
+def get_device() -> tuple[torch.device, str]:
+    """
+    Detect the best available device (GPU, MPS, or CPU) for PyTorch computations.
+    """
+    if torch.cuda.is_available():
+        # Check if CUDA (NVIDIA GPU) is available
+        return torch.device('cuda'), 'CUDA (NVIDIA GPU)'
+    elif torch.backends.mps.is_available():
+        # Check if MPS (Metal Performance Shaders on Apple Silicon) is available
+        return torch.device('mps'), 'MPS (Apple Metal)'
+    else:
+        # Default to CPU
+        return torch.device('cpu'), 'CPU'
+
+
+def get_labels() -> list[str]:
+    """Return the configured financial categories."""
+    return os.getenv('LABELS', DEFAULT_LABELS).split(',')
+
+
+class ZeroShotClassifier:
+    """Zero-shot NLI classifier: one forward pass per (description, label) pair."""
+
+    def __init__(self, model_id: str, device: torch.device):
+        self.model_id = model_id
+        device = inference_device(device)
+        self.pipeline = pipeline(
+            'zero-shot-classification',
+            model=load_model(model_id, 'sequence-classification', device),
+            tokenizer=AutoTokenizer.from_pretrained(model_id),
+            device=0 if device.type in ['cuda', 'mps'] else -1,  # Use GPU if available
+        )
+
+    def _pair_lengths(
+        self, descriptions: list[str], labels: list[str]
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Token lengths of each description and of every (description, label) pair."""
+        tokenizer = self.pipeline.tokenizer
+        hypotheses = [f'This example is {label}.' for label in labels]
+        text_lengths = token_lengths(tokenizer, descriptions, add_special_tokens=False)
+        hypothesis_lengths = token_lengths(
+            tokenizer, hypotheses, add_special_tokens=False
+        )
+        pair_lengths = (
+            text_lengths[:, None]
+            + hypothesis_lengths[None, :]
+            + tokenizer.num_special_tokens_to_add(pair=True)
+        )
+        return text_lengths, np.minimum(pair_lengths, MAX_LENGTH)
+
+    def predict(
+        self, descriptions: list[str], labels: list[str]
+    ) -> list[tuple[str, float]]:
+        # Feed descriptions shortest-first so each padded batch holds
+        # (description, label) pairs of similar length
+        text_lengths, pair_lengths = self._pair_lengths(descriptions, labels)
+        order = length_order(text_lengths)
+        padding_stats.record(
+            pair_lengths[order].ravel(), settings.classifier_batch_size
+        )
+        results = self.pipeline(
+            [descriptions[i] for i in order],
+            labels,
+            truncation=True,
+            max_length=MAX_LENGTH,
+            batch_size=settings.classifier_batch_size,
+        )
+        if isinstance(results, dict):
+            results = [results]
+        return restore_order(
+            [(result['labels'][0], result['scores'][0]) for result in results], order
+        )
+
+
+class ClassifierRegistry:
+    """Process-wide holder for the configured classification backend.
+
+    The backend (``CLASSIFIER_BACKEND``: ``zero-shot`` or ``embedding``) is
+    loaded once and shared by every request. ``ready`` only flips to ``True``
+    after a warmup inference has completed.
+    """
+
+    def __init__(self):
+        self._classifier = None
+        self._lock = Lock()
+        self.ready = False
+        self.error: str | None = None
+
+    @property
+    def backend(self) -> str:
+        return settings.classifier_backend
+
+    @property
+    def model_name(self) -> str:
+        """The Hugging Face id or local path the backend loads its model from."""
+        if self.backend == 'embedding':
+            return settings.embedding_model_path or settings.embedding_model
+        return settings.classifier_model_path or settings.classifier_model
+
+    @property
+    def model_id(self) -> str:
+        """Identifies what produced a classification, for cache keys.
+
+        Includes the runtime: int8 and ONNX scores are close to, not equal
+        to, eager torch ones.
+        """
+        runtime = settings.classifier_runtime
+        if self.backend == 'embedding':
+            return f'embedding:{self.model_name}:{exemplars_digest()}@{runtime}'
+        return f'{self.model_name}@{runtime}'
+
+    def get(self):
+        """Return the shared backend, loading it on first use."""
+        if self._classifier is None:
+            with self._lock:
+                if self._classifier is None:
+                    self._classifier = self._load()
+        return self._classifier
+
+    def _load(self):
+        device, device_name = get_device()
+        settings.logger.info(
+            f'Loading {self.backend} classifier {self.model_name} '
+            f'({settings.classifier_runtime} runtime) on device: {device_name}'
+        )
+        if self.backend == 'embedding':
+            return EmbeddingClassifier(self.model_name, device)
+        if self.backend == 'zero-shot':
+            return ZeroShotClassifier(self.model_name, device)
+        raise ValueError(f'Unknown CLASSIFIER_BACKEND: {self.backend}')
+
+    def predict(
+        self, descriptions: list[str], labels: list[str]
+    ) -> list[tuple[str, float]]:
+        """Return the top label and its score for each description."""
+        if not descriptions:
+            return []
+        return self.get().predict(descriptions, labels)
+
+    def warmup(self) -> None:
+        """Load the model and run one inference so the first request is fast."""
+        self.predict(['warmup transaction'], get_labels())
+        self.ready = True
+        self.error = None
+        settings.logger.info(f'Classifier {self.model_id} is warm')
+
+    async def start(self) -> None:
+        """Warm the classifier without blocking the event loop."""
+        try:
+            await asyncio.to_thread(self.warmup)
+        except Exception as e:
+            self.error = str(e)
+            settings.logger.error(f'Classifier warmup failed: {str(e)}', exc_info=True)
+
+
+classifier_registry = ClassifierRegistry()
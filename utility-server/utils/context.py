@@ -0,0 +1,162 @@
+from functools import cached_property
+
+import numpy as np
+
+from models.base import TransactionBatch
+from utils.windows import DateWindow, rolling_metrics
+
+
+def group_starts(keys: np.ndarray) -> np.ndarray:
+    """Return the start index of each run of equal values in sorted ``keys``."""
+    if not len(keys):
+        return np.zeros(0, dtype=np.intp)
+    return np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+
+
+class AnalysisContext:
+    """Shared, date-sorted view of a batch and the aggregates stages reuse.
+
+    Everything is computed lazily on first access and at most once per
+    analysis, so each stage only pays for the aggregates it needs.
+    """
+
+    def __init__(self, batch: TransactionBatch):
+        self.batch = batch
+
+    @cached_property
+    def order(self) -> np.ndarray:
+        """Stable permutation that sorts the batch by date."""
+        return np.argsort(self.batch.date, kind='stable')
+
+    @cached_property
+    def dates(self) -> np.ndarray:
+        return self.batch.date[self.order]
+
+    def window(self, window: DateWindow) -> 'AnalysisContext':
+        """Context over the rows in ``window``'s days, in payload order.
+
+        The range is found by binary search on the date-sorted index, so
+        only the selected rows are copied; the new context reuses their
+        date order instead of sorting again.
+        """
+        lo, hi = np.searchsorted(self.dates, window.bounds)
+        if lo == 0 and hi == len(self.dates):
+            return self
+        selected = self.order[lo:hi]
+        rows = np.sort(selected)
+        context = AnalysisContext(self.batch.take(rows))
+        context.order = np.searchsorted(rows, selected)
+        return context
+
+    def rolling(self, window: DateWindow) -> dict:
+        """``rolling_metrics`` for the days in ``window``, from this context's days."""
+        return rolling_metrics(self.days, self.daily_income, self.daily_expense, window)
+
+    @cached_property
+    def amounts(self) -> np.ndarray:
+        return self.batch.amount[self.order]
+
+    @cached_property
+    def balances(self) -> np.ndarray:
+        return self.batch.balance[self.order]
+
+    @cached_property
+    def income_mask(self) -> np.ndarray:
+        """Income rows, in date order."""
+        return self.amounts > 0
+
+    @cached_property
+    def expense_mask(self) -> np.ndarray:
+        """Expense rows, in date order."""
+        return self.amounts < 0
+
+    @cached_property
+    def total_income(self) -> float:
+        return float(self.amounts[self.income_mask].sum())
+
+    @cached_property
+    def total_spent(self) -> float:
+        """Sum of expenses (negative)."""
+        return float(self.amounts[self.expense_mask].sum())
+
+    @cached_property
+    def day_starts(self) -> np.ndarray:
+        return group_starts(self.dates.astype('datetime64[D]'))
+
+    @cached_property
+    def days(self) -> np.ndarray:
+        """Distinct calendar days (``datetime64[D]``), ascending."""
+        return self.dates[self.day_starts].astype('datetime64[D]')
+
+    @cached_property
+    def daily_totals(self) -> np.ndarray:
+        """Net amount per day in ``days``."""
+        return np.add.reduceat(self.amounts, self.day_starts)
+
+    @cached_property
+    def daily_income(self) -> np.ndarray:
+        """Income per day in ``days``."""
+        return np.add.reduceat(
+            np.where(self.income_mask, self.amounts, 0), self.day_starts
+        )
+
+    @cached_property
+    def daily_expense(self) -> np.ndarray:
+        """Absolute expenses per day in ``days``."""
+        return -np.add.reduceat(
+            np.where(self.expense_mask, self.amounts, 0), self.day_starts
+        )
+
+    @cached_property
+    def daily_closing_balance(self) -> np.ndarray:
+        """Balance of the last transaction on each day in ``days``."""
+        ends = np.r_[self.day_starts[1:], len(self.dates)] - 1
+        return self.balances[ends]
+
+    @cached_property
+    def month_starts(self) -> np.ndarray:
+        return group_starts(self.dates.astype('datetime64[M]'))
+
+    @cached_property
+    def months(self) -> np.ndarray:
+        """Distinct calendar months (``datetime64[M]``), ascending."""
+        return self.dates[self.month_starts].astype('datetime64[M]')
+
+    @cached_property
+    def month_codes(self) -> np.ndarray:
+        """Index into ``months`` for every row, in date order."""
+        codes = np.zeros(len(self.dates), dtype=np.intp)
+        codes[self.month_starts[1:]] = 1
+        return np.cumsum(codes)
+
+    @cached_property
+    def first_month(self) -> np.datetime64:
+        return self.batch.date.min().astype('datetime64[M]')
+
+    @cached_property
+    def month_offsets(self) -> np.ndarray:
+        """Months since ``first_month`` for every row, in payload order.
+
+        Unlike ``month_codes`` this needs no sort, so whole-batch monthly
+        aggregates can be computed in linear time.
+        """
+        return (self.batch.date.astype('datetime64[M]') - self.first_month).astype(
+            np.intp
+        )
+
+    @cached_property
+    def monthly_income(self) -> np.ndarray:
+        return np.bincount(
+            self.month_codes,
+            weights=np.where(self.income_mask, self.amounts, 0),
+            minlength=len(self.months),
+        )
+
+    @cached_property
+    def monthly_expense(self) -> np.ndarray:
+        """Absolute expenses per month in ``months``."""
+        return -np.bincount(
+            self.month_codes,
+            weights=np.where(self.expense_mask, self.amounts, 0),
+            minlength=len(self.months),
+        )
@@ -0,0 +1,141 @@
+import hashlib
+import json
+from collections import OrderedDict
+from functools import lru_cache
+from threading import Lock
+
+import numpy as np
+import torch
+from transformers import AutoTokenizer
+
+from utils.rules import load_rules
+from utils.runtime import (
+    MAX_LENGTH,
+    inference_device,
+    length_order,
+    load_model,
+    padding_stats,
+    token_lengths,
+)
+from utils.settings import base_settings as settings
+
+
+def load_exemplars() -> dict[str, list[str]]:
+    """Return example descriptions per label for building centroids.
+
+    Uses CLASSIFIER_EXEMPLARS when set, otherwise the rule tier's keywords.
+    """
+    if settings.classifier_exemplars_path:
+        with open(settings.classifier_exemplars_path) as f:
+            return json.load(f)
+    return load_rules().get('keywords', {})
+
+
+def exemplars_digest() -> str:
+    """Short digest of the exemplars label centroids are built from.
+
+    Part of the embedding backend's model id, so classifications cached
+    under one set of exemplars are not served for another.
+    """
+    return _exemplars_digest(
+        settings.classifier_exemplars_path, settings.classifier_rules_path
+    )
+
+
+@lru_cache(maxsize=8)
+def _exemplars_digest(exemplars_path: str | None, rules_path: str | None) -> str:
+    text = json.dumps(load_exemplars(), sort_keys=True)
+    return hashlib.blake2b(text.encode(), digest_size=8).hexdigest()
+
+
+class EmbeddingClassifier:
+    """Nearest-centroid classifier over sentence embeddings.
+
+    Each description is encoded once (and cached), then compared against
+    precomputed label centroids with a single matrix product, so cost no
+    longer grows with the number of labels.
+    """
+
+    def __init__(self, model_id: str, device: torch.device):
+        self.model_id = model_id
+        self.device = inference_device(device)
+        self.tokenizer = AutoTokenizer.from_pretrained(model_id)
+        self.model = load_model(model_id, 'feature-extraction', self.device)
+        self._embeddings: OrderedDict[str, np.ndarray] = OrderedDict()
+        self._centroids: dict[tuple[str, ...], np.ndarray] = {}
+        self._lock = Lock()
+
+    def _encode(self, texts: list[str]) -> np.ndarray:
+        """Mean-pooled, L2-normalized embeddings for ``texts``.
+
+        Texts are encoded shortest-first in batches of CLASSIFIER_BATCH_SIZE so
+        little compute is spent on padding; rows come back in input order.
+        """
+        batch_size = settings.classifier_batch_size
+        lengths = token_lengths(
+            self.tokenizer, texts, truncation=True, max_length=MAX_LENGTH
+        )
+        order = length_order(lengths)
+        padding_stats.record(lengths[order], batch_size)
+
+        chunks = []
+        for start in range(0, len(texts), batch_size):
+            batch = self.tokenizer(
+                [texts[i] for i in order[start : start + batch_size]],
+                padding=True,
+                truncation=True,
+                max_length=MAX_LENGTH,
+                return_tensors='pt',
+            ).to(self.device)
+            with torch.inference_mode():
+                hidden = self.model(**batch).last_hidden_state
+            mask = batch['attention_mask'].unsqueeze(-1).to(hidden.dtype)
+            pooled = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1e-9)
+            chunks.append(pooled.float().cpu().numpy())
+        vectors = np.empty((len(texts), chunks[0].shape[1]), dtype=np.float32)
+        vectors[order] = np.concatenate(chunks)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    def embed(self, descriptions: list[str]) -> np.ndarray:
+        """Return embeddings, encoding only descriptions not already cached."""
+        with self._lock:
+            missing = [
+                d for d in dict.fromkeys(descriptions) if d not in self._embeddings
+            ]
+            if missing:
+                for description, vector in zip(missing, self._encode(missing)):
+                    self._embeddings[description] = vector
+            vectors = []
+            for description in descriptions:
+                self._embeddings.move_to_end(description)
+                vectors.append(self._embeddings[description])
+            # Evict after collecting so this call's vectors are never dropped
+            while len(self._embeddings) > settings.embedding_cache_size:
+                self._embeddings.popitem(last=False)
+        return np.stack(vectors)
+
+    def centroids(self, labels: list[str]) -> np.ndarray:
+        """Return one normalized centroid row per label, built once per label set."""
+        key = tuple(labels)
+        if key not in self._centroids:
+            exemplars = load_exemplars()
+            texts, owners = [], []
+            for index, label in enumerate(labels):
+                for text in [label, *exemplars.get(label, [])]:
+                    texts.append(text)
+                    owners.append(index)
+            vectors = self._encode(texts)
+            sums = np.zeros((len(labels), vectors.shape[1]), dtype=vectors.dtype)
+            np.add.at(sums, np.asarray(owners), vectors)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            self._centroids[key] = sums / np.maximum(norms, 1e-12)
+        return self._centroids[key]
+
+    def predict(
+        self, descriptions: list[str], labels: list[str]
+    ) -> list[tuple[str, float]]:
+        similarities = self.embed(descriptions) @ self.centroids(labels).T
+        best = similarities.argmax(axis=1)
+        scores = similarities[np.arange(len(descriptions)), best]
+        return [(labels[i], float(score)) for i, score in zip(best, scores)]
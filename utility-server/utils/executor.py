@@ -0,0 +1,93 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable
+
+from utils.settings import base_settings as settings
+
+EXECUTORS = ('thread', 'process')
+
+
+class StageExecutor:
+    """Run CPU-bound analysis stages on a worker pool, off the event loop.
+
+    ``kind`` is ``'thread'`` (NumPy, pandas and scikit-learn release the GIL
+    for most of their work, and inputs are shared without copying) or
+    ``'process'`` (full isolation, at the cost of pickling each stage's
+    inputs). Process workers are spawned, never forked, because the server
+    already runs inference threads.
+    """
+
+    def __init__(self, kind: str = 'thread', max_workers: int = 0):
+        if kind not in EXECUTORS:
+            raise ValueError(f'Unknown ANALYSIS_EXECUTOR: {kind}')
+        self.kind = kind
+        self.max_workers = max_workers or None
+        self._executor: Executor | None = None
+        self.active = 0
+        self.completed = 0
+        self.failed = 0
+
+    @property
+    def running(self) -> bool:
+        return self._executor is not None
+
+    async def start(self) -> None:
+        """Create the worker pool."""
+        if self.running:
+            return
+        if self.kind == 'process':
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+        else:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix='analysis'
+            )
+        settings.logger.info(
+            f'Stage executor started ({self.kind}, '
+            f'{self._executor._max_workers} workers)'
+        )
+
+    async def stop(self) -> None:
+        """Shut the pool down, dropping stages that have not started yet."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def run(self, stage: Callable[..., Any], *args) -> Any:
+        """Run ``stage(*args)`` on the pool and await its result.
+
+        Falls back to a plain thread when the pool has not been started, so
+        library callers and tests work without the app lifecycle.
+        """
+        if not self.running:
+            return await asyncio.to_thread(stage, *args)
+
+        loop = asyncio.get_running_loop()
+        self.active += 1
+        try:
+            result = await loop.run_in_executor(self._executor, stage, *args)
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.active -= 1
+        self.completed += 1
+        return result
+
+    def stats(self) -> dict:
+        return {
+            'kind': self.kind,
+            'running': self.running,
+            'workers': self._executor._max_workers if self._executor else 0,
+            'active': self.active,
+            'completed': self.completed,
+            'failed': self.failed,
+        }
+
+
+stage_executor = StageExecutor(
+    settings.analysis_executor, max_workers=settings.analysis_workers
+)
@@ -0,0 +1,178 @@
+from dataclasses import dataclass
+
+import numpy as np
+
+# Projection horizons, in months after the last month of history
+HORIZONS = {'1_month': 1, '3_months': 3, '6_months': 6}
+# Two-sided standard normal quantile of the 95% projection intervals
+INTERVAL_Z = 1.959963984540054
+# Candidate models: leading design columns used and months of history needed
+MODELS = {'mean': (1, 1), 'linear': (2, 4), 'seasonal': (6, 12)}
+
+
+def design(months: np.ndarray, center: int) -> np.ndarray:
+    """Design rows for ``datetime64[M]`` months: intercept, trend, seasonality.
+
+    The trend is in years from grid index ``center``; monthly seasonality
+    is the first two harmonics of the month of the year, so a seasonal fit
+    needs six coefficients rather than twelve dummies.
+    """
+    years = (np.arange(len(months)) - center) / 12
+    angle = 2 * np.pi * (months.astype(np.int64) % 12) / 12
+    return np.column_stack(
+        [
+            np.ones(len(months)),
+            years,
+            np.sin(angle),
+            np.cos(angle),
+            np.sin(2 * angle),
+            np.cos(2 * angle),
+        ]
+    )
+
+
+@dataclass
+class Forecasts:
+    """Projected totals per series, as returned by ``forecast_series``."""
+
+    model: np.ndarray
+    observed: np.ndarray
+    last_month: np.ndarray
+    expected: np.ndarray
+    lower: np.ndarray
+    upper: np.ndarray
+
+    def describe(self, series: int) -> dict | None:
+        """Chosen model and 1/3/6-month projected totals with 95% intervals."""
+        if self.model[series] < 0:
+            return None
+        last = self.last_month[series]
+        projections = {}
+        for index, (name, months) in enumerate(HORIZONS.items()):
+            projections[name] = {
+                'through': str(last + months),
+                'expected': float(self.expected[series, index]),
+                'lower': float(self.lower[series, index]),
+                'upper': float(self.upper[series, index]),
+            }
+        return {
+            'model': list(MODELS)[self.model[series]],
+            'months_observed': int(self.observed[series]),
+            'last_month': str(last),
+            'projections': projections,
+        }
+
+
+def forecast_series(
+    series: np.ndarray, first: np.ndarray, last: np.ndarray, start: np.datetime64
+) -> Forecasts:
+    """Fit and project every row of ``series`` in one batched pass.
+
+    ``series`` holds monthly totals on a calendar grid that begins at the
+    ``start`` month; row ``s`` has history over grid months ``first[s]``
+    through ``last[s]`` and months without activity count as zero. Each
+    candidate model is fitted by weighted least squares over all rows at
+    once: the per-row normal equations are one matrix product with the
+    history masks, solved with a batched inverse. Each row keeps the
+    eligible model with the lowest AIC, and projections are the sums of
+    the next 1/3/6 months, with intervals from the residual variance and
+    the coefficient covariance. Rows without history get model -1.
+    """
+    rows, size = series.shape
+    horizons = np.array(list(HORIZONS.values()))
+    grid = design(start + np.arange(size + horizons.max()), size - 1)
+    weights = (np.arange(size) >= first[:, None]) & (np.arange(size) <= last[:, None])
+    weights = weights.astype(np.float64)
+    observed = weights.sum(axis=1)
+    values = series * weights
+    # Perfect fits would score -inf; a relative floor lets the penalty decide
+    floor = 1e-12 * ((values**2).sum(axis=1) / np.maximum(observed, 1) + 1)
+    # Design rows summed over the next 1..n months of every row
+    future = np.cumsum(grid[last[:, None] + np.arange(1, horizons.max() + 1)], axis=1)
+    future = future[:, horizons - 1]
+
+    model = np.full(rows, -1)
+    score = np.full(rows, np.inf)
+    expected = np.zeros((rows, len(horizons)))
+    spread = np.zeros((rows, len(horizons)))
+    for index, (columns, minimum) in enumerate(MODELS.values()):
+        X = grid[:size, :columns]
+        gram = weights @ (X[:, :, None] * X[:, None, :]).reshape(size, -1)
+        gram = gram.reshape(rows, columns, columns)
+        # A negligible ridge keeps rows too short for the model invertible
+        scale = np.trace(gram, axis1=1, axis2=2) / columns + 1
+        inverse = np.linalg.inv(gram + 1e-12 * scale[:, None, None] * np.eye(columns))
+        coefficients = np.einsum('spq,sq->sp', inverse, values @ X)
+        sse = (((series - coefficients @ X.T) * weights) ** 2).sum(axis=1)
+        variance = sse / np.maximum(observed - columns, 1)
+        aic = observed * np.log(sse / np.maximum(observed, 1) + floor) + 2 * columns
+
+        better = (observed >= minimum) & (aic < score)
+        ahead = future[:, :, :columns]
+        model[better] = index
+        score[better] = aic[better]
+        expected[better] = np.einsum('shp,sp->sh', ahead, coefficients)[better]
+        spread[better] = (
+            INTERVAL_Z
+            * np.sqrt(
+                variance[:, None]
+                * (horizons + np.einsum('shp,spq,shq->sh', ahead, inverse, ahead))
+            )
+        )[better]
+
+    # Spending is never negative
+    return Forecasts(
+        model=model,
+        observed=observed.astype(np.int64),
+        last_month=start + last,
+        expected=np.maximum(expected, 0),
+        lower=np.maximum(expected - spread, 0),
+        upper=np.maximum(expected + spread, 0),
+    )
+
+
+def monthly_forecast(months: np.ndarray, expense: np.ndarray) -> dict | None:
+    """``Forecasts.describe`` of one series of absolute monthly expenses.
+
+    ``months`` are its ascending, possibly sparse ``datetime64[M]`` months;
+    the history runs from the first through the last of them.
+    """
+    if not len(months):
+        return None
+    offsets = (months - months[0]).astype(np.intp)
+    series = np.zeros((1, int(offsets[-1]) + 1))
+    series[0, offsets] = expense
+    return forecast_series(
+        series, np.zeros(1, np.intp), offsets[-1:], months[0]
+    ).describe(0)
+
+
+def category_forecasts(
+    dates: np.ndarray,
+    amounts: np.ndarray,
+    category_codes: np.ndarray,
+    n_labels: int,
+    n_groups: int,
+) -> Forecasts:
+    """Expense forecasts for every (group, category) of a batch in one call.
+
+    ``category_codes`` are ``group * n_labels + label`` per row. A series'
+    history starts at its first expense and ends at its group's last month,
+    so categories a group stopped spending on project towards zero.
+    """
+    first_month = dates.min().astype('datetime64[M]')
+    offsets = (dates.astype('datetime64[M]') - first_month).astype(np.intp)
+    size = int(offsets.max()) + 1
+    group_last = np.full(n_groups, -1)
+    np.maximum.at(group_last, category_codes // n_labels, offsets)
+
+    expenses = amounts < 0
+    codes, offsets = category_codes[expenses], offsets[expenses]
+    n_series = n_groups * n_labels
+    series = np.bincount(
+        codes * size + offsets, weights=-amounts[expenses], minlength=n_series * size
+    ).reshape(n_series, size)
+    first = np.full(n_series, size)
+    np.minimum.at(first, codes, offsets)
+    last = np.repeat(np.maximum(group_last, 0), n_labels)
+    return forecast_series(series, first, last, first_month)
@@ -0,0 +1,227 @@
+import json
+from importlib.util import find_spec
+
+import pandas as pd
+
+JSON = 'application/json'
+NDJSON = 'application/x-ndjson'
+MSGPACK = 'application/msgpack'
+ARROW_STREAM = 'application/vnd.apache.arrow.stream'
+ARROW_FILE = 'application/vnd.apache.arrow.file'
+PARQUET = 'application/vnd.apache.parquet'
+
+# Alternative spellings clients send for the same formats
+ALIASES = {
+    'application/x-msgpack': MSGPACK,
+    'application/vnd.msgpack': MSGPACK,
+    'application/x-parquet': PARQUET,
+}
+# Binary table formats accepted as input, and the package each one needs
+TABLE_FORMATS = {ARROW_STREAM: 'pyarrow', ARROW_FILE: 'pyarrow', PARQUET: 'pyarrow'}
+# Result encodings offered to clients, in server preference order
+RESULT_FORMATS = {JSON: None, MSGPACK: 'msgpack', ARROW_STREAM: 'pyarrow'}
+# Short names for the WebSocket ``format`` query parameter
+FORMAT_NAMES = {'json': JSON, 'msgpack': MSGPACK, 'arrow': ARROW_STREAM}
+# Buffer compression for Arrow results; readers decompress transparently
+ARROW_COMPRESSION = 'zstd'
+
+
+class UnsupportedMediaType(ValueError):
+    """A request body is in a format the server cannot read."""
+
+
+def canonical(media_type: str) -> str:
+    media_type = media_type.split(';')[0].strip().lower()
+    return ALIASES.get(media_type, media_type)
+
+
+def available(media_type: str) -> bool:
+    """True if the optional package behind ``media_type`` is installed."""
+    package = {**TABLE_FORMATS, **RESULT_FORMATS}.get(canonical(media_type))
+    return package is None or find_spec(package) is not None
+
+
+def is_table(media_type: str) -> bool:
+    return canonical(media_type) in TABLE_FORMATS
+
+
+def sniff_table(body: bytes) -> str:
+    """Identify an Arrow IPC stream/file or Parquet body from its magic bytes."""
+    if body[:4] == b'PAR1':
+        return PARQUET
+    if body[:6] == b'ARROW1':
+        return ARROW_FILE
+    if body[:4] == b'\xff\xff\xff\xff':
+        return ARROW_STREAM
+    raise UnsupportedMediaType('Binary data is not an Arrow IPC or Parquet table')
+
+
+def read_table(body: bytes, media_type: str) -> tuple[pd.DataFrame, dict]:
+    """Read an Arrow IPC or Parquet table into a DataFrame plus schema metadata.
+
+    Buffers are wrapped, not copied, and numeric columns without nulls are
+    converted without copying, so amounts and balances reach the analysis
+    stages as views of the request body.
+    """
+    media_type = canonical(media_type)
+    if media_type not in TABLE_FORMATS:
+        raise UnsupportedMediaType(f'Unsupported table format: {media_type}')
+    if not available(media_type):
+        raise UnsupportedMediaType(f'{media_type} input requires: pip install pyarrow')
+    import pyarrow as pa
+
+    buffer = pa.py_buffer(body)
+    try:
+        if media_type == PARQUET:
+            import pyarrow.parquet as pq
+
+            table = pq.read_table(pa.BufferReader(buffer))
+        elif media_type == ARROW_FILE:
+            table = pa.ipc.open_file(buffer).read_all()
+        else:
+            table = pa.ipc.open_stream(buffer).read_all()
+    except pa.ArrowException as e:
+        raise UnsupportedMediaType(f'Unreadable {media_type} body: {e}') from e
+
+    metadata = {
+        key.decode(): value.decode()
+        for key, value in (table.schema.metadata or {}).items()
+        if not key.startswith(b'pandas')
+    }
+    frame = table.combine_chunks().to_pandas(split_blocks=True, self_destruct=True)
+    return frame, metadata
+
+
+def negotiate(accept: str | None) -> str:
+    """Pick the result encoding for an ``Accept`` header; JSON by default.
+
+    Honours q-values; formats whose optional package is missing are skipped.
+    """
+    offers = []
+    for position, part in enumerate((accept or '').split(',')):
+        media_type, *params = part.split(';')
+        quality = 1.0
+        for param in params:
+            name, _, value = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        offers.append((-quality, position, canonical(media_type)))
+
+    for quality, _, media_type in sorted(offers):
+        if quality == 0:
+            break
+        if media_type in RESULT_FORMATS and available(media_type):
+            return media_type
+        if media_type in ('*/*', 'application/*'):
+            return JSON
+    return JSON
+
+
+def arrow_table(result: dict):
+    """A one-row Arrow table of a result dict with a key-independent schema.
+
+    Dicts whose values share one type (daily amounts, category totals,
+    per-merchant details) become ``map<string, ...>`` columns, so dates and
+    category names are data rather than fields; other dicts become structs.
+    List items that cannot share one type are stored as JSON text.
+    """
+    import pyarrow as pa
+
+    def unify(left, right):
+        """The type holding values of both types, or None if there is none."""
+        if left is None or right is None:
+            return None
+        if left == right or pa.types.is_null(right):
+            return left
+        if pa.types.is_null(left):
+            return right
+        if {left, right} == {pa.int64(), pa.float64()}:
+            return pa.float64()
+        if pa.types.is_struct(left) and pa.types.is_struct(right):
+            fields = {field.name: field.type for field in left}
+            for field in right:
+                fields[field.name] = unify(
+                    fields.get(field.name, pa.null()), field.type
+                )
+            return None if None in fields.values() else pa.struct(fields)
+        if pa.types.is_map(left) and pa.types.is_map(right):
+            item = unify(left.item_type, right.item_type)
+            return None if item is None else pa.map_(pa.string(), item)
+        if pa.types.is_list(left) and pa.types.is_list(right):
+            item = unify(left.value_type, right.value_type)
+            return None if item is None else pa.list_(item)
+        return None
+
+    def common(values):
+        shared = pa.null()
+        for value in values:
+            shared = unify(shared, infer(value))
+        return shared
+
+    def infer(value):
+        if value is None:
+            return pa.null()
+        if isinstance(value, bool):
+            return pa.bool_()
+        if isinstance(value, int):
+            return pa.int64()
+        if isinstance(value, float):
+            return pa.float64()
+        if isinstance(value, str):
+            return pa.string()
+        if isinstance(value, dict):
+            shared = common(value.values())
+            if shared is not None:
+                return pa.map_(pa.string(), shared)
+            return pa.struct({key: infer(item) for key, item in value.items()})
+        if isinstance(value, (list, tuple)):
+            shared = common(value)
+            return pa.list_(pa.string() if shared is None else shared)
+        return pa.string()
+
+    def convert(value, type_):
+        if value is None:
+            return None
+        if pa.types.is_string(type_):
+            return value if isinstance(value, str) else json.dumps(value)
+        if pa.types.is_struct(type_):
+            return {
+                field.name: convert(value.get(field.name), field.type)
+                for field in type_
+            }
+        if pa.types.is_map(type_):
+            return [
+                (key, convert(item, type_.item_type)) for key, item in value.items()
+            ]
+        if pa.types.is_list(type_):
+            return [convert(item, type_.value_type) for item in value]
+        return value
+
+    schema = pa.schema({key: infer(value) for key, value in result.items()})
+    row = {field.name: convert(result[field.name], field.type) for field in schema}
+    return pa.Table.from_pylist([row], schema=schema)
+
+
+def encode(result: dict, media_type: str) -> bytes:
+    """Serialize a result dict as JSON, MessagePack or a one-row Arrow IPC stream."""
+    media_type = canonical(media_type)
+    if media_type == MSGPACK:
+        import msgpack
+
+        return msgpack.packb(result, use_bin_type=True)
+    if media_type == ARROW_STREAM:
+        import pyarrow as pa
+
+        table = arrow_table(result)
+        compression = ARROW_COMPRESSION
+        if not pa.Codec.is_available(compression):
+            compression = None
+        options = pa.ipc.IpcWriteOptions(compression=compression)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema, options=options) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+    return json.dumps(result).encode('utf-8')
@@ -0,0 +1,299 @@
+import asyncio
+import hashlib
+import json
+from itertools import repeat
+from typing import AsyncIterable
+
+import numpy as np
+import pandas as pd
+
+from models.base import TransactionBatch
+from utils.formats import read_table
+from utils.settings import base_settings as settings
+
+FIELDS = (
+    '_id',
+    'amount',
+    'balance',
+    'createdAt',
+    'date',
+    'description',
+    'type',
+    'updatedAt',
+    'userId',
+)
+REQUIRED_FIELDS = ('date', 'description', 'amount', 'balance', 'type', 'userId')
+# Longest accepted NDJSON line; one transaction is a few hundred bytes
+MAX_LINE_BYTES = 1 << 20
+# A time of day, then ``Z`` or a UTC offset, ending an ISO-8601 timestamp
+TIME_OF_DAY = r'\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?'
+TIMEZONE = r'(?:Z|[+-]\d{2}(?::?\d{2})?)$'
+TIMEZONE_SUFFIX = TIME_OF_DAY + TIMEZONE
+# ``Z`` or a zero offset
+UTC_SUFFIX = TIME_OF_DAY + r'(?:Z|[+-]00(?::?00)?)$'
+
+
+class PayloadTooLarge(ValueError):
+    """A streamed request body exceeds the configured size limits."""
+
+
+def parse_datetimes(values: pd.Series, utc: bool = False) -> np.ndarray:
+    """Parse ISO-8601 strings to naive ``datetime64[ns]``; bad values become NaT.
+
+    Timestamps keep their local wall-clock time and the offset is dropped,
+    so ``2024-01-31T23:30:00-05:00`` falls on January 31st as the client
+    saw it. With ``utc``, offsets are converted to UTC first, and that
+    timestamp falls on February 1st. Columns that are already timestamps
+    (Arrow/Parquet input) are handled the same way.
+    """
+    if pd.api.types.is_datetime64_any_dtype(values):
+        if values.dt.tz is not None:
+            if utc:
+                values = values.dt.tz_convert('UTC')
+            values = values.dt.tz_localize(None)
+        return values.to_numpy(dtype='datetime64[ns]')
+    if not pd.api.types.is_string_dtype(values):
+        # Numbers would otherwise be read as epoch offsets
+        raw = values.to_numpy(dtype=object)
+        values = values.where(
+            np.fromiter(map(isinstance, raw, repeat(str)), dtype=bool, count=len(raw))
+        )
+    if values.isna().all():
+        return np.full(len(values), np.datetime64('NaT', 'ns'))
+    if not utc:
+        # Naive and UTC values read the same either way; other offsets are cut
+        _, offsets = zone_rows(values)
+        if len(offsets):
+            values = values.copy()
+            values.iloc[offsets] = (
+                values.iloc[offsets]
+                .str.replace(f'({TIME_OF_DAY}){TIMEZONE}', r'\1', regex=True)
+                .to_numpy()
+            )
+    parsed = pd.to_datetime(values, format='ISO8601', utc=True, errors='coerce')
+    return parsed.dt.tz_localize(None).to_numpy(dtype='datetime64[ns]')
+
+
+def zone_rows(values: pd.Series) -> tuple[bool, np.ndarray]:
+    """Whether any string has a timezone, and positions of non-UTC offsets.
+
+    Most payloads end every timestamp in ``Z``, so only the other strings
+    are matched against the timezone patterns.
+    """
+    ends_in_z = values.str.endswith('Z', na=False).to_numpy(dtype=bool)
+    others = np.flatnonzero(~ends_in_z)
+    if not len(others):
+        return bool(len(values)), others
+    candidates = values.iloc[others]
+    zoned = candidates.str.contains(TIMEZONE_SUFFIX, na=False).to_numpy(dtype=bool)
+    utc = candidates.str.contains(UTC_SUFFIX, na=False).to_numpy(dtype=bool)
+    return bool(ends_in_z.any() or zoned.any()), others[zoned & ~utc]
+
+
+def parse_numbers(values: pd.Series) -> np.ndarray:
+    """Parse numbers or numeric strings to float64; anything else becomes NaN.
+
+    Float columns (Arrow/Parquet input) are returned as-is, without a copy.
+    """
+    if values.dtype == np.float64:
+        return values.to_numpy()
+    return pd.to_numeric(values, errors='coerce').to_numpy(dtype=np.float64)
+
+
+def ingest_frame(
+    frame: pd.DataFrame, offset: int = 0
+) -> tuple[TransactionBatch | None, list[dict]]:
+    """Validate and convert a frame of raw transaction fields in one vectorized pass.
+
+    Returns the batch of valid rows (``None`` if there are none) and a
+    rejection report of ``{'index', 'reason'}`` for every dropped row, where
+    ``index`` is the row's position in the payload (shifted by ``offset``).
+    """
+    frame = frame.reindex(columns=FIELDS)
+    missing = frame[list(REQUIRED_FIELDS)].isna().to_numpy()
+    amount = parse_numbers(frame['amount'])
+    balance = parse_numbers(frame['balance'])
+    utc = settings.date_buckets == 'utc'
+    date = parse_datetimes(frame['date'], utc)
+
+    bad_amount = ~np.isfinite(amount)
+    bad_balance = ~np.isfinite(balance)
+    bad_date = np.isnat(date)
+    has_missing = missing.any(axis=1)
+    valid = ~(has_missing | bad_amount | bad_balance | bad_date)
+
+    rejected = []
+    for index in np.flatnonzero(~valid):
+        if has_missing[index]:
+            fields = [f for f, m in zip(REQUIRED_FIELDS, missing[index]) if m]
+            reason = f'Missing required fields: {", ".join(fields)}'
+        elif bad_amount[index]:
+            reason = 'Invalid amount'
+        elif bad_balance[index]:
+            reason = 'Invalid balance'
+        else:
+            reason = 'Invalid date'
+        rejected.append({'index': int(index) + offset, 'reason': reason})
+
+    if not valid.any():
+        return None, rejected
+
+    if rejected:
+        frame = frame[valid]
+        amount, balance, date = amount[valid], balance[valid], date[valid]
+    batch = TransactionBatch(
+        # Copy: a view would pin the frame's whole object block (every raw field)
+        _id=frame['_id'].to_numpy(dtype=object, copy=True),
+        amount=amount,
+        balance=balance,
+        createdAt=parse_datetimes(frame['createdAt'], utc),
+        date=date,
+        description=(
+            frame['description'].astype(str).to_numpy(dtype=object, copy=True)
+        ),
+        type=pd.Categorical(frame['type']),
+        updatedAt=parse_datetimes(frame['updatedAt'], utc),
+        userId=pd.Categorical(frame['userId'].astype(str)),
+        tz_aware=dates_have_timezone(frame['date'], utc),
+    )
+    return batch, rejected
+
+
+def dates_have_timezone(dates: pd.Series, utc: bool = False) -> bool:
+    """Whether parsed dates are UTC instants, to be rendered with ``+00:00``.
+
+    True when any source date carried a timezone and, unless ``utc``
+    converted them all, every timezone was UTC itself: local times from
+    other offsets are rendered without one.
+    """
+    if pd.api.types.is_datetime64_any_dtype(dates):
+        if dates.dt.tz is None:
+            return False
+        local = dates.dt.tz_localize(None)
+        return utc or bool(
+            (local == dates.dt.tz_convert('UTC').dt.tz_localize(None)).all()
+        )
+    if dates.isna().all() or not (
+        pd.api.types.is_string_dtype(dates) or dates.dtype == object
+    ):
+        return False
+    zoned, offsets = zone_rows(dates)
+    return zoned and (utc or not len(offsets))
+
+
+def ingest_table(
+    body: bytes, media_type: str
+) -> tuple[TransactionBatch | None, list[dict], dict]:
+    """Ingest an Arrow IPC or Parquet table of transactions.
+
+    Also returns the table's schema metadata (e.g. a WebSocket ``action``).
+    Raises ``UnsupportedMediaType`` if the format cannot be read here.
+    """
+    frame, metadata = read_table(body, media_type)
+    batch, rejected = ingest_frame(frame)
+    return batch, rejected, metadata
+
+
+def ingest_transactions(
+    transactions: list, offset: int = 0
+) -> tuple[TransactionBatch | None, list[dict]]:
+    """Validate and convert a JSON list of transactions into a TransactionBatch.
+
+    Non-object entries are rejected; see ``ingest_frame`` for the rest.
+    """
+    is_object = [isinstance(t, dict) for t in transactions]
+    frame = pd.DataFrame.from_records(
+        [t if ok else {} for t, ok in zip(transactions, is_object)],
+        columns=FIELDS,
+    )
+    batch, rejected = ingest_frame(frame, offset)
+    for entry in rejected:
+        if not is_object[entry['index'] - offset]:
+            entry['reason'] = 'Transaction is not an object'
+    return batch, rejected
+
+
+class BatchBuilder:
+    """Build one TransactionBatch from records that arrive in chunks.
+
+    Each chunk is validated and converted to columns as soon as it is added,
+    so only the columnar data (plus one chunk of raw records) is ever held.
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.rejected: list[dict] = []
+        self._batches: list[TransactionBatch] = []
+
+    def add(self, records: list) -> None:
+        """Ingest the next chunk of records, numbering rows after earlier ones."""
+        batch, rejected = ingest_transactions(records, offset=self.rows)
+        if batch is not None:
+            self._batches.append(batch)
+        self.rejected.extend(rejected)
+        self.rows += len(records)
+
+    def add_lines(self, lines: list[bytes]) -> None:
+        """Ingest NDJSON lines; lines that are not valid JSON are rejected."""
+        records = []
+        invalid = []
+        for position, line in enumerate(lines):
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                records.append(None)
+                invalid.append(self.rows + position)
+        start = len(self.rejected)
+        self.add(records)
+        if invalid:
+            invalid = set(invalid)
+            for entry in self.rejected[start:]:
+                if entry['index'] in invalid:
+                    entry['reason'] = 'Invalid JSON'
+
+    def build(self) -> tuple[TransactionBatch | None, list[dict]]:
+        batches, self._batches = self._batches, []
+        batch = TransactionBatch.concat(batches) if batches else None
+        return batch, self.rejected
+
+
+async def ingest_ndjson(
+    chunks: AsyncIterable[bytes],
+    rows_per_chunk: int = 10_000,
+    max_bytes: int | None = None,
+    max_line_bytes: int = MAX_LINE_BYTES,
+) -> tuple[TransactionBatch | None, list[dict], str]:
+    """Incrementally ingest an NDJSON byte stream (one transaction per line).
+
+    Lines are parsed and validated ``rows_per_chunk`` at a time off the event
+    loop while the rest of the body is still arriving. Blank lines are
+    skipped. Also returns a SHA-256 of the raw stream, which stands in for
+    the payload when keying cached results.
+
+    Raises PayloadTooLarge as soon as the stream passes ``max_bytes`` or a
+    line passes ``max_line_bytes``, so neither can grow without bound.
+    """
+    builder = BatchBuilder()
+    digest = hashlib.sha256()
+    pending: list[bytes] = []
+    remainder = b''
+    received = 0
+    async for chunk in chunks:
+        received += len(chunk)
+        if max_bytes is not None and received > max_bytes:
+            raise PayloadTooLarge(f'Request body exceeds {max_bytes} bytes')
+        digest.update(chunk)
+        lines = (remainder + chunk).split(b'\n')
+        remainder = lines.pop()
+        if max(map(len, [remainder, *lines])) > max_line_bytes:
+            raise PayloadTooLarge(f'NDJSON line exceeds {max_line_bytes} bytes')
+        pending.extend(line for line in lines if line.strip())
+        if len(pending) >= rows_per_chunk:
+            await asyncio.to_thread(builder.add_lines, pending)
+            pending = []
+    if remainder.strip():
+        pending.append(remainder)
+    if pending:
+        await asyncio.to_thread(builder.add_lines, pending)
+    batch, rejected = await asyncio.to_thread(builder.build)
+    return batch, rejected, digest.hexdigest()
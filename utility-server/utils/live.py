@@ -0,0 +1,347 @@
+import asyncio
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from utils.analyzer import classify_merchants
+from utils.classifier import get_labels
+from utils.forecast import monthly_forecast
+from utils.ingest import ingest_transactions
+from utils.merchants import normalize_merchant
+
+# Nanoseconds per day, the unit of the trend regression's x axis
+DAY_NS = 86_400 * 10**9
+
+
+def changed(before: dict, after: dict) -> dict:
+    """The entries of ``after`` that differ from ``before``, recursing into dicts.
+
+    Keys that disappeared map to None.
+    """
+    changes = {}
+    for key in before.keys() | after.keys():
+        old, new = before.get(key), after.get(key)
+        if isinstance(old, dict) and isinstance(new, dict):
+            if nested := changed(old, new):
+                changes[key] = nested
+        elif old != new:
+            changes[key] = new
+    return changes
+
+
+class LiveRow(NamedTuple):
+    """What a live session keeps per transaction to undo its contributions."""
+
+    seq: int
+    amount: float
+    balance: float
+    date: int
+    day: str
+    month: str
+    merchant: str
+
+
+class LiveAnalytics:
+    """Analytics for one live session, updated in O(delta) per change.
+
+    Totals, daily net totals and closing balances, monthly income and
+    expenses, the trend regression's sufficient statistics and category
+    totals are kept as running sums, so appending, editing or deleting a
+    transaction only touches the aggregates it contributes to. ``apply``
+    returns just the parts of the result that changed; ``snapshot`` renders
+    the whole result.
+    """
+
+    def __init__(self, labels: list[str] | None = None):
+        self.labels = labels or get_labels()
+        self.rows: dict[str, LiveRow] = {}
+        self._next_seq = 0
+        # Origin of the trend regression's x axis: the first transaction's date
+        self.anchor: int | None = None
+        self.income = 0.0
+        self.income_count = 0
+        self.spent = 0.0
+        self.expense_count = 0
+        # day -> [net total, ids]; day -> balance after its last transaction
+        self.daily: dict[str, list] = {}
+        self.closing: dict[str, float] = {}
+        # month -> [income, expenses, income count, expense count, rows]
+        self.monthly: dict[str, list] = {}
+        # n, sum x, sum y, sum x^2, sum xy over (days since anchor, amount)
+        self.regression = [0, 0.0, 0.0, 0.0, 0.0]
+        self.merchant_labels: dict[str, str] = {}
+        self.categories = dict.fromkeys(self.labels, 0.0)
+        # Refitted only when a delta changes some month's expenses
+        self._forecast: dict | None = None
+        self._forecast_stale = True
+        # The summary parts as of the last delta, diffed against the next one
+        self._parts = self._summary_parts()
+
+    async def apply(
+        self,
+        append: list | None = None,
+        edit: list | None = None,
+        delete: list | None = None,
+    ) -> tuple[dict, list[dict]]:
+        """Apply a delta and return ``(changed parts, rejected)``.
+
+        ``append`` adds new transactions, ``edit`` replaces transactions by
+        ``_id`` and ``delete`` is a list of ids. Rejections carry the
+        ``delta`` list and ``index`` they refer to.
+        """
+        rejected = []
+        removals = []
+        # Each id may appear once per delta, across delete, edit and append
+        seen = set()
+        for index, _id in enumerate(delete or []):
+            _id = str(_id)
+            if _id in seen:
+                reason = 'Duplicate _id'
+            elif _id not in self.rows:
+                reason = 'Unknown _id'
+            else:
+                removals.append(_id)
+                seen.add(_id)
+                continue
+            rejected.append({'delta': 'delete', 'index': index, 'reason': reason})
+
+        additions = []
+        for name, transactions in (('edit', edit), ('append', append)):
+            rows, reasons = await asyncio.to_thread(self._rows, transactions or [])
+            rejected.extend({'delta': name, **reason} for reason in reasons)
+            for index, (_id, row) in rows:
+                if _id in seen or (name == 'append' and _id in self.rows):
+                    reason = 'Duplicate _id'
+                elif name == 'edit' and _id not in self.rows:
+                    reason = 'Unknown _id'
+                else:
+                    additions.append((_id, row))
+                    seen.add(_id)
+                    continue
+                rejected.append({'delta': name, 'index': index, 'reason': reason})
+
+        merchants = {row.merchant for _, row in additions}
+        unknown = [m for m in merchants if m not in self.merchant_labels]
+        if unknown:
+            predictions, _ = await classify_merchants(unknown, self.labels)
+            self.merchant_labels.update(
+                (merchant, predictions[merchant][0]) for merchant in unknown
+            )
+
+        changes = await asyncio.to_thread(self._apply, removals, additions)
+        return changes, rejected
+
+    def _rows(self, transactions: list) -> tuple[list, list[dict]]:
+        """Validate transactions into ``(index, (_id, LiveRow))`` pairs."""
+        if not transactions:
+            return [], []
+        batch, rejected = ingest_transactions(transactions)
+        if batch is None:
+            return [], rejected
+        refused = {reason['index'] for reason in rejected}
+        indices = [i for i in range(len(transactions)) if i not in refused]
+
+        dates = batch.date
+        timestamps = dates.view(np.int64).tolist()
+        days = np.datetime_as_string(dates, unit='D').tolist()
+        months = np.datetime_as_string(dates, unit='M').tolist()
+        rows = []
+        for position, index in enumerate(indices):
+            _id = batch._id[position]
+            if pd.isna(_id):
+                rejected.append({'index': index, 'reason': 'Missing _id'})
+                continue
+            row = LiveRow(
+                seq=-1,
+                amount=float(batch.amount[position]),
+                balance=float(batch.balance[position]),
+                date=timestamps[position],
+                day=days[position],
+                month=months[position],
+                merchant=normalize_merchant(batch.description[position]),
+            )
+            rows.append((index, (str(_id), row)))
+        rejected.sort(key=lambda reason: reason['index'])
+        return rows, rejected
+
+    def _apply(self, removals: list[str], additions: list[tuple[str, LiveRow]]) -> dict:
+        touched = {self.rows[_id].month for _id in removals}
+        for _id, row in additions:
+            touched.add(row.month)
+            if _id in self.rows:
+                touched.add(self.rows[_id].month)
+        expenses = {month: self._expenses(month) for month in touched}
+        days, months = set(), set()
+
+        for _id in removals:
+            self._remove(self.rows.pop(_id), _id, days, months)
+        for _id, row in additions:
+            previous = self.rows.get(_id)
+            if previous is not None:
+                # Edits keep their place among same-time transactions
+                self._remove(previous, _id, days, months)
+                row = row._replace(seq=previous.seq)
+            else:
+                row = row._replace(seq=self._next_seq)
+                self._next_seq += 1
+            if self.anchor is None:
+                self.anchor = row.date
+            self.rows[_id] = row
+            self._add(row, _id, days, months)
+
+        for day in days:
+            self._close_day(day)
+
+        if any(self._expenses(month) != expenses[month] for month in touched):
+            self._forecast_stale = True
+        before, self._parts = self._parts, self._summary_parts()
+        changes = changed(before, self._parts)
+        if days:
+            spending = changes.setdefault('spending_analysis', {})
+            spending['daily_summary'] = {
+                day: self.daily[day][0] if day in self.daily else None
+                for day in sorted(days)
+            }
+            spending['cumulative_balance'] = {
+                day: self.closing.get(day) for day in sorted(days)
+            }
+        if months:
+            changes['monthly_summary'] = {
+                month: self._month_summary(month) for month in sorted(months)
+            }
+        return changes
+
+    def _add(self, row: LiveRow, _id: str, days: set, months: set) -> None:
+        self._count(row, 1)
+        day = self.daily.setdefault(row.day, [0.0, set()])
+        day[0] += row.amount
+        day[1].add(_id)
+        days.add(row.day)
+        months.add(row.month)
+
+    def _remove(self, row: LiveRow, _id: str, days: set, months: set) -> None:
+        self._count(row, -1)
+        day = self.daily[row.day]
+        day[0] -= row.amount
+        day[1].discard(_id)
+        days.add(row.day)
+        months.add(row.month)
+
+    def _count(self, row: LiveRow, sign: int) -> None:
+        """Add (``sign=1``) or subtract (``-1``) a row's running-sum contributions."""
+        amount = row.amount
+        month = self.monthly.setdefault(row.month, [0.0, 0.0, 0, 0, 0])
+        month[4] += sign
+        if amount > 0:
+            self.income += sign * amount
+            self.income_count += sign
+            month[0] += sign * amount
+            month[2] += sign
+        elif amount < 0:
+            self.spent += sign * amount
+            self.expense_count += sign
+            month[1] -= sign * amount
+            month[3] += sign
+        if not month[4]:
+            del self.monthly[row.month]
+
+        x = (row.date - self.anchor) // DAY_NS
+        regression = self.regression
+        regression[0] += sign
+        regression[1] += sign * x
+        regression[2] += sign * amount
+        regression[3] += sign * x * x
+        regression[4] += sign * x * amount
+
+        label = self.merchant_labels[row.merchant]
+        self.categories[label] += sign * abs(amount)
+
+    def _close_day(self, day: str) -> None:
+        """Recompute a touched day's closing balance from its own transactions."""
+        net, ids = self.daily[day]
+        if not ids:
+            del self.daily[day]
+            self.closing.pop(day, None)
+            return
+        last = max((self.rows[_id] for _id in ids), key=lambda r: (r.date, r.seq))
+        self.closing[day] = last.balance
+
+    def _expenses(self, month: str) -> float | None:
+        """A month's expenses, or None if it has no transactions."""
+        entry = self.monthly.get(month)
+        return None if entry is None else entry[1]
+
+    def _month_summary(self, month: str) -> dict | None:
+        """The summary's monthly entry, or None once a month has no income or expense."""
+        entry = self.monthly.get(month)
+        if entry is None or not (entry[2] or entry[3]):
+            return None
+        income, expenses, income_count, expense_count, _ = entry
+        return {
+            'income': income,
+            'expenses': expenses,
+            'savings': income - expenses if income_count and expense_count else 0.0,
+        }
+
+    def _summary_parts(self) -> dict:
+        """The small result parts, compared before and after each delta."""
+        total = sum(self.categories.values())
+        return {
+            'total_transactions': len(self.rows),
+            'spending_analysis': {
+                'total_spent': abs(self.spent),
+                'total_income': self.income,
+                'savings_rate': (
+                    ((self.income + self.spent) / self.income) * 100
+                    if self.income
+                    else 0
+                ),
+            },
+            'spending_trends': self._trends(),
+            'categories': {
+                'categories': dict(self.categories),
+                'percentages': {
+                    label: (amount / total) * 100 if total > 0 else 0
+                    for label, amount in self.categories.items()
+                },
+            },
+        }
+
+    def _trends(self) -> dict:
+        """``predict_trends`` from the regression's sufficient statistics."""
+        n, sum_x, sum_y, sum_xx, sum_xy = self.regression
+        if n < 2:
+            return {'trend': 'Not enough data'}
+        denominator = n * sum_xx - sum_x * sum_x
+        slope = (n * sum_xy - sum_x * sum_y) / denominator if denominator else 0.0
+        if self._forecast_stale:
+            months = sorted(self.monthly)
+            self._forecast = monthly_forecast(
+                np.array(months, dtype='datetime64[M]'),
+                np.array([self.monthly[month][1] for month in months]),
+            )
+            self._forecast_stale = False
+        return {
+            'trend': 'increasing' if slope > 0 else 'decreasing',
+            'trend_slope': float(slope),
+            'estimated_monthly_spend': abs(self.spent) / (len(self.monthly) or 1),
+            'forecast': self._forecast,
+        }
+
+    def snapshot(self) -> dict:
+        """The complete live result."""
+        result = self._summary_parts()
+        days = sorted(self.daily)
+        result['spending_analysis']['daily_summary'] = {
+            day: self.daily[day][0] for day in days
+        }
+        result['spending_analysis']['cumulative_balance'] = {
+            day: self.closing[day] for day in days
+        }
+        result['monthly_summary'] = {
+            month: summary
+            for month in sorted(self.monthly)
+            if (summary := self._month_summary(month)) is not None
+        }
+        return result
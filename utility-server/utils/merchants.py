@@ -0,0 +1,59 @@
+import re
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from utils.cache import normalize_description
+
+# Card-terminal and payment-rail prefixes that carry no merchant information
+_PREFIX = re.compile(
+    r'^(?:(?:pos|eftpos|visa|mastercard|mc|debit card|card|chk ?card|contactless|'
+    r'purchase|payment|direct debit|dd|so|ach|tfr|transfer|online|recurring)'
+    r'(?: purchase| payment| transaction)?\b[\s:*#-]*)+'
+)
+# ISO and day/month style dates, optionally followed by a time
+_DATE = re.compile(
+    r'\b(?:\d{4}-\d{2}-\d{2}|\d{1,2}[/.-]\d{1,2}(?:[/.-]\d{2,4})?)'
+    r'(?:[ t]\d{1,2}:\d{2}(?::\d{2})?)?\b'
+)
+# Masked card numbers and explicit reference markers
+_CARD = re.compile(r'(?:x{2,}|\*{2,})\d*|\bcard\s*\d+')
+_REFERENCE = re.compile(r'\b(?:ref|reference|auth|trace|txn|id)\b[\s:#.]*\S+')
+# Any remaining token that contains a digit (store numbers, terminal ids, ...)
+_DIGIT_TOKEN = re.compile(r'\S*\d\S*')
+_PUNCTUATION = re.compile(r'[^a-z& ]+')
+_WHITESPACE = re.compile(r'\s+')
+
+
+@lru_cache(maxsize=100_000)
+def normalize_merchant(description: str) -> str:
+    """Reduce a bank description to a canonical merchant key.
+
+    ``'POS 1234 TESCO STORES 05/11'`` and ``'POS 9981 TESCO STORES 06/11'``
+    both become ``'tesco stores'``. Falls back to the normalized description
+    when nothing recognisable is left.
+    """
+    text = normalize_description(description)
+    key = _DATE.sub(' ', text)
+    key = _CARD.sub(' ', key)
+    key = _REFERENCE.sub(' ', key)
+    key = _DIGIT_TOKEN.sub(' ', key)
+    key = _PUNCTUATION.sub(' ', key)
+    key = _WHITESPACE.sub(' ', key).strip()
+    key = _PREFIX.sub('', key).strip()
+    return key or text
+
+
+def group_by_merchant(descriptions) -> tuple[list[str], np.ndarray]:
+    """Return unique merchant keys and, per description, the index of its key.
+
+    Each distinct description is normalized once, however often it repeats.
+    """
+    description_codes, unique_descriptions = pd.factorize(
+        np.asarray(descriptions, dtype=object)
+    )
+    merchant_codes, merchants = pd.factorize(
+        np.array([normalize_merchant(d) for d in unique_descriptions], dtype=object)
+    )
+    return list(merchants), merchant_codes[description_codes]
@@ -0,0 +1,456 @@
+import asyncio
+import os
+from dataclasses import dataclass
+from functools import reduce
+from itertools import pairwise
+
+import numpy as np
+
+from models.base import TransactionBatch
+from utils.executor import stage_executor
+from utils.forecast import monthly_forecast
+from utils.settings import base_settings as settings
+
+DAY_NS = 86_400 * 10**9
+# Centroid budget of quantile sketches; about half as many centroids are kept
+COMPRESSION = 300
+QUANTILES = {'p50': 0.5, 'p90': 0.9, 'p99': 0.99}
+
+
+@dataclass
+class Moments:
+    """Count, sum, mean, squared deviations, min and max of values per key.
+
+    Shards merge with the parallel form of Welford's update (Chan et al.),
+    so variance stays accurate in any merge order.
+    """
+
+    count: np.ndarray
+    total: np.ndarray
+    mean: np.ndarray
+    m2: np.ndarray
+    minimum: np.ndarray
+    maximum: np.ndarray
+
+    @classmethod
+    def of(cls, values: np.ndarray, keys: np.ndarray, n_keys: int) -> 'Moments':
+        count = np.bincount(keys, minlength=n_keys)
+        total = np.bincount(keys, weights=values, minlength=n_keys)
+        mean = np.divide(total, count, out=np.zeros(n_keys), where=count > 0)
+        m2 = np.bincount(keys, weights=(values - mean[keys]) ** 2, minlength=n_keys)
+        minimum = np.full(n_keys, np.inf)
+        maximum = np.full(n_keys, -np.inf)
+        np.minimum.at(minimum, keys, values)
+        np.maximum.at(maximum, keys, values)
+        return cls(count, total, mean, m2, minimum, maximum)
+
+    def merge(self, other: 'Moments') -> 'Moments':
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        share = np.divide(other.count, count, out=np.zeros(len(count)), where=count > 0)
+        return Moments(
+            count=count,
+            total=self.total + other.total,
+            mean=self.mean + delta * share,
+            m2=self.m2 + other.m2 + delta**2 * self.count * share,
+            minimum=np.minimum(self.minimum, other.minimum),
+            maximum=np.maximum(self.maximum, other.maximum),
+        )
+
+    @property
+    def std(self) -> np.ndarray:
+        """Sample standard deviation per key (0 below two values)."""
+        return np.sqrt(
+            np.divide(
+                self.m2,
+                self.count - 1,
+                out=np.zeros(len(self.m2)),
+                where=self.count > 1,
+            )
+        )
+
+
+def compress(
+    means: np.ndarray, weights: np.ndarray, compression: int = COMPRESSION
+) -> tuple[np.ndarray, np.ndarray]:
+    """Merge mean-sorted weighted centroids into at most ``compression / 2 + 1``.
+
+    Centroids are bucketed by the arcsine scale of their quantile, whose
+    buckets are narrow near 0 and 1, so tail quantiles keep their
+    resolution while the middle is summarized coarsely.
+    """
+    cumulative = np.cumsum(weights)
+    quantiles = (cumulative - weights / 2) / cumulative[-1]
+    scale = compression / (2 * np.pi) * np.arcsin(2 * quantiles - 1)
+    buckets = np.floor(scale - scale[0]).astype(np.intp)
+    merged = np.bincount(buckets, weights=weights)
+    kept = merged > 0
+    centers = np.bincount(buckets, weights=weights * means)[kept] / merged[kept]
+    return centers, merged[kept]
+
+
+@dataclass
+class QuantileSketch:
+    """Mergeable quantile sketch in the style of a merging t-digest.
+
+    Holds O(``COMPRESSION``) weighted centroids however many values it has
+    seen, plus the exact minimum and maximum.
+    """
+
+    means: np.ndarray
+    weights: np.ndarray
+    minimum: float
+    maximum: float
+
+    @classmethod
+    def of(cls, sorted_values: np.ndarray) -> 'QuantileSketch':
+        means, weights = compress(sorted_values, np.ones(len(sorted_values)))
+        return cls(means, weights, float(sorted_values[0]), float(sorted_values[-1]))
+
+    def merge(self, other: 'QuantileSketch') -> 'QuantileSketch':
+        means = np.concatenate([self.means, other.means])
+        weights = np.concatenate([self.weights, other.weights])
+        order = np.argsort(means, kind='stable')
+        means, weights = compress(means[order], weights[order])
+        return QuantileSketch(
+            means,
+            weights,
+            min(self.minimum, other.minimum),
+            max(self.maximum, other.maximum),
+        )
+
+    def quantiles(self, qs: list[float]) -> list[float]:
+        """Interpolate between centroid centres, anchored at the exact extremes.
+
+        Targets are placed so that a sketch of single-value centroids gives
+        exactly ``np.quantile``'s linear interpolation.
+        """
+        cumulative = np.cumsum(self.weights)
+        total = cumulative[-1]
+        positions = np.concatenate([[0.0], cumulative - self.weights / 2, [total]])
+        values = np.concatenate([[self.minimum], self.means, [self.maximum]])
+        targets = np.asarray(qs) * (total - 1) + 0.5
+        return np.interp(targets, positions, values).tolist()
+
+
+def merge_sketches(
+    left: QuantileSketch | None, right: QuantileSketch | None
+) -> QuantileSketch | None:
+    if left is None or right is None:
+        return left or right
+    return left.merge(right)
+
+
+@dataclass
+class Distribution:
+    """Moments and a quantile sketch of values per key, e.g. per category."""
+
+    moments: Moments
+    sketches: list[QuantileSketch | None]
+
+    @classmethod
+    def of(cls, values: np.ndarray, keys: np.ndarray, n_keys: int) -> 'Distribution':
+        order = np.lexsort((values, keys))
+        values, keys = values[order], keys[order]
+        bounds = np.searchsorted(keys, np.arange(n_keys + 1))
+        sketches = [
+            QuantileSketch.of(values[start:end]) if end > start else None
+            for start, end in pairwise(bounds.tolist())
+        ]
+        return cls(Moments.of(values, keys, n_keys), sketches)
+
+    def merge(self, other: 'Distribution') -> 'Distribution':
+        return Distribution(
+            self.moments.merge(other.moments),
+            list(map(merge_sketches, self.sketches, other.sketches)),
+        )
+
+    def describe(self, key: int) -> dict | None:
+        """Count, mean, standard deviation and p50/p90/p99 of one key's values."""
+        sketch = self.sketches[key]
+        if sketch is None:
+            return None
+        return {
+            'count': int(self.moments.count[key]),
+            'mean': float(self.moments.mean[key]),
+            'std': float(self.moments.std[key]),
+            **dict(zip(QUANTILES, sketch.quantiles(list(QUANTILES.values())))),
+        }
+
+
+@dataclass
+class Regression:
+    """Co-moments of (days since an anchor, amount), merged like ``Moments``."""
+
+    n: int = 0
+    mean_x: float = 0.0
+    mean_y: float = 0.0
+    cxx: float = 0.0
+    cxy: float = 0.0
+
+    @classmethod
+    def of(cls, x: np.ndarray, y: np.ndarray) -> 'Regression':
+        if not len(x):
+            return cls()
+        mean_x, mean_y = float(x.mean()), float(y.mean())
+        dx = x - mean_x
+        return cls(len(x), mean_x, mean_y, float(dx @ dx), float(dx @ (y - mean_y)))
+
+    def merge(self, other: 'Regression') -> 'Regression':
+        n = self.n + other.n
+        if not n:
+            return Regression()
+        dx, dy = other.mean_x - self.mean_x, other.mean_y - self.mean_y
+        share = other.n / n
+        return Regression(
+            n,
+            self.mean_x + dx * share,
+            self.mean_y + dy * share,
+            self.cxx + other.cxx + dx * dx * self.n * share,
+            self.cxy + other.cxy + dx * dy * self.n * share,
+        )
+
+    @property
+    def slope(self) -> float:
+        return self.cxy / self.cxx if self.cxx else 0.0
+
+
+@dataclass
+class PartialAggregate:
+    """Mergeable state behind the spending analysis, trend and summary.
+
+    Per day: net total and the last transaction's (date, row, balance), so
+    merging keeps the later one. Per month: sums and counts by sign
+    (expense, zero, income). Plus amount ``Moments``, date extremes and
+    trend ``Regression``. Shards can cover any rows, in any order.
+    """
+
+    days: np.ndarray
+    day_totals: np.ndarray
+    day_last: np.ndarray
+    day_rows: np.ndarray
+    day_balances: np.ndarray
+    months: np.ndarray
+    month_sums: np.ndarray
+    month_counts: np.ndarray
+    amounts: Moments
+    first_date: int
+    last_date: int
+    regression: Regression
+
+    def merge(self, other: 'PartialAggregate') -> 'PartialAggregate':
+        days, day_codes = np.unique(
+            np.concatenate([self.days, other.days]), return_inverse=True
+        )
+        last = np.concatenate([self.day_last, other.day_last])
+        rows = np.concatenate([self.day_rows, other.day_rows])
+        # Each day's latest (date, row) comes last within its day
+        order = np.lexsort((rows, last, day_codes))
+        closing = order[
+            np.searchsorted(day_codes[order], np.arange(len(days)), 'right') - 1
+        ]
+
+        months, month_codes = np.unique(
+            np.concatenate([self.months, other.months]), return_inverse=True
+        )
+        month_sums = np.zeros((len(months), 3))
+        month_counts = np.zeros((len(months), 3), dtype=np.int64)
+        np.add.at(
+            month_sums, month_codes, np.vstack([self.month_sums, other.month_sums])
+        )
+        np.add.at(
+            month_counts,
+            month_codes,
+            np.vstack([self.month_counts, other.month_counts]),
+        )
+
+        return PartialAggregate(
+            days=days,
+            day_totals=np.bincount(
+                day_codes,
+                weights=np.concatenate([self.day_totals, other.day_totals]),
+                minlength=len(days),
+            ),
+            day_last=last[closing],
+            day_rows=rows[closing],
+            day_balances=np.concatenate([self.day_balances, other.day_balances])[
+                closing
+            ],
+            months=months,
+            month_sums=month_sums,
+            month_counts=month_counts,
+            amounts=self.amounts.merge(other.amounts),
+            first_date=min(self.first_date, other.first_date),
+            last_date=max(self.last_date, other.last_date),
+            regression=self.regression.merge(other.regression),
+        )
+
+    @property
+    def total_spent(self) -> float:
+        """Sum of expenses (negative)."""
+        return float(self.month_sums[:, 0].sum())
+
+    @property
+    def total_income(self) -> float:
+        return float(self.month_sums[:, 2].sum())
+
+    def spending_analysis(self) -> dict:
+        """``analyze_spending`` output."""
+        total_spent, total_income = self.total_spent, self.total_income
+        days = np.datetime_as_string(self.days).tolist()
+        return {
+            'total_spent': abs(total_spent),
+            'total_income': total_income,
+            'savings_rate': (
+                ((total_income + total_spent) / total_income) * 100
+                if total_income
+                else 0
+            ),
+            'daily_summary': dict(zip(days, self.day_totals.tolist())),
+            'cumulative_balance': dict(zip(days, self.day_balances.tolist())),
+        }
+
+    def spending_trends(self) -> dict:
+        """``predict_trends`` output."""
+        if self.regression.n < 2:
+            return {'trend': 'Not enough data'}
+        slope = self.regression.slope
+        return {
+            'trend': 'increasing' if slope > 0 else 'decreasing',
+            'trend_slope': float(slope),
+            'estimated_monthly_spend': abs(self.total_spent) / (len(self.months) or 1),
+            'forecast': monthly_forecast(self.months, -self.month_sums[:, 0]),
+        }
+
+    def summary_aggregates(self) -> dict | None:
+        """``grouped_summary_aggregates`` output for the whole batch, or None
+        without both an expense and an income."""
+        sums, counts = self.month_sums, self.month_counts
+        has_expense = counts[:, 0] > 0
+        has_income = counts[:, 2] > 0
+        if not has_expense.any() or not has_income.any():
+            return None
+
+        reported = has_expense | has_income
+        monthly_income = sums[:, 2]
+        monthly_expense = -sums[:, 0]
+        monthly_savings = np.where(
+            has_income & has_expense, monthly_income - monthly_expense, 0.0
+        )
+        return {
+            'total_transactions': int(self.amounts.count[0]),
+            'total_spent': self.total_spent,
+            'total_income': self.total_income,
+            'expense_count': int(counts[:, 0].sum()),
+            'income_count': int(counts[:, 2].sum()),
+            'largest_expense': float(self.amounts.minimum[0]),
+            'largest_income': float(self.amounts.maximum[0]),
+            'first_date': np.datetime64(self.first_date, 'ns'),
+            'last_date': np.datetime64(self.last_date, 'ns'),
+            'months': np.datetime_as_string(self.months[reported]).tolist(),
+            'monthly_income': monthly_income[reported],
+            'monthly_expense': monthly_expense[reported],
+            'monthly_savings': monthly_savings[reported],
+            'has_income': has_income[reported],
+            'has_expense': has_expense[reported],
+        }
+
+
+def partial_aggregate(
+    amounts: np.ndarray,
+    balances: np.ndarray,
+    dates: np.ndarray,
+    offset: int,
+    anchor: int,
+) -> PartialAggregate:
+    """Map step: the ``PartialAggregate`` of one shard of rows.
+
+    ``offset`` is the shard's first row in the batch, so same-time
+    transactions keep payload order across shards; ``anchor`` is the date
+    (ns) trend days are counted from.
+    """
+    order = np.argsort(dates, kind='stable')
+    sorted_dates = dates[order]
+    day_keys = sorted_dates.astype('datetime64[D]')
+    starts = np.flatnonzero(np.r_[True, day_keys[1:] != day_keys[:-1]])
+    ends = np.r_[starts[1:], len(order)] - 1
+
+    # Months as offsets from the first one, so bucketing needs no second sort
+    first_month = day_keys[0].astype('datetime64[M]')
+    month_codes = (dates.astype('datetime64[M]') - first_month).astype(np.intp)
+    # 0: expense, 1: zero amount, 2: income
+    keys = month_codes * 3 + (np.sign(amounts).astype(np.intp) + 1)
+    size = (int(month_codes.max()) + 1) * 3
+    month_sums = np.bincount(keys, weights=amounts, minlength=size).reshape(-1, 3)
+    month_counts = np.bincount(keys, minlength=size).reshape(-1, 3)
+    active = month_counts.any(axis=1)
+    timestamps = dates.view(np.int64)
+    x = ((timestamps - anchor) // DAY_NS).astype(np.float64)
+
+    return PartialAggregate(
+        days=day_keys[starts],
+        day_totals=np.add.reduceat(amounts[order], starts),
+        day_last=sorted_dates[ends].view(np.int64),
+        day_rows=order[ends] + offset,
+        day_balances=balances[order][ends],
+        months=first_month + np.flatnonzero(active),
+        month_sums=month_sums[active],
+        month_counts=month_counts[active],
+        amounts=Moments.of(amounts, np.zeros(len(amounts), dtype=np.intp), 1),
+        first_date=int(timestamps.min()),
+        last_date=int(timestamps.max()),
+        regression=Regression.of(x, amounts),
+    )
+
+
+def shard_bounds(rows: int) -> list[tuple[int, int]]:
+    """Row ranges to split ``rows`` into for the map step.
+
+    Batches under ``PARTIAL_AGGREGATE_ROWS`` stay in one shard; larger ones
+    get one per worker (``PARTIAL_AGGREGATE_SHARDS``, by default the stage
+    executor's worker count).
+    """
+    shards = 1
+    if settings.partial_aggregate_rows and rows >= settings.partial_aggregate_rows:
+        shards = (
+            settings.partial_aggregate_shards
+            or stage_executor.stats()['workers']
+            or os.cpu_count()
+            or 1
+        )
+    bounds = np.linspace(0, rows, shards + 1).astype(int).tolist()
+    return [(start, end) for start, end in pairwise(bounds) if end > start]
+
+
+async def aggregate_batch(batch: TransactionBatch) -> PartialAggregate:
+    """Map ``partial_aggregate`` over row shards on the stage executor and merge."""
+    anchor = int(batch.date[0].view(np.int64))
+    parts = await asyncio.gather(
+        *(
+            stage_executor.run(
+                partial_aggregate,
+                batch.amount[start:end],
+                batch.balance[start:end],
+                batch.date[start:end],
+                start,
+                anchor,
+            )
+            for start, end in shard_bounds(len(batch))
+        )
+    )
+    return reduce(PartialAggregate.merge, parts)
+
+
+async def distribute(values: np.ndarray, keys: np.ndarray, n_keys: int) -> Distribution:
+    """Map ``Distribution.of`` over row shards on the stage executor and merge."""
+    parts = await asyncio.gather(
+        *(
+            stage_executor.run(
+                Distribution.of, values[start:end], keys[start:end], n_keys
+            )
+            for start, end in shard_bounds(len(values))
+        )
+    )
+    if not parts:
+        return Distribution.of(values, keys, n_keys)
+    return reduce(Distribution.merge, parts)
@@ -0,0 +1,115 @@
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable
+
+from utils.settings import base_settings as settings
+
+
+def payload_key(kind: str, payload, *context) -> str:
+    """Hash a canonical JSON rendering of ``payload`` and anything else that
+    shapes the result (endpoint kind, labels, model id, ...).
+
+    Object keys are sorted and whitespace is dropped, so the same
+    transactions hash the same however the client serialized them.
+    """
+    canonical = json.dumps(
+        [kind, list(context), payload],
+        sort_keys=True,
+        separators=(',', ':'),
+        ensure_ascii=False,
+        default=str,
+    )
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class ResultCache:
+    """TTL + LRU cache of endpoint results with single-flight computation.
+
+    Concurrent requests for the same key share one computation; only
+    successful results (no ``'error'`` key) are stored.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 256,
+        ttl: float = 300,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._clock = clock
+        self._entries: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self._inflight: dict[str, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> dict | None:
+        """Return the fresh result for ``key``, or None."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires, result = entry
+        if expires <= self._clock():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return result
+
+    def put(self, key: str, result: dict) -> None:
+        if self.max_entries <= 0 or 'error' in result:
+            return
+        self._entries[key] = (self._clock() + self.ttl, result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def get_or_compute(
+        self, key: str, compute: Callable[[], Awaitable[dict]]
+    ) -> dict:
+        """Return the cached result for ``key``, computing it at most once.
+
+        The computation runs as its own task, so a caller that goes away
+        does not cancel it for the others waiting on the same key.
+        """
+        result = self.get(key)
+        if result is not None:
+            self.hits += 1
+            return result
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            task = asyncio.ensure_future(compute())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        return await asyncio.shield(task)
+
+    def _finish(self, key: str, task: asyncio.Task) -> None:
+        self._inflight.pop(key, None)
+        if not task.cancelled() and task.exception() is None:
+            self.put(key, task.result())
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'evictions': self.evictions,
+            'hit_rate': (self.hits + self.coalesced) / lookups if lookups else 0,
+            'entries': len(self._entries),
+            'inflight': len(self._inflight),
+        }
+
+
+result_cache = ResultCache(
+    max_entries=settings.result_cache_size, ttl=settings.result_cache_ttl
+)
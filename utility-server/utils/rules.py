@@ -0,0 +1,215 @@
+import json
+import re
+from functools import lru_cache
+
+from utils.settings import base_settings as settings
+
+# Keyword table used when CLASSIFIER_RULES is not set. Labels that are not in
+# the configured LABELS are ignored, so the table can be broader than LABELS.
+DEFAULT_RULES = {
+    'keywords': {
+        'groceries': [
+            'groceries',
+            'grocery',
+            'supermarket',
+            'tesco',
+            'sainsbury',
+            'asda',
+            'aldi',
+            'lidl',
+            'waitrose',
+            'walmart',
+            'kroger',
+            'whole foods',
+            'trader joe',
+            'safeway',
+            'costco',
+        ],
+        'housing': ['rent', 'mortgage', 'landlord', 'letting agent', 'hoa'],
+        'transportation': [
+            'uber',
+            'lyft',
+            'taxi',
+            'bolt',
+            'fuel',
+            'petrol',
+            'gas station',
+            'shell',
+            'chevron',
+            'exxon',
+            'parking',
+            'metro',
+            'transit',
+            'tfl',
+            'train',
+            'rail',
+            'bus fare',
+            'toll',
+        ],
+        'entertainment': [
+            'cinema',
+            'movie',
+            'theatre',
+            'theater',
+            'concert',
+            'ticketmaster',
+            'steam',
+            'playstation',
+            'xbox',
+            'nintendo',
+        ],
+        'utilities': [
+            'electric',
+            'electricity',
+            'water bill',
+            'gas bill',
+            'british gas',
+            'energy',
+            'broadband',
+            'internet',
+            'comcast',
+            'verizon',
+            'at&t',
+            'phone bill',
+            'utility',
+        ],
+        'streaming services': [
+            'netflix',
+            'spotify',
+            'hulu',
+            'disney plus',
+            'disneyplus',
+            'hbo',
+            'prime video',
+            'youtube premium',
+            'apple music',
+            'paramount',
+        ],
+        'subscriptions': ['subscription', 'membership', 'patreon', 'icloud'],
+        'dining out': [
+            'restaurant',
+            'cafe',
+            'coffee',
+            'starbucks',
+            'mcdonald',
+            'burger',
+            'pizza',
+            'kfc',
+            'subway',
+            'doordash',
+            'uber eats',
+            'ubereats',
+            'deliveroo',
+            'grubhub',
+            'just eat',
+        ],
+        'healthcare': ['pharmacy', 'doctor', 'hospital', 'dental', 'dentist', 'clinic'],
+        'insurance': ['insurance', 'geico', 'allstate', 'aviva'],
+        'fitness': ['gym', 'fitness', 'peloton', 'yoga'],
+        'travel': [
+            'airline',
+            'airways',
+            'hotel',
+            'airbnb',
+            'booking com',
+            'expedia',
+            'ryanair',
+            'easyjet',
+        ],
+        'taxes': ['irs', 'hmrc', 'tax'],
+        'charity': ['donation', 'charity', 'gofundme'],
+        'pets': ['petco', 'petsmart', 'pets at home', 'vet', 'veterinary'],
+        'childcare': ['daycare', 'nursery', 'childcare', 'babysitter'],
+        'school': ['tuition', 'school', 'university', 'college'],
+        'shopping': ['amazon', 'ebay', 'target', 'ikea', 'argos', 'etsy'],
+        'gadgets': ['apple store', 'best buy', 'currys'],
+        'personal care': ['salon', 'barber', 'spa', 'cosmetics'],
+        'debts': ['loan repayment', 'loan', 'klarna', 'afterpay'],
+        'credit cards': ['credit card', 'amex', 'card repayment'],
+        'savings': ['savings'],
+        'investments': ['vanguard', 'robinhood', 'brokerage', 'etoro', 'fidelity'],
+        'gifts': ['gift', 'florist'],
+        'home maintenance': ['plumber', 'electrician', 'b&q', 'home depot', 'lowe'],
+        'hobbies': ['hobby', 'craft', 'hobbycraft'],
+    },
+    'patterns': {},
+    'merchants': {},
+}
+
+# Confidence assigned by each rule kind; ambiguous matches get AMBIGUOUS
+MERCHANT_CONFIDENCE = 0.99
+KEYWORD_CONFIDENCE = 0.9
+PATTERN_CONFIDENCE = 0.85
+AMBIGUOUS_CONFIDENCE = 0.5
+
+
+class RuleMatcher:
+    """First-tier classifier built from a keyword/regex/merchant table.
+
+    Every keyword and pattern is compiled into a single alternation so one
+    regex scan finds all candidate rules for a merchant key.
+    """
+
+    def __init__(self, rules: dict, labels: list[str]):
+        allowed = set(labels)
+        self.merchants = {
+            merchant: label
+            for merchant, label in rules.get('merchants', {}).items()
+            if label in allowed
+        }
+        self._rules: list[tuple[str, float]] = []
+        alternatives = []
+        for kind, confidence in (
+            ('keywords', KEYWORD_CONFIDENCE),
+            ('patterns', PATTERN_CONFIDENCE),
+        ):
+            for label, entries in rules.get(kind, {}).items():
+                if label not in allowed:
+                    continue
+                for entry in entries:
+                    source = re.escape(entry) if kind == 'keywords' else entry
+                    alternatives.append((source, f'(?P<r{len(self._rules)}>{source})'))
+                    self._rules.append((label, confidence))
+        # Alternation is leftmost-first, so try longer entries ('uber eats')
+        # before their prefixes ('uber')
+        alternatives.sort(key=lambda item: len(item[0]), reverse=True)
+        self._pattern = (
+            re.compile(r'\b(?:' + '|'.join(group for _, group in alternatives) + r')\b')
+            if alternatives
+            else None
+        )
+
+    def match(self, merchant: str) -> tuple[str, float] | None:
+        """Return ``(label, confidence)`` for a merchant key, or ``None``."""
+        label = self.merchants.get(merchant)
+        if label is not None:
+            return label, MERCHANT_CONFIDENCE
+        if self._pattern is None:
+            return None
+
+        best: tuple[int, str, float] | None = None
+        labels = set()
+        for found in self._pattern.finditer(merchant):
+            label, confidence = self._rules[int(found.lastgroup[1:])]
+            labels.add(label)
+            length = found.end() - found.start()
+            if best is None or length > best[0]:
+                best = (length, label, confidence)
+        if best is None:
+            return None
+        _, label, confidence = best
+        return label, confidence if len(labels) == 1 else AMBIGUOUS_CONFIDENCE
+
+
+def load_rules() -> dict:
+    """Load the rule table from CLASSIFIER_RULES, or fall back to the default."""
+    if not settings.classifier_rules_path:
+        return DEFAULT_RULES
+    with open(settings.classifier_rules_path) as f:
+        return json.load(f)
+
+
+@lru_cache(maxsize=8)
+def get_matcher(labels: tuple[str, ...]) -> RuleMatcher:
+    """Return the compiled matcher for a label set."""
+    return RuleMatcher(load_rules(), list(labels))
@@ -0,0 +1,131 @@
+import numpy as np
+import torch
+from transformers import AutoModel, AutoModelForSequenceClassification
+
+from utils.settings import base_settings as settings
+
+RUNTIMES = ('torch', 'int8', 'onnx')
+MAX_LENGTH = 128
+
+
+class PaddingStats:
+    """Track how much of each padded batch is real tokens versus padding."""
+
+    def __init__(self):
+        self.batches = 0
+        self.items = 0
+        self.real_tokens = 0
+        self.padded_tokens = 0
+
+    def record(self, lengths: np.ndarray, batch_size: int) -> None:
+        """Record batches of ``batch_size`` items, given lengths in batch order."""
+        if not len(lengths):
+            return
+        starts = np.arange(0, len(lengths), batch_size)
+        sizes = np.diff(np.append(starts, len(lengths)))
+        self.batches += len(starts)
+        self.items += len(lengths)
+        self.real_tokens += int(lengths.sum())
+        self.padded_tokens += int((np.maximum.reduceat(lengths, starts) * sizes).sum())
+
+    def stats(self) -> dict:
+        return {
+            'batch_size': settings.classifier_batch_size,
+            'batches': self.batches,
+            'items': self.items,
+            'real_tokens': self.real_tokens,
+            'padded_tokens': self.padded_tokens,
+            'padding_waste': (
+                1 - self.real_tokens / self.padded_tokens if self.padded_tokens else 0
+            ),
+        }
+
+
+padding_stats = PaddingStats()
+
+
+def token_lengths(tokenizer, texts: list[str], **kwargs) -> np.ndarray:
+    """Return the token count of each text without padding."""
+    return np.array([len(ids) for ids in tokenizer(texts, **kwargs)['input_ids']])
+
+
+def length_order(lengths: np.ndarray) -> np.ndarray:
+    """Return indices that sort items by length so batches pad minimally."""
+    return np.argsort(lengths, kind='stable')
+
+
+def restore_order(items: list, order: np.ndarray) -> list:
+    """Undo ``length_order``: put results back in their original positions."""
+    restored = [None] * len(items)
+    for position, index in enumerate(order):
+        restored[index] = items[position]
+    return restored
+
+
+def configure_threads() -> None:
+    """Apply INFERENCE_THREADS to PyTorch's intra-op thread pool."""
+    if settings.inference_threads:
+        torch.set_num_threads(settings.inference_threads)
+
+
+def _onnx_session_options():
+    import onnxruntime
+
+    options = onnxruntime.SessionOptions()
+    options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if settings.inference_threads:
+        options.intra_op_num_threads = settings.inference_threads
+        options.inter_op_num_threads = 1
+    return options
+
+
+def load_model(model_id: str, task: str, device: torch.device):
+    """Load a model for ``task`` on the runtime selected by CLASSIFIER_RUNTIME.
+
+    ``task`` is ``'sequence-classification'`` (zero-shot NLI head) or
+    ``'feature-extraction'`` (embedding encoder). ``int8`` and ``onnx`` are
+    CPU runtimes; ``onnx`` needs the optional ``optimum[onnxruntime]`` extra.
+    """
+    runtime = settings.classifier_runtime
+    if runtime not in RUNTIMES:
+        raise ValueError(f'Unknown CLASSIFIER_RUNTIME: {runtime}')
+    configure_threads()
+
+    if runtime == 'onnx':
+        try:
+            from optimum.onnxruntime import (
+                ORTModelForFeatureExtraction,
+                ORTModelForSequenceClassification,
+            )
+        except ImportError as e:
+            raise ImportError(
+                'CLASSIFIER_RUNTIME=onnx requires: pip install "optimum[onnxruntime]"'
+            ) from e
+        model_class = (
+            ORTModelForSequenceClassification
+            if task == 'sequence-classification'
+            else ORTModelForFeatureExtraction
+        )
+        return model_class.from_pretrained(
+            model_id, export=True, session_options=_onnx_session_options()
+        )
+
+    model_class = (
+        AutoModelForSequenceClassification
+        if task == 'sequence-classification'
+        else AutoModel
+    )
+    if runtime == 'int8':
+        # Dynamic quantization only runs on CPU
+        model = model_class.from_pretrained(model_id).eval()
+        return torch.ao.quantization.quantize_dynamic(
+            model, {torch.nn.Linear}, dtype=torch.qint8
+        )
+    return model_class.from_pretrained(model_id).to(device).eval()
+
+
+def inference_device(device: torch.device) -> torch.device:
+    """Return the device inputs must be placed on for the configured runtime."""
+    if settings.classifier_runtime in ('int8', 'onnx'):
+        return torch.device('cpu')
+    return device
@@ -0,0 +1,170 @@
+import asyncio
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+from utils.classifier import classifier_registry
+from utils.settings import base_settings as settings
+
+Prediction = tuple[str, float]
+
+
+class InferenceScheduler:
+    """Coalesce classification work from concurrent requests into batches.
+
+    Callers enqueue descriptions and await per-item futures. A single worker
+    drains the queue into batches of up to ``max_batch_size`` items, waiting at
+    most ``max_wait`` seconds for a batch to fill, and runs one model call per
+    batch on a dedicated inference thread.
+    """
+
+    def __init__(
+        self,
+        predict: Callable[[list[str], list[str]], list[Prediction]],
+        max_batch_size: int = 64,
+        max_wait: float = 0.01,
+    ):
+        self._predict = predict
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._queue: asyncio.Queue | None = None
+        self._worker: asyncio.Task | None = None
+        self._executor: ThreadPoolExecutor | None = None
+        # Items taken off the queue but not yet answered, failed on stop
+        self._batch: list[tuple] = []
+        self.batches = 0
+        self.items = 0
+        self.batch_sizes: Counter[int] = Counter()
+
+    @property
+    def running(self) -> bool:
+        return self._worker is not None and not self._worker.done()
+
+    async def start(self) -> None:
+        """Start the batching worker on the running event loop."""
+        if self.running:
+            return
+        self._queue = asyncio.Queue()
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix='inference'
+        )
+        self._worker = asyncio.create_task(self._run())
+        settings.logger.info(
+            f'Inference scheduler started (max batch {self.max_batch_size}, '
+            f'max wait {self.max_wait * 1000:.0f} ms)'
+        )
+
+    async def stop(self) -> None:
+        """Stop the worker and fail any work still queued or in flight."""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        pending, self._batch = self._batch, []
+        while self._queue is not None and not self._queue.empty():
+            pending.append(self._queue.get_nowait())
+        for _, _, future in pending:
+            if not future.done():
+                future.set_exception(RuntimeError('Inference scheduler stopped'))
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    async def classify(
+        self, descriptions: list[str], labels: list[str]
+    ) -> list[Prediction]:
+        """Classify descriptions, batching them with other in-flight requests."""
+        if not self.running:
+            return await asyncio.to_thread(self._predict, descriptions, labels)
+
+        loop = asyncio.get_running_loop()
+        label_key = tuple(labels)
+        futures = []
+        for description in descriptions:
+            future = loop.create_future()
+            self._queue.put_nowait((description, label_key, future))
+            futures.append(future)
+        return list(await asyncio.gather(*futures))
+
+    async def _collect(self) -> list[tuple]:
+        """Wait for work, then gather a batch until it is full or max_wait passes."""
+        loop = asyncio.get_running_loop()
+        self._batch = batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            self.batches += 1
+            self.items += len(batch)
+            self.batch_sizes[len(batch)] += 1
+
+            # Requests may use different label sets and share descriptions
+            groups: dict[tuple, dict[str, list[asyncio.Future]]] = {}
+            for description, label_key, future in batch:
+                groups.setdefault(label_key, {}).setdefault(description, []).append(
+                    future
+                )
+
+            for label_key, waiters in groups.items():
+                descriptions = list(waiters)
+                try:
+                    results = await loop.run_in_executor(
+                        self._executor, self._predict, descriptions, list(label_key)
+                    )
+                except Exception as e:
+                    settings.logger.error(
+                        f'Batch inference failed: {str(e)}', exc_info=True
+                    )
+                    # Don't hand callers a traceback that pins the worker's frame
+                    e = e.with_traceback(None)
+                    for futures in waiters.values():
+                        for future in futures:
+                            if not future.done():
+                                future.set_exception(e)
+                    continue
+                for description, result in zip(descriptions, results):
+                    for future in waiters[description]:
+                        if not future.done():
+                            future.set_result(result)
+            self._batch = []
+
+    def stats(self) -> dict:
+        """Return queue depth and a power-of-two batch-size histogram."""
+        histogram: Counter[str] = Counter()
+        for size, count in self.batch_sizes.items():
+            bucket = 1 << (size - 1).bit_length()
+            histogram[f'<={bucket}'] += count
+        return {
+            'running': self.running,
+            'queue_depth': self._queue.qsize() if self._queue is not None else 0,
+            'batches': self.batches,
+            'items': self.items,
+            'mean_batch_size': self.items / self.batches if self.batches else 0,
+            'batch_size_histogram': dict(
+                sorted(histogram.items(), key=lambda item: int(item[0][2:]))
+            ),
+        }
+
+
+inference_scheduler = InferenceScheduler(
+    classifier_registry.predict,
+    max_batch_size=settings.inference_max_batch_size,
+    max_wait=settings.inference_max_wait_ms / 1000,
+)
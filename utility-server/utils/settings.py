@@ -1,4 +1,5 @@
 import logging
+import os
 
 from aiohttp.web import WebSocketResponse
 from dotenv import load_dotenv
@@ -19,6 +20,84 @@ class Settings:
     # List to store active WebSocket connections
     active_websockets = set()
 
+    # Classification model (hub id, or a local directory for offline use)
+    classifier_model = os.getenv('CLASSIFIER_MODEL', 'yiyanghkust/finbert-tone')
+    classifier_model_path = os.getenv('CLASSIFIER_MODEL_PATH')
+    classifier_preload = os.getenv('CLASSIFIER_PRELOAD', 'true').lower() == 'true'
+
+    # Classification backend: 'zero-shot' (NLI) or 'embedding' (nearest centroid)
+    classifier_backend = os.getenv('CLASSIFIER_BACKEND', 'zero-shot')
+    embedding_model = os.getenv(
+        'EMBEDDING_MODEL', 'sentence-transformers/all-MiniLM-L6-v2'
+    )
+    embedding_model_path = os.getenv('EMBEDDING_MODEL_PATH')
+    embedding_cache_size = int(os.getenv('EMBEDDING_CACHE_SIZE', '100000'))
+    # CPU runtime for either backend: 'torch', 'int8' (dynamic quantization) or
+    # 'onnx' (ONNX Runtime, needs optimum[onnxruntime]); 0 threads = library default
+    classifier_runtime = os.getenv('CLASSIFIER_RUNTIME', 'torch')
+    inference_threads = int(os.getenv('INFERENCE_THREADS', '0'))
+    # Model inputs per forward pass; inputs are length-sorted before batching
+    classifier_batch_size = int(os.getenv('CLASSIFIER_BATCH_SIZE', '32'))
+    # JSON map of label -> example descriptions used to build label centroids
+    classifier_exemplars_path = os.getenv('CLASSIFIER_EXEMPLARS')
+
+    # Rule tier: JSON table of keywords/patterns/merchants, and the confidence
+    # below which a rule match falls through to the model
+    classifier_rules_path = os.getenv('CLASSIFIER_RULES')
+    rule_confidence_threshold = float(os.getenv('RULE_CONFIDENCE_THRESHOLD', '0.8'))
+
+    # Cross-request micro-batching of model inference
+    inference_max_batch_size = int(os.getenv('INFERENCE_MAX_BATCH_SIZE', '64'))
+    inference_max_wait_ms = float(os.getenv('INFERENCE_MAX_WAIT_MS', '10'))
+
+    # Classification cache (set CLASSIFICATION_CACHE_PATH empty to disable disk tier)
+    classification_cache_size = int(os.getenv('CLASSIFICATION_CACHE_SIZE', '50000'))
+    classification_cache_path = os.getenv(
+        'CLASSIFICATION_CACHE_PATH', 'classification_cache.sqlite3'
+    )
+
+    # Embedded transaction store behind POST /transactions and userId-based
+    # /analyze and /summarize requests (empty disables it)
+    transaction_store_path = os.getenv('TRANSACTION_STORE_PATH', 'transactions.sqlite3')
+
+    # Largest accepted request body; batch payloads cover many users at once
+    max_request_mb = int(os.getenv('MAX_REQUEST_MB', '64'))
+
+    # Day and month buckets of timestamps with a UTC offset: 'local' keeps the
+    # client's wall-clock date, 'utc' converts to UTC first
+    date_buckets = os.getenv('DATE_BUCKETS', 'local')
+
+    # Pool for CPU-bound analysis stages: 'thread' or 'process'; 0 workers =
+    # concurrent.futures default
+    analysis_executor = os.getenv('ANALYSIS_EXECUTOR', 'thread')
+    analysis_workers = int(os.getenv('ANALYSIS_WORKERS', '0'))
+
+    # Batches of at least this many rows are split into row shards whose
+    # mergeable partial aggregates are computed on the stage executor and then
+    # merged (0 disables); shards default to the executor's worker count. Shards
+    # only run in parallel across cores with ANALYSIS_EXECUTOR=process
+    partial_aggregate_rows = int(os.getenv('PARTIAL_AGGREGATE_ROWS', '200000'))
+    partial_aggregate_shards = int(os.getenv('PARTIAL_AGGREGATE_SHARDS', '0'))
+
+    # /analyze and /summarize results keyed by payload hash (0 entries disables)
+    result_cache_size = int(os.getenv('RESULT_CACHE_SIZE', '256'))
+    result_cache_ttl = float(os.getenv('RESULT_CACHE_TTL', '300'))
+
+    # Anomaly detection: 'isolation-forest', 'mad' (robust z-score, no model fit)
+    # or 'features' (amount, timing and merchant features, reasons from the
+    # dominant feature); histories of ANOMALY_MAD_ROWS or more rows always use
+    # 'mad' (0 = never)
+    anomaly_detector = os.getenv('ANOMALY_DETECTOR', 'isolation-forest')
+    anomaly_mad_rows = int(os.getenv('ANOMALY_MAD_ROWS', '0'))
+    anomaly_mad_threshold = float(os.getenv('ANOMALY_MAD_THRESHOLD', '3.5'))
+    # Isolation forest rows per tree and jobs (capped at the core count; 0 = all)
+    anomaly_max_samples = int(os.getenv('ANOMALY_MAX_SAMPLES', '256'))
+    anomaly_n_jobs = int(os.getenv('ANOMALY_N_JOBS', '1'))
+    # Fitted detectors kept per user; a changed history is only refit once its
+    # size moves by more than this fraction of the rows the model was fit on
+    anomaly_model_cache_size = int(os.getenv('ANOMALY_MODEL_CACHE_SIZE', '1024'))
+    anomaly_refit_fraction = float(os.getenv('ANOMALY_REFIT_FRACTION', '0.1'))
+
     # Add to existing settings
     async def send_ws_message(self, ws: WebSocketResponse, message: dict) -> None:
         """Send WebSocket message with logging."""
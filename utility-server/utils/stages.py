@@ -0,0 +1,112 @@
+import numpy as np
+import pandas as pd
+
+from utils.anomalies import (
+    amount_reasons,
+    anomaly_models,
+    detector_kind,
+    feature_anomalies,
+)
+from utils.context import AnalysisContext
+from utils.forecast import monthly_forecast
+from utils.recurring import recurring_payments
+
+
+def detect_anomalies(context: AnalysisContext) -> list[dict]:
+    """Detect anomalies in transactions and provide specific reasons.
+
+    Amount-only flags come from the per-user model cache, so an unchanged
+    history is not scored again and a slightly extended one is scored
+    without refitting. The ``features`` detector scores each row on amount,
+    timing and merchant features and explains it by the feature that
+    contributed most.
+    """
+    batch = context.batch
+    if detector_kind(len(batch)) == 'features':
+        flagged, reasons = feature_anomalies(batch)
+    else:
+        user = '|'.join(sorted(map(str, pd.unique(batch.userId))))
+        flagged = np.flatnonzero(anomaly_models.flags(user, batch.amount))
+        reasons = amount_reasons(batch, flagged)
+
+    return [
+        {
+            'date': date,
+            'description': description,
+            'amount': amount,
+            'reason': reason,
+        }
+        for date, description, amount, reason in zip(
+            batch.isoformat(batch.date[flagged]),
+            batch.description[flagged].tolist(),
+            batch.amount[flagged].tolist(),
+            reasons,
+        )
+    ]
+
+
+def analyze_spending(context: AnalysisContext) -> dict:
+    """Generate spending analysis with cumulative balance"""
+    total_spent = context.total_spent
+    total_income = context.total_income
+    days = np.datetime_as_string(context.days).tolist()
+
+    # Daily net totals, keyed by ISO date
+    daily_summary = dict(zip(days, context.daily_totals.tolist()))
+
+    # Balance after the last transaction of each day, in date order
+    cumulative_balance = dict(zip(days, context.daily_closing_balance.tolist()))
+
+    return {
+        'total_spent': abs(total_spent),
+        'total_income': total_income,
+        'savings_rate': (
+            ((total_income + total_spent) / total_income) * 100 if total_income else 0
+        ),
+        'daily_summary': daily_summary,
+        'cumulative_balance': cumulative_balance,
+    }
+
+
+def predict_trends(context: AnalysisContext) -> dict:
+    """Predict future spending trends with enhanced analysis.
+
+    ``forecast`` projects total spending 1, 3 and 6 months ahead from the
+    context's monthly expense totals (see ``utils.forecast``).
+    """
+    batch = context.batch
+    if len(batch) < 2:
+        return {'trend': 'Not enough data'}
+
+    # Convert dates to whole days since the first transaction for regression
+    days = (batch.date - batch.date[0]) // np.timedelta64(1, 'D')
+
+    # Linear regression for trends
+    slope, _ = np.polyfit(days, batch.amount, 1)
+    trend = 'increasing' if slope > 0 else 'decreasing'
+
+    # Estimated monthly spend
+    months = len(context.months)
+
+    return {
+        'trend': trend,
+        'trend_slope': float(slope),
+        'estimated_monthly_spend': abs(context.total_spent) / (months or 1),
+        'forecast': monthly_forecast(context.months, context.monthly_expense),
+    }
+
+
+def detect_recurring(context: AnalysisContext) -> list[dict]:
+    """Detect subscriptions and recurring bills with their next charge date."""
+    return recurring_payments(context.batch)
+
+
+def analyze_stages(context: AnalysisContext) -> dict:
+    """Run the anomaly, spending, trend and recurring-payment stages for one
+    context in one call."""
+    return {
+        'anomalies': detect_anomalies(context),
+        'spending_analysis': analyze_spending(context),
+        'spending_trends': predict_trends(context),
+        'recurring': detect_recurring(context),
+    }
@@ -0,0 +1,344 @@
+import sqlite3
+from threading import Lock
+
+import numpy as np
+import pandas as pd
+
+from models.base import TransactionBatch
+from utils.ingest import ingest_transactions
+from utils.settings import base_settings as settings
+from utils.windows import DateWindow, date_window, day_bounds, day_range
+
+# SQLite caps the number of bound parameters per statement
+_SQL_CHUNK = 500
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS transactions ('
+    '_id TEXT PRIMARY KEY, userId TEXT NOT NULL, date INTEGER NOT NULL, '
+    'amount REAL NOT NULL, balance REAL NOT NULL, description TEXT NOT NULL, '
+    'type TEXT NOT NULL, createdAt INTEGER, updatedAt INTEGER)',
+    'CREATE INDEX IF NOT EXISTS transactions_user_date '
+    'ON transactions (userId, date)',
+    # Expenses are stored negative, like the amounts they sum
+    'CREATE TABLE IF NOT EXISTS daily_rollups ('
+    'userId TEXT NOT NULL, day TEXT NOT NULL, month TEXT NOT NULL, '
+    'income REAL NOT NULL, expense REAL NOT NULL, income_count INTEGER NOT NULL, '
+    'expense_count INTEGER NOT NULL, rows INTEGER NOT NULL, '
+    'min_amount REAL NOT NULL, max_amount REAL NOT NULL, '
+    'first_date INTEGER NOT NULL, last_date INTEGER NOT NULL, '
+    'PRIMARY KEY (userId, day))',
+    'CREATE TABLE IF NOT EXISTS monthly_rollups ('
+    'userId TEXT NOT NULL, month TEXT NOT NULL, '
+    'income REAL NOT NULL, expense REAL NOT NULL, income_count INTEGER NOT NULL, '
+    'expense_count INTEGER NOT NULL, rows INTEGER NOT NULL, '
+    'min_amount REAL NOT NULL, max_amount REAL NOT NULL, '
+    'first_date INTEGER NOT NULL, last_date INTEGER NOT NULL, '
+    'PRIMARY KEY (userId, month))',
+    # Bumped on every write, so cached results for a user go stale
+    'CREATE TABLE IF NOT EXISTS users ('
+    'userId TEXT PRIMARY KEY, version INTEGER NOT NULL, tz_aware INTEGER NOT NULL)',
+)
+
+UPSERT = (
+    'INSERT INTO transactions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) '
+    'ON CONFLICT (_id) DO UPDATE SET userId = excluded.userId, '
+    'date = excluded.date, amount = excluded.amount, balance = excluded.balance, '
+    'description = excluded.description, type = excluded.type, '
+    'createdAt = excluded.createdAt, updatedAt = excluded.updatedAt'
+)
+DAILY_ROLLUP = (
+    'INSERT INTO daily_rollups SELECT userId, ?, ?, '
+    'TOTAL(CASE WHEN amount > 0 THEN amount END), '
+    'TOTAL(CASE WHEN amount < 0 THEN amount END), '
+    'COUNT(CASE WHEN amount > 0 THEN 1 END), COUNT(CASE WHEN amount < 0 THEN 1 END), '
+    'COUNT(*), MIN(amount), MAX(amount), MIN(date), MAX(date) '
+    'FROM transactions WHERE userId = ? AND date >= ? AND date < ? GROUP BY userId'
+)
+MONTHLY_ROLLUP = (
+    'INSERT INTO monthly_rollups SELECT userId, month, TOTAL(income), '
+    'TOTAL(expense), SUM(income_count), SUM(expense_count), SUM(rows), '
+    'MIN(min_amount), MAX(max_amount), MIN(first_date), MAX(last_date) '
+    'FROM daily_rollups WHERE userId = ? AND month = ? GROUP BY userId'
+)
+ROLLUP_COLUMNS = (
+    'income, expense, income_count, expense_count, rows, '
+    'min_amount, max_amount, first_date, last_date'
+)
+MERGED_ROLLUP_COLUMNS = (
+    'TOTAL(income), TOTAL(expense), SUM(income_count), SUM(expense_count), '
+    'SUM(rows), MIN(min_amount), MAX(max_amount), MIN(first_date), MAX(last_date)'
+)
+
+
+def nullable(values: np.ndarray) -> list:
+    """``datetime64[ns]`` values as integers, with NaT as None."""
+    integers = values.view(np.int64).tolist()
+    return [None if nat else value for value, nat in zip(integers, np.isnat(values))]
+
+
+def store_request(
+    data: dict, store: 'TransactionStore'
+) -> tuple[dict, tuple[str, DateWindow]]:
+    """Result-cache payload and ``(userId, window)`` for a stored-data query.
+
+    ``data`` holds a ``userId`` and optional ``start``/``end`` days and
+    rolling ``window``. The payload includes the user's write version, so
+    cached results go stale as soon as new transactions are stored. Raises
+    ValueError for bad input.
+    """
+    user = data.get('userId')
+    if not isinstance(user, str) or not user:
+        raise ValueError('userId must be a non-empty string')
+    window = date_window(data) or DateWindow()
+    payload = {
+        'store': {
+            'userId': user,
+            'window': window.key(),
+            'version': store.version(user),
+        }
+    }
+    return payload, (user, window)
+
+
+class TransactionStore:
+    """Embedded SQLite store of transactions with daily and monthly rollups.
+
+    ``upsert`` writes transactions by ``_id`` and recomputes the rollups of
+    only the days and months it touched, so a summary over any history
+    reads O(months) rollup rows instead of every transaction.
+    """
+
+    def __init__(self, path: str | None = None):
+        self.path = path
+        self._lock = Lock()
+        self._db: sqlite3.Connection | None = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._db is None:
+            if not self.path:
+                raise RuntimeError(
+                    'Transaction store is disabled; set TRANSACTION_STORE_PATH'
+                )
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            for statement in SCHEMA:
+                self._db.execute(statement)
+            self._db.commit()
+        return self._db
+
+    def upsert(self, transactions: list) -> tuple[int, list[dict]]:
+        """Insert or replace transactions by ``_id``; returns (written, rejected)."""
+        batch, rejected = ingest_transactions(transactions)
+        if batch is None:
+            return 0, rejected
+
+        refused = {reason['index'] for reason in rejected}
+        indices = [i for i in range(len(transactions)) if i not in refused]
+        has_id = ~pd.isna(pd.Series(batch._id, dtype=object)).to_numpy()
+        rejected.extend(
+            {'index': indices[position], 'reason': 'Missing _id'}
+            for position in np.flatnonzero(~has_id)
+        )
+        rejected.sort(key=lambda reason: reason['index'])
+        if not has_id.all():
+            batch = batch.take(has_id)
+        if not len(batch):
+            return 0, rejected
+
+        ids = [str(_id) for _id in batch._id]
+        users = np.asarray(batch.userId).astype(str).tolist()
+        dates = batch.date.view(np.int64).tolist()
+        rows = list(
+            zip(
+                ids,
+                users,
+                dates,
+                batch.amount.tolist(),
+                batch.balance.tolist(),
+                [str(description) for description in batch.description],
+                np.asarray(batch.type).astype(str).tolist(),
+                nullable(batch.createdAt),
+                nullable(batch.updatedAt),
+            )
+        )
+        days = set(zip(users, np.datetime_as_string(batch.date, unit='D').tolist()))
+
+        with self._lock:
+            db = self._connection()
+            # Days the replaced versions lived in need recomputing too, and
+            # their owners a new version if an _id moved to another user
+            previous_users = set()
+            for start in range(0, len(ids), _SQL_CHUNK):
+                chunk = ids[start : start + _SQL_CHUNK]
+                previous = db.execute(
+                    'SELECT userId, date FROM transactions '
+                    f'WHERE _id IN ({",".join("?" * len(chunk))})',
+                    chunk,
+                ).fetchall()
+                if previous:
+                    old_users, old_dates = zip(*previous)
+                    old_days = np.datetime_as_string(
+                        np.array(old_dates, dtype='datetime64[ns]'), unit='D'
+                    )
+                    days.update(zip(old_users, old_days.tolist()))
+                    previous_users.update(old_users)
+
+            db.executemany(UPSERT, rows)
+            self._refresh_rollups(db, days)
+            db.executemany(
+                'INSERT INTO users VALUES (?, 1, ?) ON CONFLICT (userId) DO UPDATE '
+                'SET version = version + 1, tz_aware = excluded.tz_aware',
+                [(user, int(batch.tz_aware)) for user in set(users)],
+            )
+            db.executemany(
+                'UPDATE users SET version = version + 1 WHERE userId = ?',
+                [(user,) for user in previous_users - set(users)],
+            )
+            db.commit()
+        return len(rows), rejected
+
+    def _refresh_rollups(self, db: sqlite3.Connection, days: set) -> None:
+        """Recompute the rollups of the touched ``(userId, day)`` partitions."""
+        db.executemany(
+            'DELETE FROM daily_rollups WHERE userId = ? AND day = ?', sorted(days)
+        )
+        db.executemany(
+            DAILY_ROLLUP,
+            [(day, day[:7], user, *day_bounds(day, day)) for user, day in sorted(days)],
+        )
+        months = sorted({(user, day[:7]) for user, day in days})
+        db.executemany(
+            'DELETE FROM monthly_rollups WHERE userId = ? AND month = ?', months
+        )
+        db.executemany(MONTHLY_ROLLUP, months)
+
+    def version(self, user: str) -> int:
+        """Write counter of ``user`` (0 if nothing is stored for them)."""
+        with self._lock:
+            row = (
+                self._connection()
+                .execute('SELECT version FROM users WHERE userId = ?', (user,))
+                .fetchone()
+            )
+        return row[0] if row else 0
+
+    def load(
+        self, user: str, start: str | None = None, end: str | None = None
+    ) -> TransactionBatch | None:
+        """A user's transactions in date order, limited to inclusive days."""
+        first_day, last_day = day_range(start, end)
+        with self._lock:
+            db = self._connection()
+            rows = db.execute(
+                'SELECT _id, amount, balance, createdAt, date, description, type, '
+                'updatedAt FROM transactions WHERE userId = ? AND date >= ? '
+                'AND date < ? ORDER BY date, rowid',
+                (user, *day_bounds(first_day, last_day)),
+            ).fetchall()
+            tz_aware = db.execute(
+                'SELECT tz_aware FROM users WHERE userId = ?', (user,)
+            ).fetchone()
+        if not rows:
+            return None
+
+        _id, amount, balance, created, date, description, kind, updated = zip(*rows)
+
+        def timestamps(values):
+            return np.array(
+                [np.iinfo(np.int64).min if v is None else v for v in values],
+                dtype=np.int64,
+            ).view('datetime64[ns]')
+
+        return TransactionBatch(
+            _id=np.array(_id, dtype=object),
+            amount=np.array(amount, dtype=np.float64),
+            balance=np.array(balance, dtype=np.float64),
+            createdAt=timestamps(created),
+            date=np.array(date, dtype=np.int64).view('datetime64[ns]'),
+            description=np.array(description, dtype=object),
+            type=pd.Categorical(kind),
+            updatedAt=timestamps(updated),
+            userId=pd.Categorical([user] * len(rows)),
+            tz_aware=bool(tz_aware and tz_aware[0]),
+        )
+
+    def monthly_rollups(
+        self, user: str, start: str | None = None, end: str | None = None
+    ) -> tuple[list[tuple], bool]:
+        """Per-month rollup rows of a user within inclusive days, and tz_aware.
+
+        Months wholly inside the range come from the monthly rollups; the
+        first and last month are merged from their daily rollups, so the
+        query reads O(months) rows whatever the number of transactions. Each
+        row is ``(month, income, expense, income_count, expense_count, rows,
+        min_amount, max_amount, first_date, last_date)``.
+        """
+        first_day, last_day = day_range(start, end)
+        first_month, last_month = first_day[:7], last_day[:7]
+        with self._lock:
+            db = self._connection()
+            rows = db.execute(
+                f'SELECT month, {ROLLUP_COLUMNS} FROM monthly_rollups '
+                'WHERE userId = ? AND month > ? AND month < ? '
+                f'UNION ALL SELECT month, {MERGED_ROLLUP_COLUMNS} FROM daily_rollups '
+                'WHERE userId = ? AND day >= ? AND day <= ? AND month IN (?, ?) '
+                'GROUP BY month ORDER BY month',
+                (
+                    user,
+                    first_month,
+                    last_month,
+                    user,
+                    first_day,
+                    last_day,
+                    first_month,
+                    last_month,
+                ),
+            ).fetchall()
+            tz_aware = db.execute(
+                'SELECT tz_aware FROM users WHERE userId = ?', (user,)
+            ).fetchone()
+        return rows, bool(tz_aware and tz_aware[0])
+
+    def daily_totals(
+        self, user: str, start: str | None = None, end: str | None = None
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Active days of a user within inclusive days, with income and expense.
+
+        Read from the daily rollups: ``(days, income, absolute expense)``.
+        """
+        first_day, last_day = day_range(start, end)
+        with self._lock:
+            rows = (
+                self._connection()
+                .execute(
+                    'SELECT day, income, expense FROM daily_rollups '
+                    'WHERE userId = ? AND day >= ? AND day <= ? ORDER BY day',
+                    (user, first_day, last_day),
+                )
+                .fetchall()
+            )
+        if not rows:
+            return (
+                np.array([], dtype='datetime64[D]'),
+                np.zeros(0),
+                np.zeros(0),
+            )
+        days, income, expense = zip(*rows)
+        return (
+            np.array(days, dtype='datetime64[D]'),
+            np.array(income, dtype=np.float64),
+            -np.array(expense, dtype=np.float64),
+        )
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+transaction_store = TransactionStore(path=settings.transaction_store_path)
@@ -1,17 +1,32 @@
-from datetime import datetime
+import asyncio
 
+import numpy as np
 import pandas as pd
 
-from models.base import Transaction
-from utils.analyzer import validate_transaction
+from models.base import TransactionBatch
+from utils.context import AnalysisContext
+from utils.ingest import ingest_transactions
+from utils.partials import aggregate_batch, shard_bounds
+from utils.results import payload_key
 from utils.settings import base_settings as settings
+from utils.store import transaction_store
 from utils.websocket import WebSocketManager
+from utils.windows import NO_TRANSACTIONS_IN_RANGE, DateWindow, rolling_metrics
+
+NO_INCOME_OR_EXPENSE = 'Summaries need at least one expense and one income'
+
+
+async def summary_key(transactions) -> str:
+    """Result-cache key for a summary of ``transactions``."""
+    return await asyncio.to_thread(payload_key, 'summarize', transactions)
 
 
 async def summarize_transactions(
-    transactions: list[dict], ws_manager: WebSocketManager = None
+    transactions: list[dict],
+    ws_manager: WebSocketManager = None,
+    window: DateWindow | None = None,
 ) -> dict:
-    """Summarize transaction data."""
+    """Summarize transaction data, optionally limited to a date ``window``."""
     try:
         # Validate and convert transactions to objects
         if ws_manager:
@@ -26,143 +41,333 @@ async def summarize_transactions(
                 )
             return {'error': 'No transactions provided'}
 
-        tx_objects = [
-            Transaction(
-                _id=t['_id'],
-                balance=float(t['balance']),
-                type=t['type'],
-                date=datetime.fromisoformat(t['date']),
-                description=t['description'],
-                amount=float(t['amount']),
-                userId=t['userId'],
-                createdAt=datetime.fromisoformat(t['createdAt']),
-                updatedAt=datetime.fromisoformat(t['updatedAt']),
-            )
-            for t in transactions
-            if validate_transaction(t)
-        ]
+        batch, rejected = await asyncio.to_thread(ingest_transactions, transactions)
+    except Exception as e:
+        return await summary_failed(e, ws_manager)
+
+    return await summarize_ingested(batch, rejected, ws_manager, window)
+
+
+async def summarize_ingested(
+    batch: TransactionBatch | None,
+    rejected: list[dict],
+    ws_manager: WebSocketManager = None,
+    window: DateWindow | None = None,
+) -> dict:
+    """Summarize an already ingested batch, e.g. one built from an NDJSON stream.
 
-        if not tx_objects:
+    With a ``window``, only its days are summarized, and a rolling window
+    adds ``rolling`` metrics.
+    """
+    try:
+        if batch is None and not rejected:
+            if ws_manager:
+                await ws_manager.send_progress(
+                    'No transactions provided', 1.0, 'Summarize'
+                )
+            return {'error': 'No transactions provided'}
+
+        if batch is None:
             settings.logger.warning('No valid transactions provided')
             if ws_manager:
                 await ws_manager.send_progress(
                     'No valid transactions provided', 1.0, 'Summarize'
                 )
-            return {'error': 'No valid transactions provided'}
+            return {'error': 'No valid transactions provided', 'rejected': rejected}
 
-        # Step 1: Calculate totals
+        # Step 1: Calculate totals, counts, extremes and monthly buckets
         if ws_manager:
             await ws_manager.send_progress('Calculating totals...', 0.2, 'Summarize')
 
-        total_spent = sum(tx.amount for tx in tx_objects if tx.amount < 0)
-        total_income = sum(tx.amount for tx in tx_objects if tx.amount > 0)
+        context = AnalysisContext(batch)
+        selected = context.window(window) if window else context
+        if not len(selected.batch):
+            return {'error': NO_TRANSACTIONS_IN_RANGE, 'rejected': rejected}
+        if len(shard_bounds(len(selected.batch))) > 1:
+            partials = await aggregate_batch(selected.batch)
+            aggregates = partials.summary_aggregates()
+            if aggregates is None:
+                raise ValueError(NO_INCOME_OR_EXPENSE)
+        else:
+            aggregates = summary_aggregates(selected)
 
-        # Step 2: Calculate additional metrics
+        # Step 2: Analyze trends and changes
         if ws_manager:
-            await ws_manager.send_progress('Calculating average..', 0.35, 'Summarize')
+            await ws_manager.send_progress('Analyzing trends...', 0.85, 'Summarize')
 
-        total_savings = total_income + total_spent
-        total_transactions = len(tx_objects)
-        expense_count = sum(1 for tx in tx_objects if tx.amount < 0)
-        income_count = sum(1 for tx in tx_objects if tx.amount > 0)
-        avg_expense = abs(total_spent / expense_count) if expense_count > 0 else 0
-        avg_income = total_income / income_count if income_count > 0 else 0
+        summary = await compose_summary(aggregates, selected.batch)
+        if window and window.rolling:
+            summary['rolling'] = context.rolling(window)
+        summary['rejected'] = rejected
+        settings.logger.info('Transaction summarization completed successfully')
+        return summary
+    except Exception as e:
+        return await summary_failed(e, ws_manager)
 
-        # Step 3: Calculate largest transactions and date range
-        if ws_manager:
-            await ws_manager.send_progress(
-                'Identifying largest transactions...', 0.5, 'Summarize'
-            )
 
-        start_date = min(tx.date for tx in tx_objects)
-        end_date = max(tx.date for tx in tx_objects)
-        largest_expense = min(tx.amount for tx in tx_objects if tx.amount < 0)
-        largest_income = max(tx.amount for tx in tx_objects if tx.amount > 0)
+async def summarize_stored(
+    user: str,
+    window: DateWindow | None = None,
+    ws_manager: WebSocketManager = None,
+) -> dict:
+    """Summarize a user's stored transactions from the monthly rollups.
 
-        # Step 4: Generate monthly summaries
+    Reads one rollup row per month in the window's days, so the cost does
+    not grow with the number of transactions; rolling metrics read the
+    daily rollups.
+    """
+    window = window or DateWindow()
+    try:
         if ws_manager:
-            await ws_manager.send_progress(
-                'Generating monthly summaries...', 0.7, 'Summarize'
-            )
-
-        df = pd.DataFrame([t.__dict__ for t in tx_objects])
-        df['date'] = pd.to_datetime(df['date'])
-        monthly_summary = (
-            df.groupby(df['date'].dt.to_period('M'))['amount'].sum().to_dict()
+            await ws_manager.send_progress('Reading rollups...', 0.2, 'Summarize')
+        rollups, tz_aware = await asyncio.to_thread(
+            transaction_store.monthly_rollups,
+            user,
+            window.first_day,
+            window.last_day,
         )
+        if not rollups:
+            if ws_manager:
+                await ws_manager.send_progress(
+                    'No transactions provided', 1.0, 'Summarize'
+                )
+            return {'error': 'No transactions provided'}
+
+        aggregates = rollup_aggregates(rollups)
+        if aggregates is None:
+            raise ValueError(NO_INCOME_OR_EXPENSE)
 
-        # Step 5: Analyze trends and changes
         if ws_manager:
             await ws_manager.send_progress('Analyzing trends...', 0.85, 'Summarize')
+        summary = await compose_summary(aggregates, TransactionBatch.empty(tz_aware))
+        if window.rolling:
+            days = await asyncio.to_thread(
+                transaction_store.daily_totals,
+                user,
+                window.history_start,
+                window.last_day,
+            )
+            summary['rolling'] = rolling_metrics(*days, window)
+        summary['rejected'] = []
+        return summary
+    except Exception as e:
+        return await summary_failed(e, ws_manager)
+
+
+async def summary_failed(error: Exception, ws_manager: WebSocketManager = None) -> dict:
+    settings.logger.error(f'Error summarizing transactions: {str(error)}')
+    if ws_manager:
+        await ws_manager.send_progress('Summarization failed', 1.0)
+    return {'error': f'Summarization failed: {str(error)}'}
+
+
+def summary_aggregates(context: AnalysisContext) -> dict:
+    """Compute every summary metric for a whole batch.
+
+    See ``grouped_summary_aggregates``. Raises ValueError unless there is at
+    least one expense and one income.
+    """
+    groups = np.zeros(len(context.batch), dtype=np.intp)
+    aggregates = grouped_summary_aggregates(context, groups, 1)[0]
+    if aggregates is None:
+        raise ValueError(NO_INCOME_OR_EXPENSE)
+    return aggregates
+
+
+def grouped_summary_aggregates(
+    context: AnalysisContext, group_codes: np.ndarray, n_groups: int
+) -> list[dict | None]:
+    """Compute every summary metric for each group in one grouped pass.
+
+    Rows are keyed by ``(group, month, sign)``, so one pair of bincounts
+    yields per-month income and expense sums and counts for every group
+    without sorting the rows; totals and counts are then reductions over
+    those few buckets. Groups without both an expense and an income get
+    ``None``.
+    """
+    amounts = context.batch.amount
+    offsets = context.month_offsets
+    n_months = int(offsets.max()) + 1
+
+    # Factorize (group, month) pairs so buckets scale with the data, not with
+    # groups x calendar span; only the distinct pairs are sorted
+    pair_codes, pairs = pd.factorize(group_codes * n_months + offsets)
+    order = np.argsort(pairs)
+    ranks = np.empty(len(pairs), dtype=np.intp)
+    ranks[order] = np.arange(len(pairs))
+    pairs = pairs[order]
+
+    # 0: expense, 1: zero amount, 2: income
+    keys = ranks[pair_codes] * 3 + (np.sign(amounts).astype(np.intp) + 1)
+    sums = np.bincount(keys, weights=amounts, minlength=len(pairs) * 3).reshape(-1, 3)
+    counts = np.bincount(keys, minlength=len(pairs) * 3).reshape(-1, 3)
+    pair_groups, pair_months = np.divmod(pairs, n_months)
+    months = context.first_month + pair_months
+    bounds = np.searchsorted(pair_groups, np.arange(n_groups + 1))
+
+    # Expenses are negative, so the largest one is the minimum
+    minimum = np.full(n_groups, np.inf)
+    maximum = np.full(n_groups, -np.inf)
+    np.minimum.at(minimum, group_codes, amounts)
+    np.maximum.at(maximum, group_codes, amounts)
+    timestamps = context.batch.date.view(np.int64)
+    first = np.full(n_groups, np.iinfo(np.int64).max)
+    last = np.full(n_groups, np.iinfo(np.int64).min)
+    np.minimum.at(first, group_codes, timestamps)
+    np.maximum.at(last, group_codes, timestamps)
+    sizes = np.bincount(group_codes, minlength=n_groups)
 
-        monthly_income = (
-            df[df['amount'] > 0].groupby(df['date'].dt.to_period('M'))['amount'].sum()
+    results = []
+    for group in range(n_groups):
+        start, end = bounds[group], bounds[group + 1]
+        group_sums, group_counts = sums[start:end], counts[start:end]
+        has_expense = group_counts[:, 0] > 0
+        has_income = group_counts[:, 2] > 0
+        expense_count = int(group_counts[:, 0].sum())
+        income_count = int(group_counts[:, 2].sum())
+        if not expense_count or not income_count:
+            results.append(None)
+            continue
+
+        reported = has_expense | has_income
+        monthly_income = group_sums[:, 2]
+        monthly_expense = -group_sums[:, 0]
+        monthly_savings = np.where(
+            has_income & has_expense, monthly_income - monthly_expense, 0.0
         )
-        monthly_expense = (
-            df[df['amount'] < 0]
-            .groupby(df['date'].dt.to_period('M'))['amount']
-            .sum()
-            .abs()
+        results.append(
+            {
+                'total_transactions': int(sizes[group]),
+                'total_spent': float(group_sums[:, 0].sum()),
+                'total_income': float(group_sums[:, 2].sum()),
+                'expense_count': expense_count,
+                'income_count': income_count,
+                'largest_expense': float(minimum[group]),
+                'largest_income': float(maximum[group]),
+                'first_date': np.datetime64(int(first[group]), 'ns'),
+                'last_date': np.datetime64(int(last[group]), 'ns'),
+                'months': np.datetime_as_string(months[start:end][reported]).tolist(),
+                'monthly_income': monthly_income[reported],
+                'monthly_expense': monthly_expense[reported],
+                'monthly_savings': monthly_savings[reported],
+                'has_income': has_income[reported],
+                'has_expense': has_expense[reported],
+            }
         )
-        monthly_savings = (monthly_income - monthly_expense).fillna(0)
+    return results
+
 
-        income_trend = await calculate_trend(monthly_income)
-        expense_trend = await calculate_trend(monthly_expense)
-        savings_trend = await calculate_trend(monthly_savings)
+def rollup_aggregates(rollups: list[tuple]) -> dict | None:
+    """``grouped_summary_aggregates`` output for one group from monthly rollups.
+
+    ``rollups`` are ``TransactionStore.monthly_rollups`` rows in month
+    order. Returns None without both an expense and an income.
+    """
+    (
+        months,
+        income,
+        expense,
+        income_count,
+        expense_count,
+        rows,
+        minimum,
+        maximum,
+        first,
+        last,
+    ) = zip(*rollups)
+    monthly_income = np.array(income, dtype=np.float64)
+    monthly_expense = -np.array(expense, dtype=np.float64)
+    has_income = np.array(income_count) > 0
+    has_expense = np.array(expense_count) > 0
+    if not has_income.any() or not has_expense.any():
+        return None
 
-        income_change = await calculate_percentage_change(monthly_income)
-        expense_change = await calculate_percentage_change(monthly_expense)
-        savings_change = await calculate_percentage_change(monthly_savings)
+    reported = has_expense | has_income
+    monthly_savings = np.where(
+        has_income & has_expense, monthly_income - monthly_expense, 0.0
+    )
+    return {
+        'total_transactions': int(sum(rows)),
+        'total_spent': float(np.sum(expense)),
+        'total_income': float(monthly_income.sum()),
+        'expense_count': int(sum(expense_count)),
+        'income_count': int(sum(income_count)),
+        'largest_expense': float(min(minimum)),
+        'largest_income': float(max(maximum)),
+        'first_date': np.datetime64(min(first), 'ns'),
+        'last_date': np.datetime64(max(last), 'ns'),
+        'months': [month for month, kept in zip(months, reported) if kept],
+        'monthly_income': monthly_income[reported],
+        'monthly_expense': monthly_expense[reported],
+        'monthly_savings': monthly_savings[reported],
+        'has_income': has_income[reported],
+        'has_expense': has_expense[reported],
+    }
+
+
+async def compose_summary(aggregates: dict, batch: TransactionBatch) -> dict:
+    """Build the summary response from ``summary_aggregates`` output."""
+    total_spent = aggregates['total_spent']
+    total_income = aggregates['total_income']
+    total_savings = total_income + total_spent
+    expense_count = aggregates['expense_count']
+    income_count = aggregates['income_count']
+    avg_expense = abs(total_spent / expense_count) if expense_count > 0 else 0
+    avg_income = total_income / income_count if income_count > 0 else 0
+    start_date, end_date = batch.isoformat(
+        [aggregates['first_date'], aggregates['last_date']]
+    )
 
-        savings_rate = (
-            ((total_income + total_spent) / total_income) * 100 if total_income else 0
+    monthly_income = aggregates['monthly_income']
+    monthly_expense = aggregates['monthly_expense']
+    monthly_savings = aggregates['monthly_savings']
+    monthly_summary = {
+        month: {'income': income, 'expenses': expense, 'savings': savings}
+        for month, income, expense, savings in zip(
+            aggregates['months'],
+            monthly_income.tolist(),
+            monthly_expense.tolist(),
+            monthly_savings.tolist(),
         )
+    }
 
-        monthly_summary = {
-            str(month): {
-                'income': float(monthly_income.get(month, 0)),
-                'expenses': float(monthly_expense.get(month, 0)),
-                'savings': float(monthly_savings.get(month, 0)),
-            }
-            for month in monthly_income.index.union(monthly_expense.index)
-        }
-
-        # Compile summary results
-        summary = {
-            'income': {
-                'total': total_income,
-                'trend': income_trend,
-                'change': income_change,
-            },
-            'expenses': {
-                'total': abs(total_spent),
-                'trend': expense_trend,
-                'change': expense_change,
-            },
-            'savings': {
-                'total': total_savings,
-                'trend': savings_trend,
-                'change': savings_change,
-            },
-            'total_transactions': total_transactions,
-            'expense_count': expense_count,
-            'income_count': income_count,
-            'avg_expense': avg_expense,
-            'avg_income': avg_income,
-            'start_date': start_date.isoformat(),
-            'end_date': end_date.isoformat(),
-            'largest_expense': largest_expense,
-            'largest_income': largest_income,
-            'savings_rate': savings_rate,
-            'monthly_summary': monthly_summary,
-        }
-        settings.logger.info('Transaction summarization completed successfully')
-        return summary
-    except Exception as e:
-        settings.logger.error(f'Error summarizing transactions: {str(e)}')
-        if ws_manager:
-            await ws_manager.send_progress('Summarization failed', 1.0)
-        return {'error': f'Summarization failed: {str(e)}'}
+    # Trends only consider months that had income (or expenses) at all
+    monthly_income = pd.Series(monthly_income[aggregates['has_income']])
+    monthly_expense = pd.Series(monthly_expense[aggregates['has_expense']])
+    monthly_savings = pd.Series(monthly_savings)
+
+    savings_rate = (
+        ((total_income + total_spent) / total_income) * 100 if total_income else 0
+    )
+
+    return {
+        'income': {
+            'total': total_income,
+            'trend': await calculate_trend(monthly_income),
+            'change': await calculate_percentage_change(monthly_income),
+        },
+        'expenses': {
+            'total': abs(total_spent),
+            'trend': await calculate_trend(monthly_expense),
+            'change': await calculate_percentage_change(monthly_expense),
+        },
+        'savings': {
+            'total': total_savings,
+            'trend': await calculate_trend(monthly_savings),
+            'change': await calculate_percentage_change(monthly_savings),
+        },
+        'total_transactions': aggregates['total_transactions'],
+        'expense_count': expense_count,
+        'income_count': income_count,
+        'avg_expense': avg_expense,
+        'avg_income': avg_income,
+        'start_date': start_date,
+        'end_date': end_date,
+        'largest_expense': aggregates['largest_expense'],
+        'largest_income': aggregates['largest_income'],
+        'savings_rate': savings_rate,
+        'monthly_summary': monthly_summary,
+    }
 
 
 async def calculate_trend(monthly_data: pd.Series) -> str:
@@ -1,11 +1,17 @@
+import asyncio
+
 from aiohttp import web
 
+from utils.formats import JSON, encode
 from utils.settings import base_settings
 
 
 class WebSocketManager:
-    def __init__(self, ws: web.WebSocketResponse):
+    def __init__(self, ws: web.WebSocketResponse, result_format: str = JSON):
         self.ws = ws
+        # Results are sent as binary frames in any format other than JSON;
+        # progress updates are always JSON text frames
+        self.result_format = result_format
         self._ready = False
         base_settings.logger.info(f'Initializing WebSocket manager: {ws}')
 
@@ -39,13 +45,13 @@ class WebSocketManager:
             )
             return
 
+        message = {'action': action, 'result': result, 'taskType': task_type}
         try:
-            await self.ws.send_json(
-                {
-                    'action': action,
-                    'result': result,
-                    'taskType': task_type,
-                }
-            )
+            if self.result_format == JSON:
+                await self.ws.send_json(message)
+            else:
+                await self.ws.send_bytes(
+                    await asyncio.to_thread(encode, message, self.result_format)
+                )
         except Exception as e:
             base_settings.logger.error(f'Error sending result: {str(e)}')
@@ -0,0 +1,150 @@
+from dataclasses import dataclass
+from typing import Mapping
+
+import numpy as np
+import pandas as pd
+
+from utils.settings import base_settings as settings
+
+DAY_NS = 86_400 * 10**9
+# Whole days representable as datetime64[ns], the bounds of open ranges
+FIRST_DAY = '1678-01-01'
+LAST_DAY = '2261-12-31'
+# Longest accepted rolling window, in days
+MAX_ROLLING_DAYS = 3660
+
+NO_TRANSACTIONS_IN_RANGE = 'No transactions in the requested date range'
+
+
+def day_range(start: str | None, end: str | None) -> tuple[str, str]:
+    """Inclusive ``YYYY-MM-DD`` bounds for optional ISO-8601 ``start``/``end``.
+
+    Times and timezones are dropped, so ranges always cover whole days of
+    the local dates transactions are bucketed by; with ``DATE_BUCKETS=utc``
+    bounds are converted to UTC first. Raises ValueError for unparseable
+    values.
+    """
+    bounds = []
+    for value, default in ((start, FIRST_DAY), (end, LAST_DAY)):
+        if value is None:
+            bounds.append(default)
+            continue
+        try:
+            timestamp = pd.Timestamp(value)
+        except (TypeError, ValueError) as e:
+            raise ValueError(f'Invalid date: {value!r}') from e
+        if timestamp is pd.NaT:
+            raise ValueError(f'Invalid date: {value!r}')
+        if timestamp.tzinfo is not None and settings.date_buckets == 'utc':
+            timestamp = timestamp.tz_convert('UTC')
+        bounds.append(timestamp.strftime('%Y-%m-%d'))
+    return bounds[0], bounds[1]
+
+
+def day_bounds(first_day: str, last_day: str) -> tuple[int, int]:
+    """Half-open nanosecond range covering ``first_day`` through ``last_day``."""
+    start = np.datetime64(first_day, 'D').astype('datetime64[ns]').view(np.int64)
+    end = np.datetime64(last_day, 'D').astype('datetime64[ns]').view(np.int64)
+    return int(start), int(end) + DAY_NS
+
+
+def parse_days(value) -> int:
+    """A rolling window length: a positive integer or a string like ``'30d'``."""
+    text = str(value).strip().lower().removesuffix('d')
+    if isinstance(value, bool) or not text.isdigit():
+        raise ValueError(f'Invalid window: {value!r}')
+    days = int(text)
+    if not 0 < days <= MAX_ROLLING_DAYS:
+        raise ValueError(f'Window must be between 1 and {MAX_ROLLING_DAYS} days')
+    return days
+
+
+@dataclass(frozen=True)
+class DateWindow:
+    """An inclusive day range and an optional rolling window length in days."""
+
+    first_day: str = FIRST_DAY
+    last_day: str = LAST_DAY
+    rolling: int | None = None
+
+    @property
+    def bounds(self) -> tuple[np.datetime64, np.datetime64]:
+        """Half-open ``datetime64[ns]`` range of the selected days."""
+        start, end = day_bounds(self.first_day, self.last_day)
+        return np.datetime64(start, 'ns'), np.datetime64(end, 'ns')
+
+    @property
+    def history_start(self) -> str:
+        """First day whose transactions feed the rolling metrics of the range."""
+        if not self.rolling:
+            return self.first_day
+        day = np.datetime64(self.first_day) - (self.rolling - 1)
+        return str(max(day, np.datetime64(FIRST_DAY)))
+
+    def key(self) -> list:
+        """What distinguishes this window in result-cache keys."""
+        return [self.first_day, self.last_day, self.rolling]
+
+
+def date_window(params: Mapping) -> DateWindow | None:
+    """Parse ``start``, ``end`` and ``window`` parameters; None if all are absent.
+
+    Raises ValueError for unparseable values or a start after the end.
+    """
+    start, end, rolling = params.get('start'), params.get('end'), params.get('window')
+    if start is None and end is None and rolling is None:
+        return None
+    first_day, last_day = day_range(start, end)
+    if first_day > last_day:
+        raise ValueError('start must not be after end')
+    return DateWindow(
+        first_day, last_day, None if rolling is None else parse_days(rolling)
+    )
+
+
+def rolling_metrics(
+    days: np.ndarray, income: np.ndarray, expense: np.ndarray, window: DateWindow
+) -> dict:
+    """Trailing ``window.rolling``-day totals for every calendar day in range.
+
+    ``days`` are ascending distinct ``datetime64[D]`` values with their
+    income and (absolute) expense totals. Days are spread onto a dense
+    calendar so windows span calendar days, not active days, and every
+    window total is a difference of two prefix sums: O(days) however long
+    the window. The calendar runs from the first day through
+    ``window.last_day``, or through the last day when the range is open,
+    so quiet days at the end of the range are reported too. Days before
+    ``window.first_day`` only feed the windows of the days in range.
+
+    ``average_daily_spend`` divides by the days a window covers since the
+    first day, so windows reaching back before the data are not diluted.
+    """
+    size = window.rolling
+    result = {'window_days': size, 'spend': {}, 'income': {}, 'average_daily_spend': {}}
+    if not len(days):
+        return result
+
+    offsets = (days - days[0]).astype(np.intp)
+    last_day = days[-1] if window.last_day == LAST_DAY else window.last_day
+    through = (np.datetime64(last_day, 'D') - days[0]).astype(np.intp)
+    span = max(int(offsets[-1]), int(through)) + 1
+    calendar = days[0] + np.arange(span)
+    keep = (calendar >= np.datetime64(window.first_day)) & (
+        calendar <= np.datetime64(window.last_day)
+    )
+    ends = np.arange(1, span + 1)
+    starts = np.maximum(ends - size, 0)
+    totals = {}
+    for name, values in (('spend', expense), ('income', income)):
+        prefix = np.zeros(span + 1)
+        np.cumsum(np.bincount(offsets, weights=values, minlength=span), out=prefix[1:])
+        totals[name] = (prefix[ends] - prefix[starts])[keep]
+    covered = (ends - starts)[keep]
+
+    labels = np.datetime_as_string(calendar[keep]).tolist()
+    result['spend'] = dict(zip(labels, totals['spend'].tolist()))
+    result['income'] = dict(zip(labels, totals['income'].tolist()))
+    result['average_daily_spend'] = dict(
+        zip(labels, (totals['spend'] / covered).tolist())
+    )
+    return result